@@ -0,0 +1,57 @@
+from typing import List
+
+import numpy as np
+import pandas as pd
+
+DAILY_DTYPES = {"Data": "datetime64[ns]", "ID_Produto": np.int64, "TipoMovimentacao": object,
+                "Quantidade": np.int64, "Valor": float, "Transacoes": np.int64}
+DAILY_COLUMNS = list(DAILY_DTYPES)
+_KEYS = ["Data", "ID_Produto", "TipoMovimentacao"]
+
+
+def _empty_daily() -> pd.DataFrame:
+    # Com tipos explícitos: colunas object de um DataFrame vazio contaminariam a concatenação com os deltas
+    return pd.DataFrame({col: pd.Series(dtype=DAILY_DTYPES[col]) for col in DAILY_COLUMNS})
+
+
+def _group_daily(df_transactions: pd.DataFrame) -> pd.DataFrame:
+    if df_transactions.empty:
+        return _empty_daily()
+    daily = (df_transactions
+             .assign(Data=df_transactions['DataHora'].dt.normalize())
+             .groupby(_KEYS, sort=False, observed=True) # TipoMovimentacao é categórico no histórico
+             .agg(Quantidade=('Quantidade', 'sum'), Valor=('ValorTotalMovimentacao', 'sum'),
+                  Transacoes=('ID_Transacao', 'size'))
+             .reset_index())
+    # Tabela pequena (dias x produtos): tipos simples, para combinar com os deltas sem conflito de categorias
+    return daily.astype({'ID_Produto': np.int64, 'TipoMovimentacao': object, 'Quantidade': np.int64})
+
+
+class DailyMovementAggregates:
+    """
+    Totais diários por produto e tipo de movimentação (quantidade, valor, nº de transações).
+
+    Montados uma vez com groupby sobre o histórico na carga e mantidos incrementalmente:
+    as transações novas são agregadas à parte e incorporadas na próxima leitura, então
+    os endpoints de análise trabalham sobre uma tabela de dias x produtos em vez do histórico.
+    """
+
+    def __init__(self):
+        self._table = _empty_daily()
+        self._deltas: List[pd.DataFrame] = []
+
+    def rebuild(self, df_transactions: pd.DataFrame):
+        self._table = _group_daily(df_transactions)
+        self._deltas = []
+
+    def add(self, df_new: pd.DataFrame):
+        if not df_new.empty:
+            self._deltas.append(_group_daily(df_new))
+
+    def table(self) -> pd.DataFrame:
+        if self._deltas:
+            combined = pd.concat([self._table, *self._deltas], ignore_index=True)
+            self._table = (combined.groupby(_KEYS, sort=False, as_index=False)[["Quantidade", "Valor", "Transacoes"]].sum()
+                           .astype(DAILY_DTYPES))
+            self._deltas = []
+        return self._table
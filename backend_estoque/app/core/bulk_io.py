@@ -0,0 +1,267 @@
+import csv
+import importlib.util
+from datetime import date
+from pathlib import Path
+from typing import Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from app.core.config import STOCK_SHEET_NAME, TRANSACTIONS_SHEET_NAME
+
+# Arquivos aceitos na importação/exportação em massa
+BULK_FORMATS = ("csv", "xlsx")
+
+XLSXWRITER_AVAILABLE = importlib.util.find_spec("xlsxwriter") is not None
+
+# Textos iniciados por estes caracteres viram fórmula ao abrir o CSV numa planilha: a
+# exportação os prefixa com um apóstrofo (removido de volta na importação)
+FORMULA_PREFIXES = ("=", "+", "-", "@", "\t", "\r")
+_ESCAPED_FORMULA_PREFIXES = tuple("'" + prefix for prefix in FORMULA_PREFIXES)
+
+# Número no formato pt-BR com separador de milhar (1.234 ou 1.234,56)
+_PTBR_THOUSANDS_PATTERN = r"^-?\d{1,3}(\.\d{3})+(,\d*)?$"
+
+
+def detect_format(path: Path, fmt: Optional[str] = None) -> str:
+    fmt = (fmt or Path(path).suffix.lstrip(".")).lower()
+    if fmt not in BULK_FORMATS:
+        raise ValueError(f"Formato '{fmt}' não suportado: use {' ou '.join(BULK_FORMATS)}.")
+    return fmt
+
+
+def _sniff_delimiter(path: Path) -> str:
+    with open(path, encoding="utf-8-sig", newline="") as f:
+        header = f.readline()
+    try:
+        return csv.Sniffer().sniff(header, delimiters=",;\t").delimiter
+    except csv.Error:
+        return ","
+
+
+def csv_decimal_separator(path: Path, fmt: str) -> str:
+    """Separador decimal dos números do arquivo: vírgula em CSV separado por ';' (padrão pt-BR)."""
+    return "," if fmt == "csv" and _sniff_delimiter(path) == ";" else "."
+
+
+def _iter_csv(path: Path, chunk_rows: int) -> Iterator[pd.DataFrame]:
+    try:
+        reader = pd.read_csv(path, sep=_sniff_delimiter(path), dtype=str, keep_default_na=False,
+                             encoding="utf-8-sig", chunksize=chunk_rows, skipinitialspace=True)
+    except pd.errors.EmptyDataError:
+        raise ValueError("O arquivo está vazio: envie um CSV com a linha de cabeçalho e as movimentações.")
+    with reader:
+        yield from reader
+
+
+def _iter_xlsx(path: Path, chunk_rows: int, sheet: Optional[str], preferred_sheet: str) -> Iterator[pd.DataFrame]:
+    from openpyxl import load_workbook
+
+    # read_only: as linhas são lidas do XML sob demanda, sem carregar a planilha inteira
+    try:
+        workbook = load_workbook(path, read_only=True, data_only=True)
+    except Exception as e:
+        raise ValueError(f"Arquivo xlsx inválido: {e}")
+    try:
+        if sheet is not None:
+            if sheet not in workbook.sheetnames:
+                raise ValueError(f"Aba '{sheet}' não encontrada no arquivo.")
+            worksheet = workbook[sheet]
+        else:
+            worksheet = workbook[preferred_sheet] if preferred_sheet in workbook.sheetnames else workbook.worksheets[0]
+        rows = worksheet.iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+        columns = [str(name).strip() if name is not None else "" for name in header]
+        chunk: List[Tuple] = []
+        for row in rows:
+            chunk.append(row)
+            if len(chunk) >= chunk_rows:
+                yield pd.DataFrame(chunk, columns=columns, dtype=object)
+                chunk = []
+        if chunk:
+            yield pd.DataFrame(chunk, columns=columns, dtype=object)
+    finally:
+        workbook.close()
+
+
+def iter_file_chunks(path: Path, fmt: str, chunk_rows: int, kind: str,
+                     sheet: Optional[str] = None) -> Iterator[Tuple[int, pd.DataFrame]]:
+    """
+    Lê o arquivo em blocos de até `chunk_rows` linhas, sem carregá-lo inteiro.
+    Gera (número da linha do arquivo da primeira linha do bloco, bloco com os valores brutos).
+    """
+    preferred_sheet = STOCK_SHEET_NAME if kind == "produtos" else TRANSACTIONS_SHEET_NAME
+    chunks = _iter_csv(path, chunk_rows) if fmt == "csv" else _iter_xlsx(path, chunk_rows, sheet, preferred_sheet)
+    line = 2 # A linha 1 é o cabeçalho
+    for chunk in chunks:
+        chunk.columns = [str(c).strip() for c in chunk.columns]
+        yield line, chunk
+        line += len(chunk)
+
+
+def _blank(values: pd.Series) -> pd.Series:
+    return values.isna() | values.astype(str).str.strip().eq("")
+
+
+def _numbers(values: pd.Series, decimal: str = ".") -> pd.Series:
+    values = values.where(~_blank(values))
+    if decimal == "," and not pd.api.types.is_numeric_dtype(values):
+        # pt-BR: "3,5" e "1.234,56"; um "3.5" sem vírgula continua valendo 3.5
+        text = values.astype(str).str.strip()
+        thousands = text.str.match(_PTBR_THOUSANDS_PATTERN)
+        text = text.where(~thousands, text.str.replace(".", "", regex=False))
+        values = text.str.replace(",", ".", regex=False).where(values.notna())
+    return pd.to_numeric(values, errors="coerce")
+
+
+def validate_movements(chunk: pd.DataFrame, first_line: int, kind: str, today: Optional[date] = None,
+                       decimal: str = ".") -> Tuple[pd.DataFrame, List[Tuple[int, str]]]:
+    """
+    Valida um bloco contra as regras de StockMovement de forma vetorizada (uma checagem
+    por coluna, não um modelo por linha). Colunas lidas: NomeProduto, Quantidade,
+    TipoMovimentacao, ValorUnitario e DataMovimentacao; também são aceitas as do histórico
+    exportado por este sistema (DataHora e ValorTotalMovimentacao).
+
+    Retorna (movimentações válidas, [(linha, erro), ...]). As válidas têm as colunas
+    usadas pelo lote do inventory_service (NomeProduto, TipoMovimentacao, Quantidade,
+    ValorUnitario, DataHora, Chave) e a coluna Linha. Em `kind == "produtos"` (catálogo)
+    cada linha vira uma ENTRADA. Com `decimal == ","` os números são lidos no formato pt-BR.
+    """
+    if "NomeProduto" not in chunk.columns or "Quantidade" not in chunk.columns:
+        raise ValueError("O arquivo precisa das colunas NomeProduto e Quantidade.")
+    if kind == "movimentacoes" and "TipoMovimentacao" not in chunk.columns:
+        raise ValueError("O arquivo de movimentações precisa da coluna TipoMovimentacao (ENTRADA ou SAIDA).")
+    today = today or date.today()
+    empty = pd.Series(None, index=chunk.index, dtype=object)
+
+    names = chunk["NomeProduto"].where(~_blank(chunk["NomeProduto"]))
+    names = names.astype(str).str.strip().where(names.notna())
+    names = names.where(~names.str.startswith(_ESCAPED_FORMULA_PREFIXES, na=False), names.str[1:]) # Escapado na exportação
+    quantity = _numbers(chunk["Quantidade"], decimal)
+    if kind == "produtos":
+        kinds = pd.Series("ENTRADA", index=chunk.index)
+    else:
+        kinds = chunk["TipoMovimentacao"].astype(str).str.strip().str.upper()
+
+    price_column = chunk.get("ValorUnitario", empty)
+    price = _numbers(price_column, decimal)
+    if "ValorUnitario" not in chunk.columns and "ValorTotalMovimentacao" in chunk.columns:
+        # Histórico exportado: o valor unitário de uma ENTRADA é o total / quantidade
+        price = (_numbers(chunk["ValorTotalMovimentacao"], decimal) / quantity).where(kinds.eq("ENTRADA"))
+        price_column = price
+    date_column = chunk["DataMovimentacao"] if "DataMovimentacao" in chunk.columns else chunk.get("DataHora", empty)
+    no_date = _blank(date_column)
+    dates = pd.to_datetime(date_column.where(~no_date), errors="coerce", format="mixed")
+
+    checks = [
+        (names.isna(), "NomeProduto é obrigatório."),
+        (~kinds.isin(["ENTRADA", "SAIDA"]), "TipoMovimentacao deve ser ENTRADA ou SAIDA."),
+        (quantity.isna() | quantity.le(0) | quantity.mod(1).ne(0), "Quantidade deve ser um número inteiro maior que zero."),
+        (~_blank(price_column) & ~price.gt(0), "ValorUnitario deve ser um número maior que zero."),
+        (~no_date & dates.isna(), "Data da movimentação inválida."),
+    ]
+    invalid = pd.Series(False, index=chunk.index)
+    errors: List[Tuple[int, str]] = []
+    for failed, message in checks:
+        failed = failed.to_numpy() & ~invalid.to_numpy() # Uma mensagem por linha: a primeira regra violada
+        errors.extend((first_line + int(i), message) for i in np.flatnonzero(failed))
+        invalid |= failed
+    errors.sort()
+
+    valid = ~invalid
+    movements = pd.DataFrame({
+        "NomeProduto": names[valid],
+        "TipoMovimentacao": kinds[valid],
+        "Quantidade": quantity[valid].astype("int64"),
+        "ValorUnitario": price[valid].astype(float),
+        "DataHora": dates[valid].dt.date.where(~no_date[valid], today).astype(object),
+        "Linha": first_line + np.flatnonzero(valid.to_numpy()),
+    }).reset_index(drop=True)
+    movements["Chave"] = movements["NomeProduto"].str.lower()
+    return movements, errors
+
+
+def _excel_value(value):
+    # Escalares numpy/pandas -> tipos do Python aceitos pelos writers de xlsx
+    if isinstance(value, pd.Timestamp):
+        return value.to_pydatetime()
+    if hasattr(value, "item"):
+        return value.item()
+    return value
+
+
+def write_xlsx_stream(path: Path, sheet_name: str, columns: Sequence[str], chunks: Iterable[pd.DataFrame],
+                      date_columns: Sequence[str] = ()) -> int:
+    """
+    Grava os blocos em um .xlsx sem montar a planilha em memória: xlsxwriter em modo
+    constant_memory (cada linha vai para o disco ao passar para a seguinte) ou, sem ele,
+    openpyxl em modo write_only. Retorna o número de linhas gravadas.
+    """
+    rows = 0
+    if XLSXWRITER_AVAILABLE:
+        import xlsxwriter
+
+        workbook = xlsxwriter.Workbook(str(path), {"constant_memory": True})
+        try:
+            worksheet = workbook.add_worksheet(sheet_name)
+            date_format = workbook.add_format({"num_format": "yyyy-mm-dd"})
+            date_positions = {columns.index(c) for c in date_columns}
+            worksheet.write_row(0, 0, columns)
+            for chunk in chunks:
+                for values in chunk[list(columns)].itertuples(index=False, name=None):
+                    rows += 1
+                    for col, value in enumerate(values):
+                        if pd.isna(value):
+                            continue
+                        if col in date_positions:
+                            worksheet.write_datetime(rows, col, _excel_value(value), date_format)
+                        elif isinstance(value, str): # write_string: nomes iniciados por '=' não viram fórmula
+                            worksheet.write_string(rows, col, value)
+                        else:
+                            worksheet.write_number(rows, col, _excel_value(value))
+        finally:
+            workbook.close()
+        return rows
+
+    from openpyxl import Workbook
+    from openpyxl.cell import WriteOnlyCell
+
+    workbook = Workbook(write_only=True)
+    worksheet = workbook.create_sheet(sheet_name)
+    worksheet.append(list(columns))
+
+    def cell(value):
+        if isinstance(value, str) and value.startswith("="):
+            text = WriteOnlyCell(worksheet, value)
+            text.data_type = "s" # Texto, não fórmula
+            return text
+        return None if pd.isna(value) else _excel_value(value)
+
+    for chunk in chunks:
+        for values in chunk[list(columns)].itertuples(index=False, name=None):
+            worksheet.append([cell(v) for v in values])
+            rows += 1
+    workbook.save(path)
+    return rows
+
+
+def _escape_formulas(values: pd.Series) -> pd.Series:
+    text = values.astype(str)
+    return text.where(~text.str.startswith(FORMULA_PREFIXES), "'" + text)
+
+
+def iter_csv_text(columns: Sequence[str], chunks: Iterable[pd.DataFrame],
+                  date_columns: Sequence[str] = ()) -> Iterator[str]:
+    """
+    Gera um CSV (cabeçalho + blocos) como texto, bloco a bloco. Textos que uma planilha
+    interpretaria como fórmula (ver FORMULA_PREFIXES) saem prefixados com um apóstrofo.
+    """
+    yield ",".join(columns) + "\n"
+    for chunk in chunks:
+        chunk = chunk[list(columns)]
+        text_columns = [c for c in columns if c not in date_columns and not pd.api.types.is_numeric_dtype(chunk[c])]
+        chunk = chunk.assign(**{c: _escape_formulas(chunk[c]) for c in text_columns},
+                             **{c: chunk[c].dt.strftime("%Y-%m-%d") for c in date_columns})
+        yield chunk.to_csv(header=False, index=False)
@@ -0,0 +1,226 @@
+import bisect
+from datetime import date, timedelta
+from typing import List, Optional, Set
+
+import numpy as np
+import pandas as pd
+
+from app.core.config import STOCK_CHECKPOINT_FULL_EVERY, STOCK_CHECKPOINT_INTERVAL_DAYS, STOCK_COLUMNS
+from app.core.partitions import MonthlyPartitionIndex
+
+def _effects(df_transactions: pd.DataFrame) -> pd.DataFrame:
+    # Efeito de cada transação no estoque, somado por dia e produto na ordem de ID_Transacao:
+    # variação da quantidade e o último valor unitário praticado no dia
+    if df_transactions.empty:
+        return pd.DataFrame(columns=["Dia", "ID_Produto", "Delta", "Preco"])
+    quantity = df_transactions['Quantidade'].to_numpy(np.int64)
+    kind = df_transactions['TipoMovimentacao'] # Categórico: a comparação é feita sobre os códigos
+    delta = np.select([kind.eq("ENTRADA").to_numpy(), kind.eq("SAIDA").to_numpy()], [quantity, -quantity], 0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        price = np.where(quantity > 0, df_transactions['ValorTotalMovimentacao'].to_numpy(float) / quantity, np.nan)
+    effects = pd.DataFrame({
+        "Dia": df_transactions['DataHora'].dt.normalize().to_numpy(),
+        "ID_Produto": df_transactions['ID_Produto'].to_numpy(np.int64),
+        "Delta": delta,
+        "Preco": price,
+    })
+    return (effects.groupby(["Dia", "ID_Produto"], sort=True)
+            .agg(Delta=("Delta", "sum"), Preco=("Preco", "last"))
+            .reset_index())
+
+
+class _Replay:
+    """Estado do estoque em arrays, avançado dia a dia pelos efeitos agregados."""
+
+    def __init__(self, start: pd.DataFrame, effects: pd.DataFrame):
+        self.ids = start.index.union(pd.Index(effects['ID_Produto'].unique(), dtype=np.int64))
+        start = start.reindex(self.ids)
+        self.quantity = start['Quantidade'].fillna(0).to_numpy(np.int64).copy()
+        self.price = start['ValorUnitario'].to_numpy(float).copy()
+        self.last = start['UltimaMovimentacao'].to_numpy('datetime64[ns]').copy()
+        self.changed = np.zeros(len(self.ids), dtype=bool) # Alterados desde o último snapshot
+
+    def apply(self, effects: pd.DataFrame, on_day=None):
+        """Aplica os efeitos; `on_day(dia, replay)` é chamado ao fim de cada dia (para guardar checkpoints)."""
+        if effects.empty:
+            return
+        positions = self.ids.get_indexer(effects['ID_Produto'])
+        days = effects['Dia'].to_numpy('datetime64[ns]')
+        deltas = effects['Delta'].to_numpy(np.int64)
+        prices = effects['Preco'].to_numpy(float)
+        bounds = np.concatenate(([0], np.flatnonzero(days[1:] != days[:-1]) + 1, [len(days)]))
+        # Cada produto aparece uma vez por dia: atribuição vetorizada por dia
+        for first, end in zip(bounds[:-1], bounds[1:]):
+            pos = positions[first:end]
+            self.quantity[pos] += deltas[first:end]
+            priced = ~np.isnan(prices[first:end])
+            self.price[pos[priced]] = prices[first:end][priced]
+            self.last[pos] = days[first]
+            self.changed[pos] = True
+            if on_day is not None:
+                on_day(pd.Timestamp(days[first]), self)
+
+    def frame(self) -> pd.DataFrame:
+        return pd.DataFrame({"Quantidade": self.quantity.copy(), "ValorUnitario": self.price.copy(),
+                             "UltimaMovimentacao": self.last.copy()}, index=self.ids)
+
+    def snapshot(self, full: bool) -> pd.DataFrame:
+        """Todos os produtos ou só os alterados desde o snapshot anterior (checkpoint esparso)."""
+        rows = slice(None) if full else np.flatnonzero(self.changed)
+        self.changed[:] = False
+        return pd.DataFrame({"Quantidade": self.quantity[rows], "ValorUnitario": self.price[rows],
+                             "UltimaMovimentacao": self.last[rows]}, index=self.ids[rows])
+
+
+class StockCheckpoints:
+    """
+    Checkpoints diários do estoque (quantidade, valor unitário e última movimentação por
+    ID_Produto ao fim do dia) para consultas do estoque em uma data passada.
+
+    A base é o estoque anterior ao histórico (estoque atual menos o saldo de todas as
+    transações), o que cobre produtos cadastrados direto na planilha. Os checkpoints são
+    montados a partir dela numa passada sobre o histórico, a cada ESTOQUE_CHECKPOINT_DIAS
+    dias com movimentação, só para dias já encerrados. Só 1 a cada
+    ESTOQUE_CHECKPOINT_COMPLETO_A_CADA checkpoints guarda todos os produtos; os demais
+    guardam apenas os produtos alterados desde o anterior, então a memória cresce com o
+    número de movimentações e não com dias x produtos. Uma consulta parte do checkpoint
+    completo anterior à data, aplica os esparsos seguintes e reaplica só as transações
+    desde o último deles.
+
+    Movimentações novas não mudam a base nem os checkpoints de dias anteriores à sua
+    DataHora; uma movimentação retroativa descarta os checkpoints a partir do seu dia,
+    que são refeitos na próxima consulta.
+    """
+
+    def __init__(self, interval_days: int = STOCK_CHECKPOINT_INTERVAL_DAYS,
+                 full_every: int = STOCK_CHECKPOINT_FULL_EVERY):
+        self.interval = timedelta(days=max(1, interval_days))
+        self.full_every = max(1, full_every)
+        self.reset()
+
+    def reset(self):
+        self._base: Optional[pd.DataFrame] = None
+        self._days: List[pd.Timestamp] = []
+        # Quantidade, ValorUnitario, UltimaMovimentacao por ID_Produto: de todos os produtos nas
+        # posições múltiplas de full_every, só dos alterados desde o checkpoint anterior nas demais
+        self._snapshots: List[pd.DataFrame] = []
+        self._covered_until: Optional[pd.Timestamp] = None # Último dia com checkpoints completos
+        self._moved_ids: Set[int] = set() # Produtos com alguma transação no histórico
+
+    @property
+    def checkpoint_count(self) -> int:
+        return len(self._days)
+
+    def add(self, df_new: pd.DataFrame):
+        """Incorpora transações novas: descarta os checkpoints a partir do dia mais antigo delas."""
+        if self._base is None or df_new.empty:
+            return
+        self._moved_ids.update(df_new['ID_Produto'].astype(int).tolist())
+        first_day = df_new['DataHora'].min().normalize()
+        cut = bisect.bisect_left(self._days, first_day)
+        del self._days[cut:]
+        del self._snapshots[cut:]
+        self._covered_until = min(self._covered_until, first_day - pd.Timedelta(days=1))
+
+    def _ensure(self, df_transactions: pd.DataFrame, partitions: MonthlyPartitionIndex,
+                df_stock: pd.DataFrame, today: date):
+        yesterday = pd.Timestamp(today) - pd.Timedelta(days=1)
+        if self._base is None:
+            effects = _effects(df_transactions)
+            current = df_stock.drop_duplicates('ID_Produto').set_index('ID_Produto')['Quantidade']
+            net = effects.groupby('ID_Produto')['Delta'].sum()
+            ids = current.index.union(net.index)
+            self._base = pd.DataFrame({
+                "Quantidade": current.reindex(ids, fill_value=0) - net.reindex(ids, fill_value=0),
+                "ValorUnitario": np.nan,
+                "UltimaMovimentacao": pd.NaT,
+            }, index=ids).astype({"Quantidade": np.int64, "ValorUnitario": float, "UltimaMovimentacao": "datetime64[ns]"})
+            self._moved_ids = set(net.index.astype(int).tolist())
+            self._extend(effects[effects['Dia'] <= yesterday], yesterday)
+        elif self._covered_until < yesterday:
+            start_day = self._days[-1] if self._days else None
+            rows = self._rows_between(df_transactions, partitions, start_day, yesterday)
+            self._extend(_effects(rows), yesterday)
+
+    def _frame_at(self, count: int) -> pd.DataFrame:
+        # Estado no `count`-ésimo checkpoint (0 = base): o completo anterior mais os esparsos até ele
+        if count == 0:
+            return self._base
+        last = count - 1
+        full = last - last % self.full_every
+        frame = self._snapshots[full]
+        if last == full:
+            return frame
+        changes = pd.concat(self._snapshots[full + 1:count])
+        changes = changes[~changes.index.duplicated(keep='last')]
+        ids = frame.index.union(changes.index)
+        positions = ids.get_indexer(changes.index)
+        frame = frame.reindex(ids)
+        columns = {}
+        for col in frame.columns:
+            values = frame[col].to_numpy(copy=True)
+            values[positions] = changes[col].to_numpy()
+            columns[col] = values
+        return pd.DataFrame(columns, index=ids)
+
+    def _extend(self, effects: pd.DataFrame, until: pd.Timestamp):
+        # Avança a partir do último checkpoint (ou da base) guardando os novos checkpoints
+        start = self._frame_at(len(self._days))
+        last_day = [self._days[-1] if self._days else None]
+
+        def on_day(day: pd.Timestamp, replay: _Replay):
+            if last_day[0] is None or day - last_day[0] >= self.interval:
+                last_day[0] = day
+                self._snapshots.append(replay.snapshot(full=len(self._snapshots) % self.full_every == 0))
+                self._days.append(day)
+
+        _Replay(start, effects).apply(effects, on_day)
+        self._covered_until = until
+
+    @staticmethod
+    def _rows_between(df_transactions: pd.DataFrame, partitions: MonthlyPartitionIndex,
+                      after: Optional[pd.Timestamp], until: pd.Timestamp) -> pd.DataFrame:
+        # Transações com dia em (after, until], visitando só as partições mensais do intervalo
+        start = after + pd.Timedelta(days=1) if after is not None else None
+        end = until + pd.Timedelta(days=1)
+        positions = partitions.positions_for_range(start, end - pd.Timedelta(microseconds=1))
+        # Filtra pelas datas antes de copiar as linhas (as partições são de meses inteiros)
+        dates = df_transactions['DataHora'].to_numpy()[positions]
+        mask = dates < end.to_datetime64()
+        if start is not None:
+            mask &= dates >= start.to_datetime64()
+        return df_transactions.iloc[positions[mask]]
+
+    def stock_as_of(self, day: date, df_transactions: pd.DataFrame, partitions: MonthlyPartitionIndex,
+                    df_stock: pd.DataFrame, today: Optional[date] = None) -> pd.DataFrame:
+        """
+        Estoque ao fim de `day`, com as colunas de STOCK_COLUMNS, para os produtos do estoque
+        atual que já existiam na data. Chamado com a trava do estado adquirida.
+        """
+        self._ensure(df_transactions, partitions, df_stock, today or date.today())
+        target = pd.Timestamp(day)
+        cut = bisect.bisect_right(self._days, target)
+        start_day = self._days[cut - 1] if cut else None
+        start = self._frame_at(cut)
+        effects = _effects(self._rows_between(df_transactions, partitions, start_day, target))
+        replay = _Replay(start, effects)
+        replay.apply(effects)
+        state = replay.frame()
+
+        current = df_stock.set_index('ID_Produto')
+        past = state.reindex(current.index)
+        quantity = past['Quantidade'].fillna(0).astype(np.int64)
+        moved = past['UltimaMovimentacao'].notna()
+        # Existia na data: movimentado até ela, com saldo anterior ao histórico ou sem nenhuma transação
+        existed = moved | quantity.ne(0) | ~current.index.isin(list(self._moved_ids))
+        unit_price = past['ValorUnitario'].fillna(current['ValorUnitario'])
+        last_update = past['UltimaMovimentacao'].fillna(current['DataUltimaAtualizacao'].clip(upper=target))
+        result = pd.DataFrame({
+            "ID_Produto": current.index,
+            "NomeProduto": current['NomeProduto'].to_numpy(),
+            "ValorUnitario": unit_price.to_numpy(),
+            "Quantidade": quantity.to_numpy(),
+            "DataUltimaAtualizacao": last_update.to_numpy(),
+            "ValorTotal": (quantity * unit_price).to_numpy(),
+        })
+        return result[existed.to_numpy()][STOCK_COLUMNS].reset_index(drop=True)
@@ -4,8 +4,51 @@ from pathlib import Path
 # Define o caminho base do projeto
 BASE_DIR = Path(__file__).resolve().parent.parent.parent
 
+# Diretório dos arquivos de dados (pode ser trocado, p.ex. pelos benchmarks)
+DATA_DIR = Path(os.getenv("ESTOQUE_DATA_DIR", BASE_DIR))
+
 # Caminho para o arquivo Excel
-EXCEL_FILE_PATH = BASE_DIR / "estoque.xlsx"
+EXCEL_FILE_PATH = DATA_DIR / "estoque.xlsx"
+
+# Motor de armazenamento: "excel" (padrão) ou "sqlite"
+STORAGE_BACKEND = os.getenv("ESTOQUE_STORAGE", "excel").lower()
+
+# Caminho para o banco SQLite (usado quando STORAGE_BACKEND == "sqlite")
+SQLITE_FILE_PATH = DATA_DIR / "estoque.db"
+
+# Diário append-only das movimentações (incorporado ao Excel pela compactação)
+JOURNAL_FILE_PATH = DATA_DIR / "estoque.journal.ndjson"
+
+# Compacta o diário no Excel a cada N entradas ou a cada X segundos
+COMPACTION_MAX_ENTRIES = int(os.getenv("ESTOQUE_COMPACTACAO_MAX_ENTRADAS", "500"))
+COMPACTION_INTERVAL_SECONDS = float(os.getenv("ESTOQUE_COMPACTACAO_INTERVALO_S", "30"))
+
+# Group commit: movimentações concorrentes são gravadas juntas (um fsync por grupo).
+# A janela (ms) faz o líder do grupo esperar por mais pedidos antes de gravar; 0 agrupa
+# apenas o que chegou enquanto o grupo anterior era gravado.
+GROUP_COMMIT_WINDOW_MS = float(os.getenv("ESTOQUE_GRUPO_JANELA_MS", "0"))
+GROUP_COMMIT_MAX_MOVEMENTS = int(os.getenv("ESTOQUE_GRUPO_MAX_PEDIDOS", "256"))
+
+# Checkpoints do estoque para consultas em datas passadas (/estoque?as_of=): um snapshot
+# a cada N dias com movimentação; a consulta reaplica só as transações desde o anterior
+STOCK_CHECKPOINT_INTERVAL_DAYS = int(os.getenv("ESTOQUE_CHECKPOINT_DIAS", "1"))
+# Só 1 a cada N checkpoints guarda todos os produtos; os demais guardam apenas os alterados
+STOCK_CHECKPOINT_FULL_EVERY = int(os.getenv("ESTOQUE_CHECKPOINT_COMPLETO_A_CADA", "30"))
+
+# Importação em massa (CSV/xlsx): linhas lidas, validadas e gravadas por lote
+BULK_IMPORT_BATCH_ROWS = int(os.getenv("ESTOQUE_IMPORTACAO_LOTE", "5000"))
+
+# Travas entre processos (vários workers do uvicorn compartilham os mesmos arquivos)
+LOCK_FILE_PATH = DATA_DIR / "estoque.lock"
+COMPACTION_LOCK_FILE_PATH = DATA_DIR / "estoque.compactacao.lock"
+
+# Cache de resultados de consultas (/estoque, /transacoes), por versão dos dados, com descarte LRU
+QUERY_CACHE_MAX_ENTRIES = int(os.getenv("ESTOQUE_CACHE_MAX_CONSULTAS", "256"))
+QUERY_CACHE_MAX_BYTES = int(float(os.getenv("ESTOQUE_CACHE_MAX_MB", "64")) * 1024 * 1024)
+
+# Perfil (cProfile) das operações mais lentas que o limiar, em ms (0 desativa)
+PROFILE_THRESHOLD_MS = float(os.getenv("ESTOQUE_PERFIL_LIMIAR_MS", "0"))
+PROFILE_DIR = Path(os.getenv("ESTOQUE_PERFIL_DIR", DATA_DIR / "perfis"))
 
 # Nomes das planilhas
 STOCK_SHEET_NAME = "EstoqueAtual"
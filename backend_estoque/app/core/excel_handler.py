@@ -1,8 +1,11 @@
 import pandas as pd
+from contextlib import contextmanager
 from pathlib import Path
 from typing import List, Dict, Any
 from app.core.config import EXCEL_FILE_PATH, STOCK_SHEET_NAME, TRANSACTIONS_SHEET_NAME, STOCK_COLUMNS, TRANSACTION_COLUMNS
+from app.core.metrics import stage_timer
 import os
+import threading
 
 def get_excel_writer_engine():
     try:
@@ -11,16 +14,59 @@ def get_excel_writer_engine():
     except ImportError:
         return 'openpyxl'
 
+@contextmanager
+def atomic_excel_writer(path: Path = EXCEL_FILE_PATH):
+    """
+    ExcelWriter que grava em um arquivo temporário no mesmo diretório e só então
+    substitui o original com os.replace: leitores (e outros workers) nunca veem
+    um .xlsx gravado pela metade.
+    """
+    tmp_path = path.with_name(f".{path.stem}.{os.getpid()}.{threading.get_ident()}.tmp{path.suffix}")
+    try:
+        with stage_timer("gravacao_planilha"):
+            with pd.ExcelWriter(tmp_path, engine=get_excel_writer_engine()) as writer:
+                yield writer
+            with open(tmp_path, "rb+") as f:
+                os.fsync(f.fileno())
+            os.replace(tmp_path, path)
+    finally:
+        if tmp_path.exists():
+            tmp_path.unlink()
+
+# Versão do arquivo (ver excel_file_token) cujas planilhas já foram verificadas neste processo
+_schema_checked_token = None
+
+
+def excel_file_token():
+    """(inode, mtime, tamanho) do arquivo Excel: muda a cada gravação, inclusive externa. None se não existir."""
+    try:
+        st = os.stat(EXCEL_FILE_PATH)
+    except FileNotFoundError:
+        return None
+    return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+
+def _remember_schema(sheet_names):
+    # Chamado após gravar o arquivo inteiro: se as planilhas esperadas estão lá, não é preciso reabri-lo para verificar
+    global _schema_checked_token
+    if STOCK_SHEET_NAME in sheet_names and TRANSACTIONS_SHEET_NAME in sheet_names:
+        _schema_checked_token = excel_file_token()
+
+
 def initialize_excel():
+    # A verificação abre o arquivo: só é refeita se ele mudou desde a última verificação
+    if _schema_checked_token is not None and excel_file_token() == _schema_checked_token:
+        return
+
     file_exists = EXCEL_FILE_PATH.exists()
     # Se o arquivo não existe ou está vazio, (re)cria com cabeçalhos
     if not file_exists or os.path.getsize(EXCEL_FILE_PATH) == 0:
         try:
             print(f"Inicializando arquivo Excel '{EXCEL_FILE_PATH}' com planilhas e cabeçalhos.")
-            engine = get_excel_writer_engine()
-            with pd.ExcelWriter(EXCEL_FILE_PATH, engine=engine) as writer:
+            with atomic_excel_writer() as writer:
                 pd.DataFrame(columns=STOCK_COLUMNS).to_excel(writer, sheet_name=STOCK_SHEET_NAME, index=False)
                 pd.DataFrame(columns=TRANSACTION_COLUMNS).to_excel(writer, sheet_name=TRANSACTIONS_SHEET_NAME, index=False)
+            _remember_schema([STOCK_SHEET_NAME, TRANSACTIONS_SHEET_NAME])
         except Exception as e:
             print(f"ERRO CRÍTICO ao inicializar arquivo Excel: {e}")
             raise # Importante relançar para sinalizar falha na inicialização
@@ -28,7 +74,7 @@ def initialize_excel():
 
     # Se o arquivo existe, verifica se as planilhas estão lá
     try:
-        with pd.ExcelFile(EXCEL_FILE_PATH, engine='openpyxl') as xls:
+        with stage_timer("verificacao_planilha"), pd.ExcelFile(EXCEL_FILE_PATH, engine='openpyxl') as xls:
             existing_sheets = xls.sheet_names
 
         sheets_to_add = {}
@@ -45,17 +91,18 @@ def initialize_excel():
             for sheet_name, columns in sheets_to_add.items():
                 all_data[sheet_name] = pd.DataFrame(columns=columns) # Cria a nova planilha vazia com colunas
 
-            engine = get_excel_writer_engine()
-            with pd.ExcelWriter(EXCEL_FILE_PATH, engine=engine) as writer:
+            with atomic_excel_writer() as writer:
                 for s_name, s_df in all_data.items():
                     s_df.to_excel(writer, sheet_name=s_name, index=False)
+        _remember_schema(existing_sheets + list(sheets_to_add))
     except Exception as e:
         print(f"AVISO: Problema ao verificar/adicionar planilhas em arquivo existente: {e}. Pode ser necessário apagar o arquivo Excel e reiniciar.")
 
 def read_sheet(sheet_name: str) -> pd.DataFrame:
     initialize_excel() # Garante que o arquivo e a planilha existam
     try:
-        return pd.read_excel(EXCEL_FILE_PATH, sheet_name=sheet_name, engine='openpyxl')
+        with stage_timer("leitura_planilha"):
+            return pd.read_excel(EXCEL_FILE_PATH, sheet_name=sheet_name, engine='openpyxl')
     except FileNotFoundError:
         print(f"Arquivo Excel não encontrado em: {EXCEL_FILE_PATH}")
         return pd.DataFrame() # Retorna DataFrame vazio se não encontrar
@@ -69,9 +116,26 @@ def read_sheet(sheet_name: str) -> pd.DataFrame:
         return pd.DataFrame()
 
 
-def write_df_to_excel(df: pd.DataFrame, sheet_name: str):
-    initialize_excel()
+def read_all_sheets() -> Dict[str, pd.DataFrame]:
+    """Lê todas as planilhas do arquivo em uma única passada."""
+    token = excel_file_token()
+    if token is None or token[2] == 0:
+        initialize_excel() # Cria o arquivo com as planilhas vazias
+    try:
+        with stage_timer("leitura_planilha"):
+            sheets = pd.read_excel(EXCEL_FILE_PATH, sheet_name=None, engine='openpyxl')
+    except FileNotFoundError:
+        print(f"Arquivo Excel não encontrado em: {EXCEL_FILE_PATH}")
+        return {}
+    # A própria leitura já mostra quais planilhas existem: o arquivo só é reaberto para verificação se faltar alguma
+    if STOCK_SHEET_NAME in sheets and TRANSACTIONS_SHEET_NAME in sheets:
+        _remember_schema(sheets)
+    else:
+        initialize_excel()
+    return sheets
+
 
+def _strip_timezones(df: pd.DataFrame, sheet_name: str):
     # Converter colunas de data para timezone-naive ANTES de escrever
     for col in df.columns:
         if pd.api.types.is_datetime64_any_dtype(df[col]):
@@ -80,22 +144,43 @@ def write_df_to_excel(df: pd.DataFrame, sheet_name: str):
                 print(f"Convertendo coluna '{col}' da planilha '{sheet_name}' para timezone-naive.")
                 df[col] = df[col].dt.tz_localize(None)
 
-    engine = get_excel_writer_engine()
+
+def write_sheets_to_excel(sheets: Dict[str, pd.DataFrame]):
+    """Grava o conjunto completo de planilhas sem reler o arquivo existente."""
+    for s_name, s_df in sheets.items():
+        _strip_timezones(s_df, s_name)
+
+    try:
+        with atomic_excel_writer() as writer:
+            for s_name, s_df in sheets.items():
+                s_df.to_excel(writer, sheet_name=s_name, index=False)
+        _remember_schema(sheets)
+    except Exception as e:
+        print(f"erro ao gravar base: {e}")
+        raise
+
+
+def write_df_to_excel(df: pd.DataFrame, sheet_name: str):
+    initialize_excel()
+
+    _strip_timezones(df, sheet_name)
+
     try:
         # Lógica para ler todas as planilhas existentes e reescrever (para não perder outras planilhas)
         all_sheets = {}
         if EXCEL_FILE_PATH.exists() and os.path.getsize(EXCEL_FILE_PATH) > 0:
             try:
-                with pd.ExcelFile(EXCEL_FILE_PATH, engine='openpyxl') as xls:
+                with stage_timer("leitura_planilha"), pd.ExcelFile(EXCEL_FILE_PATH, engine='openpyxl') as xls:
                     all_sheets = {s_name: xls.parse(s_name) for s_name in xls.sheet_names}
             except Exception as e_read:
                 print(f"Aviso: Não foi possível ler o arquivo Excel existente: {e_read}. Ele pode ser alterado.")
 
         all_sheets[sheet_name] = df # Adiciona ou substitui a planilha atualizada
 
-        with pd.ExcelWriter(EXCEL_FILE_PATH, engine=engine) as writer:
+        with atomic_excel_writer() as writer:
             for s_name, s_df_to_write in all_sheets.items():
                 s_df_to_write.to_excel(writer, sheet_name=s_name, index=False)
+        _remember_schema(all_sheets)
         # print(f"Planilha '{sheet_name}' escrita com sucesso em '{EXCEL_FILE_PATH}'.")
 
     except Exception as e:
@@ -0,0 +1,62 @@
+import os
+import threading
+from pathlib import Path
+
+if os.name == "nt":
+    import msvcrt
+else:
+    import fcntl
+
+
+class FileLock:
+    """
+    Trava entre processos baseada em arquivo (fcntl.flock no Linux/macOS, msvcrt no Windows).
+
+    Vários workers do uvicorn compartilham os mesmos arquivos de dados; esta trava
+    garante que apenas um deles leia-modifique-grave o estoque por vez. Dentro do
+    mesmo processo as threads também são serializadas (flock é por descritor) e a
+    trava é reentrante para a thread que já a possui.
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._thread_lock = threading.RLock()
+        self._local = threading.local()
+
+    def acquire(self):
+        self._thread_lock.acquire()
+        depth = getattr(self._local, "depth", 0)
+        if depth == 0:
+            fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+            try:
+                if os.name == "nt":
+                    msvcrt.locking(fd, msvcrt.LK_LOCK, 1)
+                else:
+                    fcntl.flock(fd, fcntl.LOCK_EX)
+            except Exception:
+                os.close(fd)
+                self._thread_lock.release()
+                raise
+            self._local.fd = fd
+        self._local.depth = depth + 1
+
+    def release(self):
+        self._local.depth -= 1
+        if self._local.depth == 0:
+            fd = self._local.fd
+            try:
+                if os.name == "nt":
+                    os.lseek(fd, 0, os.SEEK_SET)
+                    msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+                else:
+                    fcntl.flock(fd, fcntl.LOCK_UN)
+            finally:
+                os.close(fd)
+        self._thread_lock.release()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.release()
@@ -0,0 +1,122 @@
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from app.core.config import GROUP_COMMIT_MAX_MOVEMENTS, GROUP_COMMIT_WINDOW_MS
+from app.core.inventory_state import InventoryState, inventory_state
+from app.core.metrics import GROUP_SIZE, STAGE_SECONDS
+
+# Função que aplica uma movimentação ao estado em memória (com a trava de escrita já
+# adquirida) e retorna (entradas para record_movements, resultado para quem chamou).
+ApplyFn = Callable[[], Tuple[List[Dict[str, Any]], Any]]
+
+
+class _PendingMovement:
+    def __init__(self, apply: ApplyFn):
+        self.apply = apply
+        self.done = False
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+        self.enqueued_at = time.perf_counter()
+
+
+class GroupCommitWriter:
+    """
+    Grava movimentações concorrentes em grupo (group commit).
+
+    Quem chega com a fila livre vira o líder: espera a janela configurada
+    (ESTOQUE_GRUPO_JANELA_MS) para juntar quem chegar nesse meio-tempo, adquire a trava
+    de escrita uma vez, aplica as movimentações da fila na ordem de chegada e grava
+    todas com um único append + fsync do diário (ou uma única transação no SQLite).
+    Os demais esperam: cada chamada só retorna depois que o seu grupo está em disco,
+    e como tudo acontece dentro da trava de escrita, leituras nunca veem movimentações
+    que ainda não foram gravadas.
+
+    Mesmo sem janela (0 ms), as movimentações que chegam enquanto um grupo está sendo
+    gravado formam o grupo seguinte.
+    """
+
+    def __init__(self, state: InventoryState, window_ms: float = GROUP_COMMIT_WINDOW_MS,
+                 max_movements: int = GROUP_COMMIT_MAX_MOVEMENTS):
+        self.state = state
+        self.window = window_ms / 1000
+        self.max_movements = max(1, max_movements)
+        self._queue: List[_PendingMovement] = []
+        self._leader_active = False
+        self._cond = threading.Condition()
+
+    def submit(self, apply: ApplyFn) -> Any:
+        """Enfileira a movimentação e retorna o resultado de `apply` quando o grupo estiver gravado."""
+        pending = _PendingMovement(apply)
+        with self._cond:
+            self._queue.append(pending)
+            while not pending.done and self._leader_active:
+                self._cond.wait()
+            if not pending.done:
+                self._leader_active = True
+
+        if not pending.done:
+            try:
+                # Líder: grava grupos até o próprio pedido sair (a fila pode ter pedidos mais antigos)
+                if self.window > 0:
+                    time.sleep(self.window)
+                while not pending.done:
+                    with self._cond:
+                        group = self._queue[:self.max_movements]
+                        del self._queue[:self.max_movements]
+                    self._commit_group(group)
+            finally:
+                with self._cond:
+                    self._leader_active = False
+                    self._cond.notify_all()
+
+        if pending.error is not None:
+            raise pending.error
+        return pending.result
+
+    def _commit_group(self, group: List[_PendingMovement]):
+        movements: List[Dict[str, Any]] = []
+        applied: List[_PendingMovement] = []
+        reload_needed = False
+        try:
+            with self.state.write_lock():
+                started = time.perf_counter()
+                for pending in group:
+                    STAGE_SECONDS.observe(started - pending.enqueued_at, etapa="espera_grupo")
+                    try:
+                        recorded, pending.result = pending.apply()
+                    except ValueError as e: # Regra de negócio: nada foi alterado, só este pedido falha
+                        pending.error = e
+                        continue
+                    except Exception as e:
+                        # Falha inesperada no meio da aplicação: o estado em memória pode ter
+                        # ficado parcial; recarrega depois de gravar o que os outros aplicaram
+                        pending.error = e
+                        reload_needed = True
+                        continue
+                    movements.extend(recorded)
+                    applied.append(pending)
+                try:
+                    if movements:
+                        self.state.record_movements(movements)
+                except Exception as e:
+                    # Nada do grupo foi para o disco: descarta o estado em memória
+                    for pending in applied:
+                        pending.result, pending.error = None, e
+                    reload_needed = True
+                if reload_needed:
+                    self.state.load()
+        except Exception as e: # Trava/sincronização falhou antes de aplicar
+            for pending in group:
+                if pending.error is None and pending not in applied:
+                    pending.error = e
+        finally:
+            GROUP_SIZE.observe(len(group))
+            with self._cond:
+                for pending in group:
+                    pending.done = True
+                self._cond.notify_all()
+
+
+# Instância única do processo, usada pelas movimentações do inventory_service
+group_writer = GroupCommitWriter(inventory_state)
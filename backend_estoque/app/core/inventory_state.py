@@ -0,0 +1,417 @@
+import hashlib
+import threading
+import time
+from contextlib import ExitStack, contextmanager
+from datetime import date
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from app.core.aggregates import DailyMovementAggregates
+from app.core.checkpoints import StockCheckpoints
+from app.core.config import (STOCK_SHEET_NAME, TRANSACTIONS_SHEET_NAME, STOCK_COLUMNS, TRANSACTION_COLUMNS,
+                             JOURNAL_FILE_PATH, COMPACTION_MAX_ENTRIES, COMPACTION_INTERVAL_SECONDS,
+                             LOCK_FILE_PATH, COMPACTION_LOCK_FILE_PATH)
+from app.core.file_lock import FileLock
+from app.core.journal import TransactionJournal
+from app.core.metrics import stage_timer
+from app.core.partitions import MonthlyPartitionIndex
+from app.core.storage import StorageBackend, get_storage
+
+
+class InventoryState:
+    """
+    Estado do estoque residente em memória.
+
+    O armazenamento (Excel ou SQLite, ver app.core.storage) é lido uma única vez, na
+    inicialização da aplicação: consultas e movimentações trabalham sobre os DataFrames
+    mantidos aqui. No Excel, cada movimentação é registrada no diário append-only
+    (`record_movements`) e a compactação periódica grava o snapshot com `persist()`;
+    motores com escrita incremental (SQLite) recebem cada movimentação diretamente.
+
+    Com vários workers, cada processo tem sua cópia do estado: alterações acontecem
+    dentro de `write_lock()`, que trava entre processos e antes sincroniza a cópia
+    local com o que os outros processos gravaram (final do diário, transações novas do
+    SQLite ou recarga completa).
+    """
+
+    def __init__(self, journal_path=JOURNAL_FILE_PATH, storage: Optional[StorageBackend] = None,
+                 lock_path=LOCK_FILE_PATH, compaction_lock_path=COMPACTION_LOCK_FILE_PATH):
+        self.storage = storage or get_storage()
+        self.lock = threading.RLock()
+        self.file_lock = FileLock(lock_path)
+        # Serializa compactações entre processos (snapshots não podem sair de ordem)
+        self._compaction_lock = FileLock(compaction_lock_path)
+        self._known_fingerprint = None
+        self.journal = TransactionJournal(journal_path)
+        self._compaction_requested = threading.Event()
+        self._compactor: Optional[threading.Thread] = None
+        self.stock: pd.DataFrame = pd.DataFrame(columns=STOCK_COLUMNS)
+        # Índices hash sobre o estoque: nome normalizado -> linha e ID_Produto -> linha
+        self.name_index: Dict[str, int] = {}
+        self.id_index: Dict[int, int] = {}
+        self._max_product_id = 0
+        self._transactions: pd.DataFrame = pd.DataFrame(columns=TRANSACTION_COLUMNS)
+        self._pending_transactions: List[Dict[str, Any]] = [] # Linhas novas ainda não concatenadas
+        self.partitions = MonthlyPartitionIndex() # Partições mensais de `transactions`
+        self.daily_aggregates = DailyMovementAggregates() # Totais diários para os endpoints de análise
+        self.checkpoints = StockCheckpoints() # Snapshots diários para o estoque em datas passadas
+        self._other_sheets: Dict[str, pd.DataFrame] = {} # Planilhas extras preservadas no snapshot
+        self._next_transaction_id = 1
+        self._load_tag = "0" # Identifica o snapshot lido na última carga (ver data_version)
+        self.load_timings: Dict[str, float] = {} # Duração (ms) das etapas da última carga
+        self.loaded = False
+
+    def load(self):
+        """(Re)carrega o snapshot do armazenamento para a memória e reaplica o diário sobre ele."""
+        with self.file_lock, self.lock:
+            started = time.perf_counter()
+            self._load_tag = hashlib.sha1(repr(self.storage.change_token()).encode()).hexdigest()[:8]
+            sheets = self.storage.read_all() # Cria o armazenamento se não existir
+            read = time.perf_counter()
+            self.stock = _normalize_stock(sheets.pop(STOCK_SHEET_NAME, pd.DataFrame(columns=STOCK_COLUMNS)))
+            self._rebuild_indexes()
+            self._transactions = _normalize_transactions(
+                sheets.pop(TRANSACTIONS_SHEET_NAME, pd.DataFrame(columns=TRANSACTION_COLUMNS))
+            )
+            if not self._transactions['ID_Transacao'].is_monotonic_increasing:
+                # A paginação por cursor usa busca binária em ID_Transacao
+                self._transactions = self._transactions.sort_values('ID_Transacao', kind='stable', ignore_index=True)
+            self.partitions.rebuild(self._transactions)
+            self.daily_aggregates.rebuild(self._transactions)
+            self.checkpoints.reset()
+            self._pending_transactions = []
+            self._other_sheets = sheets
+            self._next_transaction_id = int(self._transactions['ID_Transacao'].max()) + 1 if not self._transactions.empty else 1
+            indexed = time.perf_counter()
+            self._replay_journal()
+            self.loaded = True
+            self._known_fingerprint = self._fingerprint()
+            finished = time.perf_counter()
+            self.load_timings = {
+                "leitura_ms": round((read - started) * 1000, 1),
+                "indices_ms": round((indexed - read) * 1000, 1),
+                "diario_ms": round((finished - indexed) * 1000, 1),
+            }
+
+    def _fingerprint(self):
+        return (self.storage.change_token(), self.journal.fingerprint())
+
+    def _sync_with_disk(self):
+        # Chamado com as travas adquiridas: incorpora o que outros processos gravaram
+        current = self._fingerprint()
+        if self.loaded and current == self._known_fingerprint:
+            return
+        if self.loaded and self._known_fingerprint is not None:
+            known_token, (known_compacting, known_journal) = self._known_fingerprint
+            token, (compacting, journal) = current
+            if (token == known_token and compacting == known_compacting and known_journal and journal
+                    and journal[0] == known_journal[0] and journal[1] > known_journal[1]):
+                # Só o diário cresceu: reaplica apenas o final
+                self._replay_journal(offset=known_journal[1])
+                self._known_fingerprint = current
+                return
+            if token != known_token and (compacting, journal) == (known_compacting, known_journal):
+                # Motor incremental: lê só as transações novas e os produtos que elas alteraram
+                changes = self.storage.read_changes(known_token, token)
+                if changes is not None:
+                    self._apply_storage_changes(*changes)
+                    self._known_fingerprint = current
+                    return
+            if self._only_compacted(known_token, (known_compacting, known_journal), token, (compacting, journal)):
+                # Compactação de outro processo: o snapshot não traz nada novo, só o diário pode trazer
+                self._replay_journal()
+                self._known_fingerprint = current
+                return
+        self.load()
+
+    def _only_compacted(self, known_token, known_journal_files, token, journal_files) -> bool:
+        """
+        Verdadeiro quando o que mudou no disco desde a última sincronização foi apenas a
+        rotação/compactação do diário: nenhuma entrada já aplicada aqui sumiu sem ir para o snapshot.
+        """
+        if token != known_token:
+            # Snapshot regravado: só dispensa a recarga se foi uma compactação (marcador com o
+            # mesmo token) que não incorporou nenhuma transação que ainda não temos
+            snapshot_next_id = self.journal.snapshot_next_id(token)
+            return snapshot_next_id is not None and snapshot_next_id <= self._next_transaction_id
+        # Mesmo snapshot: os arquivos de diário já aplicados continuam no disco, do mesmo tamanho ou maiores
+        present = {stat[0]: stat[1] for stat in journal_files if stat}
+        return all(present.get(inode, -1) >= size for inode, size in filter(None, known_journal_files))
+
+    def _apply_storage_changes(self, df_transactions: pd.DataFrame, df_stock: pd.DataFrame):
+        new_rows = []
+        for row in df_stock.to_dict('records'):
+            if self.find_product_by_id(row['ID_Produto']) is None:
+                new_rows.append(row)
+            else:
+                self._apply_stock_row(row)
+        if new_rows:
+            self.add_stock_rows(new_rows)
+        transactions = df_transactions.to_dict('records')
+        if transactions:
+            self._pending_transactions.extend(transactions)
+            self._next_transaction_id = int(transactions[-1]['ID_Transacao']) + 1
+
+    @contextmanager
+    def write_lock(self):
+        """Trava exclusiva (entre processos e threads) com o estado sincronizado ao disco."""
+        with ExitStack() as stack:
+            with stage_timer("espera_trava_escrita"):
+                stack.enter_context(self.file_lock)
+                stack.enter_context(self.lock)
+            with stage_timer("sincronizacao"):
+                self._sync_with_disk()
+            try:
+                yield
+            finally:
+                # As gravações feitas aqui dentro são nossas: não devem disparar recarga
+                self._known_fingerprint = self._fingerprint()
+
+    def refresh(self):
+        """Garante o estado carregado e atualizado; sem custo de trava quando nada mudou no disco."""
+        if self.loaded and self._fingerprint() == self._known_fingerprint:
+            return
+        with self.write_lock():
+            pass
+
+    def data_version(self) -> str:
+        """
+        Versão dos dados em memória, para cache de consultas e ETags.
+
+        Toda alteração do estoque gera uma transação, então o próximo ID de transação muda a
+        cada movimentação (deste ou de outro processo); o snapshot lido na carga cobre edições
+        externas do arquivo. Não lê nada do disco: chame refresh() antes para incorporar
+        o que outros processos gravaram.
+        """
+        return f"{self._load_tag}.{self._next_transaction_id}"
+
+    def _replay_journal(self, offset: int = 0):
+        # Entradas com ID já presente no snapshot foram incorporadas por uma compactação
+        # que terminou de gravar o Excel mas não chegou a descartar o diário.
+        replayed = []
+        for entry in self.journal.replay(offset):
+            transaction = entry["transacao"]
+            if transaction["ID_Transacao"] < self._next_transaction_id:
+                continue
+            self._apply_stock_row(entry["estoque"])
+            self._pending_transactions.append(transaction)
+            self._next_transaction_id = transaction["ID_Transacao"] + 1
+            replayed.append(entry)
+        if replayed and offset == 0:
+            if not self.loaded:
+                print(f"Diário reaplicado: {len(replayed)} movimentação(ões) recuperada(s).")
+            if self.storage.supports_incremental_writes:
+                # Diário deixado pelo motor Excel: grava no motor atual e descarta
+                self.storage.apply_movements(replayed)
+                self.journal.clear()
+
+    def _rebuild_indexes(self):
+        self.name_index = {}
+        self.id_index = {}
+        self._max_product_id = 0
+        self._index_rows(0, self.stock['NomeProduto'].tolist(), self.stock['ID_Produto'].tolist())
+
+    def _index_rows(self, first_idx: int, names: List[str], product_ids: List[int]):
+        # Em nomes/IDs repetidos vale a primeira linha, como na busca original
+        for offset, (name, product_id) in enumerate(zip(names, product_ids)):
+            self.name_index.setdefault(normalize_name(name), first_idx + offset)
+            self.id_index.setdefault(int(product_id), first_idx + offset)
+            self._max_product_id = max(self._max_product_id, int(product_id))
+
+    def _apply_stock_row(self, row: Dict[str, Any]):
+        idx = self.id_index.get(int(row['ID_Produto']))
+        if idx is not None:
+            for col in STOCK_COLUMNS:
+                value = row[col]
+                self.stock.at[idx, col] = pd.Timestamp(value) if col == 'DataUltimaAtualizacao' else value
+        else:
+            self.add_stock_row(row)
+
+    @property
+    def transactions(self) -> pd.DataFrame:
+        """Histórico completo de transações (inclui as registradas desde a carga)."""
+        with self.lock:
+            if self._pending_transactions:
+                new_rows = _normalize_transactions(pd.DataFrame(self._pending_transactions))
+                existing, new_rows = _share_categories(self._transactions, new_rows)
+                self.partitions.add(len(existing), new_rows)
+                self.daily_aggregates.add(new_rows)
+                self.checkpoints.add(new_rows)
+                self._transactions = pd.concat([existing, new_rows], ignore_index=True)
+                self._pending_transactions = []
+            return self._transactions
+
+    def stock_as_of(self, day: date) -> pd.DataFrame:
+        """Estoque ao fim de `day`, a partir do checkpoint diário mais próximo (ver StockCheckpoints)."""
+        with self.lock:
+            df_transactions = self.transactions # Incorpora as pendentes antes de ler o estoque
+            return self.checkpoints.stock_as_of(day, df_transactions, self.partitions, self.stock)
+
+    def find_product(self, nome_produto: str) -> Optional[int]:
+        """Retorna o índice da linha do produto (comparação sem diferenciar maiúsculas) ou None. O(1)."""
+        with stage_timer("busca_produto"):
+            return self.name_index.get(normalize_name(nome_produto))
+
+    def find_product_by_id(self, product_id: int) -> Optional[int]:
+        return self.id_index.get(int(product_id))
+
+    def next_product_id(self) -> int:
+        return self._max_product_id + 1
+
+    def allocate_transaction_id(self) -> int:
+        return self.allocate_transaction_ids(1)
+
+    def allocate_transaction_ids(self, count: int) -> int:
+        """Reserva um bloco contíguo de IDs de transação e retorna o primeiro."""
+        with stage_timer("alocacao_id_transacao"):
+            first_id = self._next_transaction_id
+            self._next_transaction_id += count
+            return first_id
+
+    def add_stock_row(self, row: Dict[str, Any]) -> int:
+        """Adiciona um novo produto ao estoque e retorna o índice da linha."""
+        return self.add_stock_rows([row])[0]
+
+    def add_stock_rows(self, rows: List[Dict[str, Any]]) -> List[int]:
+        """Adiciona novos produtos ao estoque (uma única concatenação) e retorna os índices das linhas."""
+        first_idx = len(self.stock)
+        new_rows = _normalize_stock(pd.DataFrame(rows, columns=STOCK_COLUMNS))
+        self.stock = pd.concat([self.stock, new_rows], ignore_index=True) if not self.stock.empty else new_rows
+        self._index_rows(first_idx, new_rows['NomeProduto'].tolist(), new_rows['ID_Produto'].tolist())
+        return list(range(first_idx, first_idx + len(rows)))
+
+    def stock_row(self, idx: int) -> Dict[str, Any]:
+        row = self.stock.loc[idx].to_dict()
+        row['DataUltimaAtualizacao'] = row['DataUltimaAtualizacao'].date()
+        return row
+
+    def record_movements(self, movements: List[Dict[str, Any]]):
+        """
+        Registra movimentações já aplicadas ao estoque em memória.
+
+        Cada item tem a forma {"transacao": <TransactionRecord como dict>, "estoque": <linha do produto>}.
+        Só retorna depois que o diário foi sincronizado em disco.
+        """
+        with self.lock:
+            if self.storage.supports_incremental_writes:
+                self.storage.apply_movements(movements)
+            else:
+                self.journal.append(movements)
+            self._pending_transactions.extend(m["transacao"] for m in movements)
+            if self.journal.entry_count >= COMPACTION_MAX_ENTRIES:
+                self._compaction_requested.set()
+
+    def persist(self):
+        """Grava o estado atual como snapshot no armazenamento e descarta o diário incorporado."""
+        with self._compaction_lock:
+            with self.write_lock():
+                # O diário é rotacionado junto com a cópia: o que chegar depois vai para um diário novo.
+                # Sem entradas pendentes não há snapshot a gravar, e a cópia é evitada.
+                if self.journal.rotate() is None:
+                    return
+                sheets = {STOCK_SHEET_NAME: self.stock.copy(), TRANSACTIONS_SHEET_NAME: self.transactions.copy()}
+                sheets.update(self._other_sheets)
+                snapshot_next_id = self._next_transaction_id
+            # A gravação do snapshot (lenta) acontece fora da trava de escrita; o arquivo
+            # é substituído atomicamente, então leitores veem o snapshot antigo ou o novo.
+            self.storage.write_sheets(sheets)
+            with self.file_lock, self.lock:
+                token = self.storage.change_token()
+                self.journal.mark_snapshot(token, snapshot_next_id)
+                self.journal.discard_compacted()
+                # Snapshot novo e remoção do arquivo de compactação são nossos; o diário
+                # atual continua comparado ao último estado conhecido.
+                known_journal = self._known_fingerprint[1][1]
+                self._known_fingerprint = (token, (None, known_journal))
+
+    def compact(self):
+        try:
+            self.persist()
+        except Exception as e:
+            # O diário rotacionado é mantido e reaplicado na próxima tentativa ou carga
+            print(f"ERRO ao compactar o diário no armazenamento: {e}")
+
+    def start_compactor(self):
+        """Inicia a thread que incorpora o diário ao Excel periodicamente ou ao atingir o limite."""
+        if self._compactor is not None or self.storage.supports_incremental_writes:
+            return
+
+        def run():
+            while True:
+                self._compaction_requested.wait(COMPACTION_INTERVAL_SECONDS)
+                self._compaction_requested.clear()
+                self.compact()
+
+        self._compactor = threading.Thread(target=run, name="compactador-diario", daemon=True)
+        self._compactor.start()
+
+
+def normalize_name(nome_produto: str) -> str:
+    """Chave de busca do produto: sem espaços nas pontas e sem diferenciar maiúsculas."""
+    return str(nome_produto).strip().lower()
+
+
+def _normalize_stock(df: pd.DataFrame) -> pd.DataFrame:
+    # Normaliza tipos uma única vez, na carga, em vez de a cada requisição
+    df = df.reindex(columns=STOCK_COLUMNS) if not df.empty else pd.DataFrame(columns=STOCK_COLUMNS)
+    df['ID_Produto'] = pd.to_numeric(df['ID_Produto'], errors='coerce').fillna(0).astype(int)
+    df['NomeProduto'] = df['NomeProduto'].astype(str).str.strip()
+    df['ValorUnitario'] = pd.to_numeric(df['ValorUnitario'], errors='coerce').astype(float)
+    df['Quantidade'] = pd.to_numeric(df['Quantidade'], errors='coerce').fillna(0).astype(int)
+    df['DataUltimaAtualizacao'] = pd.to_datetime(df['DataUltimaAtualizacao']).astype('datetime64[ns]')
+    df['ValorTotal'] = pd.to_numeric(df['ValorTotal'], errors='coerce').astype(float)
+    return df.reset_index(drop=True)
+
+
+# Colunas de texto do histórico guardadas como categorias: cada nome/tipo distinto é
+# guardado uma vez e as linhas só têm o código inteiro (1 a 4 bytes em vez de um str)
+CATEGORICAL_TRANSACTION_COLUMNS = ['NomeProduto', 'TipoMovimentacao']
+
+_INT32 = np.iinfo(np.int32)
+
+
+def _compact_int(values: pd.Series) -> pd.Series:
+    # int32 quando todos os valores cabem (metade da memória do int64), senão int64
+    values = pd.to_numeric(values, errors='coerce').fillna(0).astype(np.int64)
+    if values.empty or (values.min() >= _INT32.min and values.max() <= _INT32.max):
+        return values.astype(np.int32)
+    return values
+
+
+def _normalize_transactions(df: pd.DataFrame) -> pd.DataFrame:
+    # Representação compacta do histórico: ID_Transacao int64 (cursor), ID_Produto e
+    # Quantidade int32 quando cabem, DataHora datetime64 e textos categóricos
+    df = df.reindex(columns=TRANSACTION_COLUMNS) if not df.empty else pd.DataFrame(columns=TRANSACTION_COLUMNS)
+    df['ID_Transacao'] = pd.to_numeric(df['ID_Transacao'], errors='coerce').fillna(0).astype(np.int64)
+    # Resolução fixa (o pandas 3 infere s/us conforme a origem): linhas do diário e do
+    # snapshot concatenam sem conversão e com o mesmo tipo dos agregados e checkpoints
+    df['DataHora'] = pd.to_datetime(df['DataHora']).astype('datetime64[ns]')
+    df['ID_Produto'] = _compact_int(df['ID_Produto'])
+    for col in CATEGORICAL_TRANSACTION_COLUMNS:
+        df[col] = df[col].astype(str).astype('category')
+    df['Quantidade'] = _compact_int(df['Quantidade'])
+    df['ValorTotalMovimentacao'] = pd.to_numeric(df['ValorTotalMovimentacao'], errors='coerce').astype(float)
+    return df.reset_index(drop=True)
+
+
+def _share_categories(existing: pd.DataFrame, new_rows: pd.DataFrame):
+    """
+    Codifica as colunas categóricas das linhas novas com o dicionário do histórico (ampliado
+    com os valores inéditos), para que a concatenação continue categórica em vez de virar
+    object. O histórico existente não é alterado: leitores podem estar percorrendo-o.
+    """
+    widened = {}
+    for col in CATEGORICAL_TRANSACTION_COLUMNS:
+        categories = existing[col].cat.categories
+        missing = new_rows[col].cat.categories.difference(categories)
+        if len(missing):
+            widened[col] = existing[col].cat.add_categories(missing)
+            categories = widened[col].cat.categories
+        new_rows[col] = new_rows[col].cat.set_categories(categories)
+    return (existing.assign(**widened) if widened else existing), new_rows
+
+
+# Instância única do processo, carregada em app.main
+inventory_state = InventoryState()
@@ -0,0 +1,148 @@
+import json
+import os
+from datetime import date, datetime
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from app.core.metrics import stage_timer
+
+
+def _json_default(value: Any):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if hasattr(value, 'item'): # Escalares numpy (int64, float64...)
+        return value.item()
+    raise TypeError(f"Tipo não serializável no diário: {type(value)}")
+
+
+class TransactionJournal:
+    """
+    Diário (write-ahead log) append-only das movimentações.
+
+    Cada movimentação vira uma linha JSON com a transação e o estado resultante do
+    produto. Uma gravação custa um único append + fsync; o snapshot em Excel é
+    atualizado depois, pela compactação, que incorpora e descarta o diário.
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.compacting_path = self.path.with_name(self.path.name + ".compactando")
+        self.snapshot_marker_path = self.path.with_name(self.path.name + ".snapshot")
+        self.entry_count = 0
+
+    def _truncate_partial_tail(self):
+        # Um append interrompido deixa uma linha sem '\n' no fim; ela nunca foi confirmada
+        # e precisa sair antes do próximo append para não corromper a entrada seguinte.
+        if not self.path.exists() or self.path.stat().st_size == 0:
+            return
+        with open(self.path, "rb+") as f:
+            f.seek(-1, os.SEEK_END)
+            if f.read(1) == b"\n":
+                return
+            f.seek(0)
+            data = f.read()
+            f.truncate(data.rfind(b"\n") + 1)
+
+    def append(self, entries: List[Dict[str, Any]]):
+        """Acrescenta as entradas ao diário e só retorna depois do fsync."""
+        # O arquivo é aberto a cada append (e não mantido aberto) porque outro processo
+        # pode ter rotacionado o diário desde a última gravação.
+        self._truncate_partial_tail()
+        with stage_timer("diario_append"), open(self.path, "a", encoding="utf-8") as f:
+            f.write("".join(json.dumps(e, default=_json_default, ensure_ascii=False) + "\n" for e in entries))
+            f.flush()
+            os.fsync(f.fileno())
+        self.entry_count += len(entries)
+
+    def rotate(self) -> Optional[Path]:
+        """
+        Move o diário atual para o arquivo de compactação e começa um diário novo.
+        Retorna o caminho do arquivo rotacionado (ou None se não havia nada a compactar).
+        """
+        if self.compacting_path.exists():
+            # Compactação anterior não terminou: junta o diário atual ao arquivo pendente
+            if self.path.exists():
+                with open(self.compacting_path, "a", encoding="utf-8") as dst, open(self.path, encoding="utf-8") as src:
+                    dst.write(src.read())
+                    dst.flush()
+                    os.fsync(dst.fileno())
+                self.path.unlink()
+        elif self.path.exists() and self.path.stat().st_size > 0:
+            os.replace(self.path, self.compacting_path)
+        else:
+            return None
+        self.entry_count = 0
+        return self.compacting_path
+
+    def discard_compacted(self):
+        """Remove o diário já incorporado ao snapshot."""
+        if self.compacting_path.exists():
+            self.compacting_path.unlink()
+
+    def mark_snapshot(self, token: Any, next_transaction_id: int):
+        """
+        Registra qual snapshot a compactação gravou e até onde ele vai (próximo ID de transação),
+        para que outros processos saibam que ele só incorpora entradas do diário.
+        """
+        tmp_path = self.snapshot_marker_path.with_name(self.snapshot_marker_path.name + ".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"token": repr(token), "proximo_id": int(next_transaction_id)}, f)
+        os.replace(tmp_path, self.snapshot_marker_path)
+
+    def snapshot_next_id(self, token: Any) -> Optional[int]:
+        """Próximo ID de transação do snapshot `token` se ele foi gravado por uma compactação; None caso contrário."""
+        try:
+            with open(self.snapshot_marker_path, encoding="utf-8") as f:
+                marker = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+        return marker["proximo_id"] if marker.get("token") == repr(token) else None
+
+    def clear(self):
+        """Descarta o diário inteiro (usado depois que as entradas foram gravadas em outro motor)."""
+        for path in (self.compacting_path, self.path):
+            if path.exists():
+                path.unlink()
+        self.entry_count = 0
+
+    def replay(self, offset: int = 0) -> Iterator[Dict[str, Any]]:
+        """
+        Lê as entradas pendentes (compactação interrompida primeiro, depois o diário atual).
+        Com `offset` > 0, lê apenas o final do diário atual a partir dessa posição em bytes.
+        """
+        if offset == 0:
+            self.entry_count = 0
+        paths = (self.path,) if offset else (self.compacting_path, self.path)
+        for path in paths:
+            if not path.exists():
+                continue
+            with open(path, "rb") as f:
+                if path == self.path:
+                    f.seek(offset)
+                for line in f:
+                    if not line.endswith(b"\n"):
+                        # Append em andamento (ou interrompido por queda): ainda não confirmado
+                        break
+                    line = line.strip()
+                    if not line:
+                        continue
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        print(f"AVISO: Linha inválida no diário '{path}', ignorando.")
+                        continue
+                    if path == self.path:
+                        self.entry_count += 1
+                    yield entry
+
+    @staticmethod
+    def _stat(path: Path) -> Optional[Tuple[int, int]]:
+        try:
+            st = path.stat()
+        except FileNotFoundError:
+            return None
+        return (st.st_ino, st.st_size)
+
+    def fingerprint(self) -> Tuple[Optional[Tuple[int, int]], Optional[Tuple[int, int]]]:
+        """(inode, tamanho) do arquivo de compactação e do diário atual, para detectar gravações de outros processos."""
+        return (self._stat(self.compacting_path), self._stat(self.path))
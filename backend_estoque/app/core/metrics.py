@@ -0,0 +1,198 @@
+import bisect
+import cProfile
+import os
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+from typing import Dict, List, Sequence, Tuple
+
+from app.core.config import PROFILE_DIR, PROFILE_THRESHOLD_MS
+
+# Limites (em segundos) dos buckets dos histogramas de latência
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+REGISTRY: List["_Metric"] = []
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class _Metric:
+    """Base das métricas: séries identificadas pelos valores dos rótulos, protegidas por uma trava."""
+
+    type = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _labels(self, key: Tuple[str, ...], extra: Sequence[Tuple[str, str]] = ()) -> str:
+        pairs = list(zip(self.labelnames, key)) + list(extra)
+        if not pairs:
+            return ""
+        return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+    def samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type}", *self.samples()]
+
+
+class Counter(_Metric):
+    type = "counter"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            return [f"{self.name}{self._labels(key)} {value}" for key, value in self._values.items()]
+
+
+class Gauge(Counter):
+    type = "gauge"
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = float(value)
+
+
+class Histogram(_Metric):
+    type = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+        self._series: Dict[Tuple[str, ...], list] = {} # chave -> [contagens por bucket, soma, total]
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * len(self.buckets), 0.0, 0]
+            index = bisect.bisect_left(self.buckets, value)
+            if index < len(self.buckets):
+                series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def samples(self) -> List[str]:
+        lines = []
+        with self._lock:
+            for key, (counts, total, count) in self._series.items():
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets, counts):
+                    cumulative += bucket_count
+                    lines.append(f"{self.name}_bucket{self._labels(key, [('le', repr(bound))])} {cumulative}")
+                lines.append(f"{self.name}_bucket{self._labels(key, [('le', '+Inf')])} {count}")
+                lines.append(f"{self.name}_sum{self._labels(key)} {total}")
+                lines.append(f"{self.name}_count{self._labels(key)} {count}")
+        return lines
+
+
+def render() -> str:
+    """Todas as métricas do processo no formato texto do Prometheus."""
+    return "\n".join(line for metric in REGISTRY for line in metric.render()) + "\n"
+
+
+# Métricas do processo. Com vários workers do uvicorn, cada processo tem as suas:
+# raspe cada worker separadamente (ou some no Prometheus).
+HTTP_REQUESTS = Counter("estoque_http_requisicoes_total", "Requisições HTTP atendidas.",
+                        ["metodo", "rota", "status"])
+HTTP_SECONDS = Histogram("estoque_http_duracao_segundos", "Duração das requisições HTTP (até os cabeçalhos da resposta).",
+                         ["metodo", "rota"])
+SERVICE_SECONDS = Histogram("estoque_servico_duracao_segundos", "Duração das operações do inventory_service.",
+                            ["operacao"])
+SERVICE_ERRORS = Counter("estoque_servico_erros_total", "Operações do inventory_service que terminaram em exceção.",
+                         ["operacao", "erro"])
+STAGE_SECONDS = Histogram("estoque_etapa_duracao_segundos",
+                          "Duração das etapas internas (leitura/gravação do armazenamento, diário, busca, IDs, serialização).",
+                          ["etapa"])
+STARTUP_MS = Gauge("estoque_inicializacao_ms", "Duração das etapas da inicialização do processo (ms).", ["etapa"])
+GROUP_SIZE = Histogram("estoque_grupo_movimentacoes", "Pedidos de movimentação gravados juntos em cada group commit.",
+                       buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256, 512))
+CACHE_LOOKUPS = Counter("estoque_cache_consultas_total", "Consultas ao cache de respostas.", ["resultado"])
+
+
+@contextmanager
+def stage_timer(stage: str):
+    """Mede um trecho como etapa (ex.: with stage_timer("gravacao_planilha"): ...)."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        STAGE_SECONDS.observe(time.perf_counter() - started, etapa=stage)
+
+
+def observe_request(method: str, route: str, status: int, seconds: float):
+    HTTP_REQUESTS.inc(metodo=method, rota=route, status=status)
+    HTTP_SECONDS.observe(seconds, metodo=method, rota=route)
+
+
+# Só um perfil por vez: o cProfile não aceita perfis simultâneos em todas as versões do Python
+_profile_lock = threading.Lock()
+
+
+def _start_profile():
+    if PROFILE_THRESHOLD_MS <= 0 or not _profile_lock.acquire(blocking=False):
+        return None
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError: # Outro perfilador ativo no processo
+        _profile_lock.release()
+        return None
+    return profiler
+
+
+def _finish_profile(profiler: cProfile.Profile, operation: str, seconds: float):
+    try:
+        profiler.disable()
+        elapsed_ms = seconds * 1000
+        if elapsed_ms >= PROFILE_THRESHOLD_MS:
+            PROFILE_DIR.mkdir(parents=True, exist_ok=True)
+            path = PROFILE_DIR / f"{operation}_{time.strftime('%Y%m%d-%H%M%S')}_{int(elapsed_ms)}ms_{os.getpid()}.prof"
+            profiler.dump_stats(path)
+            print(f"Operação lenta '{operation}' ({elapsed_ms:.0f} ms): perfil salvo em {path}")
+    finally:
+        _profile_lock.release()
+
+
+def instrumented(operation: str):
+    """
+    Decorador das funções do service: registra a duração e as exceções da operação e,
+    com ESTOQUE_PERFIL_LIMIAR_MS > 0, salva um perfil (cProfile) das chamadas acima do limiar.
+    """
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            profiler = _start_profile()
+            started = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            except Exception as e:
+                SERVICE_ERRORS.inc(operacao=operation, erro=type(e).__name__)
+                raise
+            finally:
+                seconds = time.perf_counter() - started
+                SERVICE_SECONDS.observe(seconds, operacao=operation)
+                if profiler is not None:
+                    _finish_profile(profiler, operation, seconds)
+        return wrapper
+    return decorator
@@ -0,0 +1,103 @@
+from datetime import date, datetime
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+
+class MonthPartition:
+    """Linhas do histórico de um mês (posições no DataFrame do histórico) e seus limites."""
+
+    def __init__(self, key: str):
+        self.key = key # "AAAA-MM"
+        self.min_date: Optional[pd.Timestamp] = None
+        self.max_date: Optional[pd.Timestamp] = None
+        self.min_id: Optional[int] = None
+        self.max_id: Optional[int] = None
+        self.rows = 0
+        self._chunks: List[np.ndarray] = []
+        self._positions: Optional[np.ndarray] = None # Concatenação em cache (meses fechados quase nunca mudam)
+
+    def add(self, positions: np.ndarray, dates: np.ndarray, ids: np.ndarray):
+        self._chunks.append(positions)
+        self._positions = None
+        self.rows += len(positions)
+        min_date, max_date = pd.Timestamp(dates.min()), pd.Timestamp(dates.max())
+        self.min_date = min_date if self.min_date is None else min(self.min_date, min_date)
+        self.max_date = max_date if self.max_date is None else max(self.max_date, max_date)
+        self.min_id = int(ids.min()) if self.min_id is None else min(self.min_id, int(ids.min()))
+        self.max_id = int(ids.max()) if self.max_id is None else max(self.max_id, int(ids.max()))
+
+    @property
+    def positions(self) -> np.ndarray:
+        if self._positions is None:
+            self._positions = np.concatenate(self._chunks) if len(self._chunks) > 1 else self._chunks[0]
+            self._chunks = [self._positions]
+        return self._positions
+
+    def overlaps(self, start: Optional[pd.Timestamp], end: Optional[pd.Timestamp]) -> bool:
+        if start is not None and self.max_date < start:
+            return False
+        if end is not None and self.min_date > end:
+            return False
+        return True
+
+    def is_closed(self, today: Optional[date] = None) -> bool:
+        today = today or date.today()
+        return self.key < f"{today.year:04d}-{today.month:02d}"
+
+
+class MonthlyPartitionIndex:
+    """
+    Particionamento mensal do histórico de transações (por DataHora).
+
+    Cada partição guarda as posições das suas linhas e um manifesto com DataHora e
+    ID_Transacao mínimos/máximos; consultas por período só visitam as partições que
+    se sobrepõem ao intervalo em vez de varrer o histórico desde o primeiro dia.
+    """
+
+    def __init__(self):
+        self.partitions: Dict[str, MonthPartition] = {}
+
+    def rebuild(self, df_transactions: pd.DataFrame):
+        self.partitions = {}
+        self.add(0, df_transactions)
+
+    def add(self, first_position: int, df_new: pd.DataFrame):
+        """Indexa linhas acrescentadas ao final do histórico a partir de `first_position`."""
+        if df_new.empty:
+            return
+        dates = df_new['DataHora'].to_numpy()
+        ids = df_new['ID_Transacao'].to_numpy()
+        keys = df_new['DataHora'].dt.strftime('%Y-%m').to_numpy()
+        positions = np.arange(first_position, first_position + len(df_new), dtype=np.int64)
+        for key in pd.unique(keys):
+            mask = keys == key
+            partition = self.partitions.get(key)
+            if partition is None:
+                partition = self.partitions[key] = MonthPartition(key)
+            partition.add(positions[mask], dates[mask], ids[mask])
+
+    def positions_for_range(self, start: Optional[datetime], end: Optional[datetime]) -> np.ndarray:
+        """Posições (ordenadas, portanto em ordem de ID_Transacao) das partições que tocam o intervalo."""
+        start = pd.Timestamp(start) if start is not None else None
+        end = pd.Timestamp(end) if end is not None else None
+        selected = [p.positions for p in self.partitions.values() if p.overlaps(start, end)]
+        if not selected:
+            return np.empty(0, dtype=np.int64)
+        return np.sort(np.concatenate(selected), kind='stable')
+
+    def manifest(self) -> List[dict]:
+        today = date.today()
+        return [
+            {
+                "Particao": p.key,
+                "DataHoraMin": p.min_date.date(),
+                "DataHoraMax": p.max_date.date(),
+                "ID_TransacaoMin": p.min_id,
+                "ID_TransacaoMax": p.max_id,
+                "Transacoes": p.rows,
+                "Fechada": p.is_closed(today),
+            }
+            for p in sorted(self.partitions.values(), key=lambda p: p.key)
+        ]
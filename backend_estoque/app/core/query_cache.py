@@ -0,0 +1,65 @@
+import threading
+from collections import OrderedDict
+from typing import Any, Hashable, Optional, Tuple
+
+from app.core.config import QUERY_CACHE_MAX_BYTES, QUERY_CACHE_MAX_ENTRIES
+from app.core.metrics import CACHE_LOOKUPS
+
+
+class QueryCache:
+    """
+    Cache LRU de respostas já serializadas, com limite de entradas e de bytes.
+
+    As chaves começam pela versão dos dados (InventoryState.data_version): quando os
+    dados mudam, as chaves antigas deixam de ser consultadas e, ao gravar a primeira
+    entrada da versão nova, as da versão anterior são descartadas de uma vez.
+    """
+
+    def __init__(self, max_entries: int = QUERY_CACHE_MAX_ENTRIES, max_bytes: int = QUERY_CACHE_MAX_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[Tuple[str, Hashable], Tuple[Any, int]]" = OrderedDict()
+        self._bytes = 0
+        self._version: Optional[str] = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, version: str, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            item = self._entries.get((version, key))
+            if item is None:
+                self.misses += 1
+                CACHE_LOOKUPS.inc(resultado="miss")
+                return None
+            self._entries.move_to_end((version, key))
+            self.hits += 1
+            CACHE_LOOKUPS.inc(resultado="hit")
+            return item[0]
+
+    def put(self, version: str, key: Hashable, value: Any, size: int):
+        if size > self.max_bytes or self.max_entries <= 0:
+            return
+        with self._lock:
+            if version != self._version:
+                self._entries.clear()
+                self._bytes = 0
+                self._version = version
+            old = self._entries.pop((version, key), None)
+            if old is not None:
+                self._bytes -= old[1]
+            self._entries[(version, key)] = (value, size)
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self._bytes -= evicted_size
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+            self._version = None
+
+
+# Instância única do processo, usada pelos endpoints de consulta
+query_cache = QueryCache()
@@ -0,0 +1,132 @@
+import importlib.util
+import io
+import json
+import math
+import re
+from typing import List, Optional
+
+import numpy as np
+import pandas as pd
+
+from app.core.config import STOCK_COLUMNS, TRANSACTION_COLUMNS
+
+# Opcional, só para o formato Arrow IPC: importado no primeiro uso, não na inicialização
+ARROW_AVAILABLE = importlib.util.find_spec("pyarrow") is not None
+
+ARROW_MEDIA_TYPE = "application/vnd.apache.arrow.stream"
+
+
+def validate_stock_columns(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Valida o estoque coluna a coluna (as mesmas regras de ProductStock, mas uma vez por
+    coluna em vez de uma vez por linha) e devolve as colunas prontas para serializar.
+    """
+    df = df[STOCK_COLUMNS]
+    checks = {
+        'ID_Produto': df['ID_Produto'].notna(),
+        'NomeProduto': df['NomeProduto'].notna(),
+        'ValorUnitario': df['ValorUnitario'].gt(0), # NaN também é inválido, como em Field(gt=0)
+        'Quantidade': df['Quantidade'].notna(),
+        'DataUltimaAtualizacao': df['DataUltimaAtualizacao'].notna(),
+    }
+    for column, valid in checks.items():
+        invalid = int((~valid).sum())
+        if invalid:
+            raise ValueError(f"Estoque inválido: {invalid} linha(s) com '{column}' ausente ou fora do permitido.")
+    return df.assign(
+        ID_Produto=df['ID_Produto'].astype(np.int64),
+        Quantidade=df['Quantidade'].astype(np.int64),
+        ValorUnitario=df['ValorUnitario'].astype(np.float64),
+        ValorTotal=df['ValorTotal'].astype(np.float64),
+    )
+
+
+def _json_string(value: str) -> str:
+    return json.dumps(value, ensure_ascii=False)
+
+
+def _exact_float_texts(values: pd.Series) -> Optional[List[str]]:
+    """
+    O to_json do pandas escreve no máximo 15 dígitos significativos (0.1 * 3 sai como 0.3).
+    Retorna o texto exato (repr, como no Pydantic) de cada valor, ou None quando os 15
+    dígitos já bastam — o caso comum de preços com centavos, que segue pelo caminho rápido.
+    """
+    floats = values.to_numpy(dtype=np.float64, na_value=np.nan)
+    written = np.array(json.loads(values.to_json(orient='values', double_precision=15)), dtype=np.float64)
+    if np.array_equal(written, floats, equal_nan=True):
+        return None
+    return [repr(v) if math.isfinite(v) else "null" for v in floats.tolist()]
+
+
+def _records_json(df: pd.DataFrame) -> str:
+    """Registros em JSON via to_json, sem perder precisão nas colunas float."""
+    exact = {col: texts for col in df.columns if pd.api.types.is_float_dtype(df[col])
+             for texts in [_exact_float_texts(df[col])] if texts is not None}
+    records = df.assign(**exact).to_json(orient='records', force_ascii=False, double_precision=15)
+    if not exact:
+        return records
+    # Os valores exatos saíram como texto: tira as aspas. Um nome de produto com o mesmo
+    # trecho viria escapado (\"ValorTotal\":\"), então não casa com o padrão.
+    pattern = re.compile('"(' + "|".join(map(re.escape, exact)) + ')":"([^"]*)"')
+    return pattern.sub(r'"\1":\2', records)
+
+
+def _values_json(values: pd.Series) -> str:
+    """Valores de uma coluna como array JSON (formato colunar), sem perder precisão nos floats."""
+    if pd.api.types.is_float_dtype(values):
+        texts = _exact_float_texts(values)
+        if texts is not None:
+            return "[" + ",".join(texts) + "]"
+    return values.to_json(orient="values", force_ascii=False, double_precision=15)
+
+
+def _with_iso_dates(df: pd.DataFrame) -> pd.DataFrame:
+    # Mesmo formato que o Pydantic usa para `date` (AAAA-MM-DD)
+    return df.assign(DataUltimaAtualizacao=df['DataUltimaAtualizacao'].dt.strftime('%Y-%m-%d'))
+
+
+def stock_to_json(df: pd.DataFrame, message: str) -> bytes:
+    """{"message", "data": [registros]} — mesmo formato de StockResponse, gerado direto das colunas."""
+    records = _records_json(_with_iso_dates(df))
+    return f'{{"message":{_json_string(message)},"data":{records}}}'.encode("utf-8")
+
+
+def transactions_to_json(df: pd.DataFrame, message: str, next_cursor: Optional[int]) -> bytes:
+    """{"message", "data", "next_cursor"} — mesmo formato de TransactionPageResponse, gerado direto das colunas."""
+    df = df[TRANSACTION_COLUMNS]
+    if df.empty:
+        records = "[]"
+    else:
+        # Os códigos categóricos viram os textos e o DataHora vira AAAA-MM-DD, como no Pydantic
+        records = _records_json(df.assign(DataHora=df['DataHora'].dt.strftime('%Y-%m-%d')))
+    cursor = "null" if next_cursor is None else str(int(next_cursor))
+    return f'{{"message":{_json_string(message)},"data":{records},"next_cursor":{cursor}}}'.encode("utf-8")
+
+
+def stock_to_columnar_json(df: pd.DataFrame, message: str) -> bytes:
+    """{"message", "rows", "columns", "data": {coluna: [valores]}} — sem repetir as chaves por linha."""
+    df = _with_iso_dates(df)
+    columns = ",".join(
+        f'{_json_string(col)}:{_values_json(df[col])}'
+        for col in df.columns
+    )
+    header = json.dumps(list(df.columns), ensure_ascii=False)
+    return (f'{{"message":{_json_string(message)},"rows":{len(df)},"columns":{header},'
+            f'"data":{{{columns}}}}}').encode("utf-8")
+
+
+def stock_to_arrow(df: pd.DataFrame) -> bytes:
+    """Tabela do estoque no formato Arrow IPC (stream), para leitura direta por colunas."""
+    if not ARROW_AVAILABLE:
+        raise RuntimeError("O formato 'arrow' requer o pacote pyarrow.")
+    import pyarrow as pa
+    # datetime64[D] vira date32 direto, sem passar por objetos date do Python
+    table = pa.table({
+        col: pa.array(df[col].to_numpy('datetime64[D]') if col == 'DataUltimaAtualizacao' else df[col].to_numpy(),
+                      from_pandas=True)
+        for col in df.columns
+    })
+    sink = io.BytesIO()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue()
@@ -0,0 +1,222 @@
+import argparse
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import pandas as pd
+
+from app.core.config import (SQLITE_FILE_PATH, EXCEL_FILE_PATH, STOCK_SHEET_NAME, TRANSACTIONS_SHEET_NAME,
+                             STOCK_COLUMNS, TRANSACTION_COLUMNS)
+from app.core.metrics import stage_timer
+from app.core.storage import StorageBackend
+
+SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS {STOCK_SHEET_NAME} (
+    ID_Produto INTEGER PRIMARY KEY,
+    NomeProduto TEXT NOT NULL,
+    ValorUnitario REAL,
+    Quantidade INTEGER NOT NULL DEFAULT 0,
+    DataUltimaAtualizacao TEXT,
+    ValorTotal REAL
+);
+CREATE INDEX IF NOT EXISTS idx_estoque_nome ON {STOCK_SHEET_NAME} (NomeProduto COLLATE NOCASE);
+
+CREATE TABLE IF NOT EXISTS {TRANSACTIONS_SHEET_NAME} (
+    ID_Transacao INTEGER PRIMARY KEY,
+    DataHora TEXT NOT NULL,
+    ID_Produto INTEGER NOT NULL,
+    NomeProduto TEXT NOT NULL,
+    TipoMovimentacao TEXT NOT NULL,
+    Quantidade INTEGER NOT NULL,
+    ValorTotalMovimentacao REAL
+);
+CREATE INDEX IF NOT EXISTS idx_transacoes_produto ON {TRANSACTIONS_SHEET_NAME} (ID_Produto);
+CREATE INDEX IF NOT EXISTS idx_transacoes_nome ON {TRANSACTIONS_SHEET_NAME} (NomeProduto COLLATE NOCASE);
+CREATE INDEX IF NOT EXISTS idx_transacoes_datahora ON {TRANSACTIONS_SHEET_NAME} (DataHora);
+
+-- Geração do conteúdo: incrementada quando as tabelas são substituídas por inteiro (write_sheets)
+CREATE TABLE IF NOT EXISTS Controle (Chave TEXT PRIMARY KEY, Valor INTEGER NOT NULL);
+INSERT OR IGNORE INTO Controle (Chave, Valor) VALUES ('geracao', 0);
+"""
+
+# Limite de parâmetros por consulta em versões antigas do SQLite
+MAX_SQL_PARAMS = 500
+
+SHEET_COLUMNS = {STOCK_SHEET_NAME: STOCK_COLUMNS, TRANSACTIONS_SHEET_NAME: TRANSACTION_COLUMNS}
+DATE_COLUMNS = {"DataUltimaAtualizacao", "DataHora"}
+
+
+def _to_sql_value(column: str, value: Any):
+    if value is None or (isinstance(value, float) and pd.isna(value)):
+        return None
+    if column in DATE_COLUMNS:
+        return pd.Timestamp(value).date().isoformat()
+    if hasattr(value, 'item'): # Escalares numpy
+        return value.item()
+    return value
+
+
+def _rows_for_sql(rows: List[Dict[str, Any]], columns: List[str]) -> List[tuple]:
+    return [tuple(_to_sql_value(col, row.get(col)) for col in columns) for row in rows]
+
+
+class SQLiteStorage(StorageBackend):
+    """
+    Motor SQLite (modo WAL), com índices em NomeProduto, ID_Produto e DataHora.
+
+    Cada movimentação é um INSERT/UPSERT indexado em vez de uma regravação do arquivo inteiro.
+    """
+
+    name = "sqlite"
+    supports_incremental_writes = True
+
+    def __init__(self, path: Path = SQLITE_FILE_PATH):
+        self.path = Path(path)
+        self._local = threading.local() # sqlite3.Connection não pode ser compartilhada entre threads
+        self._schema_ready = False # Esquema criado/verificado uma vez por processo
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=FULL")
+            self._local.conn = conn
+        return conn
+
+    def initialize(self):
+        if self._schema_ready and self.path.exists():
+            return
+        self._connect().executescript(SCHEMA)
+        self._schema_ready = True
+
+    def read_all(self) -> Dict[str, pd.DataFrame]:
+        self.initialize()
+        with stage_timer("leitura_sqlite"):
+            return {sheet_name: self.read_sheet(sheet_name) for sheet_name in SHEET_COLUMNS}
+
+    def read_sheet(self, sheet_name: str) -> pd.DataFrame:
+        if sheet_name not in SHEET_COLUMNS:
+            print(f"Erro ao ler planilha '{sheet_name}': tabela inexistente no banco SQLite.")
+            return pd.DataFrame()
+        columns = ", ".join(SHEET_COLUMNS[sheet_name])
+        return pd.read_sql_query(f"SELECT {columns} FROM {sheet_name} ORDER BY rowid", self._connect())
+
+    def write_sheets(self, sheets: Dict[str, pd.DataFrame]):
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            for sheet_name, df in sheets.items():
+                if sheet_name not in SHEET_COLUMNS:
+                    continue # Abas extras do Excel não têm tabela correspondente
+                columns = SHEET_COLUMNS[sheet_name]
+                conn.execute(f"DELETE FROM {sheet_name}")
+                self._insert(conn, sheet_name, df.to_dict('records'), columns)
+            conn.execute("UPDATE Controle SET Valor = Valor + 1 WHERE Chave = 'geracao'")
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def append_rows(self, rows: List[Dict[str, Any]], sheet_name: str):
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            self._insert(conn, sheet_name, rows, SHEET_COLUMNS[sheet_name])
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def get_next_transaction_id(self) -> int:
+        self.initialize() # change_token() é lido antes do read_all() na carga: o banco pode ainda não existir
+        row = self._connect().execute(f"SELECT MAX(ID_Transacao) FROM {TRANSACTIONS_SHEET_NAME}").fetchone()
+        return (row[0] or 0) + 1
+
+    def change_token(self) -> Any:
+        # (geração, próximo ID de transação): toda movimentação cria uma transação e MAX da
+        # chave primária é O(log n); a geração muda quando as tabelas são substituídas
+        next_id = self.get_next_transaction_id() # Cria o esquema antes, se preciso
+        generation = self._connect().execute("SELECT Valor FROM Controle WHERE Chave = 'geracao'").fetchone()
+        return (generation[0] if generation else 0, next_id)
+
+    def read_changes(self, since_token: Any, token: Any) -> Optional[Tuple[pd.DataFrame, pd.DataFrame]]:
+        """
+        Transações com ID em [próximo ID de `since_token`, próximo ID de `token`) e as linhas
+        atuais do estoque dos produtos afetados. None quando a mudança não é só um acréscimo
+        de movimentações (as tabelas foram substituídas).
+        """
+        if not since_token or not token or since_token[0] != token[0] or token[1] < since_token[1]:
+            return None
+        conn = self._connect()
+        transactions = pd.read_sql_query(
+            f"SELECT {', '.join(TRANSACTION_COLUMNS)} FROM {TRANSACTIONS_SHEET_NAME} "
+            f"WHERE ID_Transacao >= ? AND ID_Transacao < ? ORDER BY ID_Transacao",
+            conn, params=(since_token[1], token[1]))
+        product_ids = [int(i) for i in transactions['ID_Produto'].unique()]
+        chunks = [pd.read_sql_query(
+            f"SELECT {', '.join(STOCK_COLUMNS)} FROM {STOCK_SHEET_NAME} "
+            f"WHERE ID_Produto IN ({', '.join('?' for _ in ids)}) ORDER BY rowid", conn, params=ids)
+            for ids in (product_ids[i:i + MAX_SQL_PARAMS] for i in range(0, len(product_ids), MAX_SQL_PARAMS))]
+        stock = pd.concat(chunks, ignore_index=True) if chunks else pd.DataFrame(columns=STOCK_COLUMNS)
+        return transactions, stock
+
+    def apply_movements(self, movements: List[Dict[str, Any]]):
+        with stage_timer("gravacao_sqlite"):
+            conn = self._connect()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                # INSERT OR REPLACE pela chave primária: atualiza o produto ou cria se for novo
+                self._insert(conn, STOCK_SHEET_NAME, [m["estoque"] for m in movements], STOCK_COLUMNS, replace=True)
+                self._insert(conn, TRANSACTIONS_SHEET_NAME, [m["transacao"] for m in movements], TRANSACTION_COLUMNS)
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+
+    @staticmethod
+    def _insert(conn: sqlite3.Connection, sheet_name: str, rows: List[Dict[str, Any]], columns: List[str],
+                replace: bool = False):
+        verb = "INSERT OR REPLACE" if replace else "INSERT"
+        placeholders = ", ".join("?" for _ in columns)
+        conn.executemany(f"{verb} INTO {sheet_name} ({', '.join(columns)}) VALUES ({placeholders})",
+                         _rows_for_sql(rows, columns))
+
+
+def migrate_from_excel(excel_path: Path = EXCEL_FILE_PATH, sqlite_path: Path = SQLITE_FILE_PATH) -> Dict[str, int]:
+    """Copia as planilhas de um estoque.xlsx existente para o banco SQLite (substitui o conteúdo)."""
+    sheets = pd.read_excel(excel_path, sheet_name=None, engine='openpyxl')
+    storage = SQLiteStorage(sqlite_path)
+    storage.initialize()
+    data = {name: sheets.get(name, pd.DataFrame(columns=columns)) for name, columns in SHEET_COLUMNS.items()}
+    storage.write_sheets(data)
+    return {name: len(df) for name, df in data.items()}
+
+
+def export_to_excel(sqlite_path: Path = SQLITE_FILE_PATH, excel_path: Path = EXCEL_FILE_PATH) -> Dict[str, int]:
+    """Gera um .xlsx com o conteúdo atual do banco SQLite (para quem ainda usa a planilha)."""
+    from app.core.excel_handler import get_excel_writer_engine
+
+    storage = SQLiteStorage(sqlite_path)
+    data = storage.read_all()
+    with pd.ExcelWriter(excel_path, engine=get_excel_writer_engine()) as writer:
+        for sheet_name, df in data.items():
+            df.to_excel(writer, sheet_name=sheet_name, index=False)
+    return {name: len(df) for name, df in data.items()}
+
+
+if __name__ == "__main__":
+    # Uso: python -m app.core.sqlite_handler migrar|exportar [--excel caminho] [--sqlite caminho]
+    parser = argparse.ArgumentParser(description="Migração entre estoque.xlsx e o banco SQLite.")
+    parser.add_argument("comando", choices=["migrar", "exportar"])
+    parser.add_argument("--excel", type=Path, default=EXCEL_FILE_PATH)
+    parser.add_argument("--sqlite", type=Path, default=SQLITE_FILE_PATH)
+    args = parser.parse_args()
+
+    if args.comando == "migrar":
+        counts = migrate_from_excel(args.excel, args.sqlite)
+        print(f"Migração concluída para '{args.sqlite}': {counts}")
+    else:
+        counts = export_to_excel(args.sqlite, args.excel)
+        print(f"Exportação concluída para '{args.excel}': {counts}")
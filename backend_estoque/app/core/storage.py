@@ -0,0 +1,124 @@
+from abc import ABC, abstractmethod
+from typing import Any, Dict, List, Optional, Tuple
+
+import pandas as pd
+
+from app.core import excel_handler
+from app.core.config import STORAGE_BACKEND
+
+
+class StorageBackend(ABC):
+    """
+    Interface dos motores de armazenamento do estoque.
+
+    As "planilhas" (EstoqueAtual, HistoricoTransacoes) são a unidade de dados em todos
+    os motores: no Excel são abas do arquivo, no SQLite são tabelas.
+    """
+
+    name: str = ""
+    # Motores com escrita incremental gravam cada movimentação direto (sem diário/compactação)
+    supports_incremental_writes: bool = False
+
+    @abstractmethod
+    def initialize(self):
+        """Garante que o armazenamento exista com as planilhas esperadas."""
+
+    @abstractmethod
+    def read_all(self) -> Dict[str, pd.DataFrame]:
+        """Lê todas as planilhas em uma única passada."""
+
+    @abstractmethod
+    def read_sheet(self, sheet_name: str) -> pd.DataFrame:
+        pass
+
+    @abstractmethod
+    def write_sheets(self, sheets: Dict[str, pd.DataFrame]):
+        """Substitui o conteúdo das planilhas informadas (snapshot completo)."""
+
+    @abstractmethod
+    def append_rows(self, rows: List[Dict[str, Any]], sheet_name: str):
+        pass
+
+    @abstractmethod
+    def get_next_transaction_id(self) -> int:
+        pass
+
+    @abstractmethod
+    def change_token(self) -> Any:
+        """Valor barato que muda sempre que o conteúdo persistido muda (detecta gravações de outros processos)."""
+
+    def apply_movements(self, movements: List[Dict[str, Any]]):
+        """Grava transações e linhas de estoque de uma vez (apenas motores incrementais)."""
+        raise NotImplementedError(f"O motor '{self.name}' não suporta escrita incremental.")
+
+    def read_changes(self, since_token: Any, token: Any) -> Optional[Tuple[pd.DataFrame, pd.DataFrame]]:
+        """
+        Movimentações gravadas entre dois change_token(): (transações novas, linhas atuais do
+        estoque dos produtos afetados). None quando só uma recarga completa resolve.
+        """
+        return None
+
+
+class ExcelStorage(StorageBackend):
+    """Motor original: arquivo .xlsx lido e gravado por inteiro via pandas/openpyxl."""
+
+    name = "excel"
+
+    def initialize(self):
+        excel_handler.initialize_excel()
+
+    def read_all(self) -> Dict[str, pd.DataFrame]:
+        return excel_handler.read_all_sheets()
+
+    def read_sheet(self, sheet_name: str) -> pd.DataFrame:
+        return excel_handler.read_sheet(sheet_name)
+
+    def write_sheets(self, sheets: Dict[str, pd.DataFrame]):
+        excel_handler.write_sheets_to_excel(sheets)
+
+    def append_rows(self, rows: List[Dict[str, Any]], sheet_name: str):
+        for row in rows:
+            excel_handler.append_to_sheet(row, sheet_name)
+
+    def get_next_transaction_id(self) -> int:
+        return int(excel_handler.get_next_transaction_id())
+
+    def change_token(self) -> Any:
+        return excel_handler.excel_file_token()
+
+
+_storage: Optional[StorageBackend] = None
+
+
+def create_storage(backend: str = STORAGE_BACKEND) -> StorageBackend:
+    if backend == "excel":
+        return ExcelStorage()
+    if backend == "sqlite":
+        from app.core.sqlite_handler import SQLiteStorage
+        return SQLiteStorage()
+    raise ValueError(f"Motor de armazenamento desconhecido: '{backend}'. Use 'excel' ou 'sqlite'.")
+
+
+def get_storage() -> StorageBackend:
+    """Retorna o motor configurado em app.core.config.STORAGE_BACKEND."""
+    global _storage
+    if _storage is None:
+        _storage = create_storage()
+    return _storage
+
+
+# Funções de conveniência com a mesma assinatura das de excel_handler, independentes do motor
+def read_sheet(sheet_name: str) -> pd.DataFrame:
+    return get_storage().read_sheet(sheet_name)
+
+
+def write_sheets(sheets: Dict[str, pd.DataFrame]):
+    get_storage().write_sheets(sheets)
+
+
+def append_to_sheet(data_dict: Dict[str, Any], sheet_name: str):
+    get_storage().append_rows([data_dict], sheet_name)
+
+
+def get_next_transaction_id() -> int:
+    return get_storage().get_next_transaction_id()
@@ -1,19 +1,44 @@
-from fastapi import FastAPI
+import time
+
+_import_started = time.perf_counter()
+
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
-from app.routers import inventory_router
-from app.core.excel_handler import initialize_excel
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import PlainTextResponse
+from app.routers import analytics_router, inventory_router
+from app.core import metrics
+from app.core.config import STORAGE_BACKEND
+from app.core.inventory_state import inventory_state
+
+IMPORT_MS = round((time.perf_counter() - _import_started) * 1000, 1)
+
 
-# Inicializa o arquivo Excel se não existir (bom fazer no início)
-try:
-    initialize_excel()
-except Exception as e:
-    print(f"CRÍTICO: Não foi possível inicializar o arquivo Excel. A aplicação pode não funcionar corretamente. Erro: {e}")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Verifica o armazenamento (cria o Excel se não existir) e carrega o estoque para a
+    # memória uma única vez por processo, na inicialização do worker e não na importação
+    started = time.perf_counter()
+    try:
+        inventory_state.load()
+        inventory_state.start_compactor()
+    except Exception as e:
+        print(f"CRÍTICO: Não foi possível carregar o arquivo Excel. A aplicação pode não funcionar corretamente. Erro: {e}")
+    timings = {"importacao_ms": IMPORT_MS, "inicializacao_ms": round((time.perf_counter() - started) * 1000, 1),
+               **inventory_state.load_timings}
+    app.state.startup_timings = timings
+    for stage, ms in timings.items():
+        metrics.STARTUP_MS.set(ms, etapa=stage.removesuffix("_ms"))
+    print(f"Inicialização ({STORAGE_BACKEND}): " + ", ".join(f"{k} {v}" for k, v in timings.items()))
+    yield
 
 
 app = FastAPI(
     title="API de Gestão de Estoque",
     description="API para gerenciar entrada, saída e consulta de produtos em estoque usando Excel.",
-    version="0.1.0"
+    version="0.1.0",
+    lifespan=lifespan
 )
 
 # Configuração do CORS
@@ -30,13 +55,36 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Inclui o router de inventário
+# Comprime respostas grandes (estoque, histórico) quando o cliente envia Accept-Encoding: gzip
+app.add_middleware(GZipMiddleware, minimum_size=1024, compresslevel=5)
+
+@app.middleware("http")
+async def medir_requisicoes(request: Request, call_next):
+    # Contagem e latência por rota (o modelo da rota, ex.: /api/inventory/estoque, e não a URL)
+    started = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        route = request.scope.get("route")
+        metrics.observe_request(request.method, getattr(route, "path", "nao_mapeada"), status,
+                                time.perf_counter() - started)
+
+# Inclui os routers de inventário e de análises
 app.include_router(inventory_router.router)
+app.include_router(analytics_router.router)
 
 @app.get("/", tags=["Root"])
 async def read_root():
     return {"message": "Bem-vindo à API de Gestão de Estoque!"}
 
+@app.get("/metrics", include_in_schema=False)
+async def exportar_metricas():
+    # Formato texto do Prometheus (métricas deste processo/worker)
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
 # Para rodar a aplicação (coloque isso em um if __name__ == "__main__" se for executar este arquivo diretamente)
 # ou use o comando uvicorn: uvicorn app.main:app --reload --host 0.0.0.0 --port 8000
 
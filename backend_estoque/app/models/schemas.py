@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field
-from typing import Optional, List
+from typing import Literal, Optional, List
 from datetime import datetime, date
 
 class ProductBase(BaseModel):
@@ -18,6 +18,9 @@ class StockMovement(BaseModel):
     ValorUnitario: Optional[float] = None 
     DataMovimentacao: date = Field(default_factory=date.today)
 
+class BatchStockMovement(StockMovement):
+    TipoMovimentacao: Literal["ENTRADA", "SAIDA"]
+
 class TransactionRecord(BaseModel):
     ID_Transacao: int
     DataHora: date
@@ -29,4 +32,81 @@ class TransactionRecord(BaseModel):
 
 class StockResponse(BaseModel):
     message: str
-    data: Optional[ProductStock | List[ProductStock] | TransactionRecord | List[TransactionRecord]] = None
\ No newline at end of file
+    data: Optional[ProductStock | List[ProductStock] | TransactionRecord | List[TransactionRecord]] = None
+
+class TransactionPageResponse(StockResponse):
+    next_cursor: Optional[int] = None # ID_Transacao a enviar em `cursor` para buscar a próxima página
+
+class TransactionPartition(BaseModel):
+    Particao: str # Mês no formato AAAA-MM
+    DataHoraMin: date
+    DataHoraMax: date
+    ID_TransacaoMin: int
+    ID_TransacaoMax: int
+    Transacoes: int
+    Fechada: bool # Mês anterior ao atual
+
+class TransactionPartitionsResponse(BaseModel):
+    message: str
+    data: List[TransactionPartition]
+
+class BatchMovementResult(BaseModel):
+    Indice: int # Posição da movimentação na lista enviada
+    Sucesso: bool # Em um lote rejeitado, indica apenas se o item era válido (nenhum é aplicado)
+    Erro: Optional[str] = None
+    Transacao: Optional[TransactionRecord] = None
+    Produto: Optional[ProductStock] = None # Estado do produto após esta movimentação
+
+class BatchMovementResponse(BaseModel):
+    message: str
+    data: List[BatchMovementResult]
+
+class ImportLineError(BaseModel):
+    Linha: int # Linha do arquivo (a linha 1 é o cabeçalho)
+    Erro: str
+
+class ImportSummary(BaseModel):
+    LinhasLidas: int = 0
+    Aplicadas: int = 0
+    Rejeitadas: int = 0
+    Duplicadas: int = 0 # Produtos repetidos no catálogo (vale a primeira ocorrência)
+    Lotes: int = 0 # Lotes gravados
+    Erros: List[ImportLineError] = [] # Apenas os primeiros erros; o total está em Rejeitadas
+
+class ImportResponse(BaseModel):
+    message: str
+    data: ImportSummary
+
+class StockValueItem(BaseModel):
+    ID_Produto: int
+    NomeProduto: str
+    Quantidade: int
+    ValorUnitario: float
+    ValorTotal: float
+    Participacao: float # Fração do valor total do estoque (0 a 1)
+
+class MovementFlowPoint(BaseModel):
+    Periodo: str # AAAA-MM-DD (diário) ou AAAA-MM (mensal)
+    QuantidadeEntrada: int
+    ValorEntrada: float
+    QuantidadeSaida: int
+    ValorSaida: float
+    SaldoQuantidade: int # Entradas - saídas no período
+
+class TopMover(BaseModel):
+    ID_Produto: int
+    NomeProduto: str
+    Quantidade: int
+    Valor: float
+    Transacoes: int
+
+class DaysOfCover(BaseModel):
+    ID_Produto: int
+    NomeProduto: str
+    Quantidade: int
+    SaidaMediaDiaria: float
+    DiasDeCobertura: Optional[float] = None # None quando não houve saídas na janela
+
+class AnalyticsResponse(BaseModel):
+    message: str
+    data: List[StockValueItem] | List[MovementFlowPoint] | List[TopMover] | List[DaysOfCover]
@@ -0,0 +1,65 @@
+from datetime import date, datetime
+from typing import Literal, Optional
+
+from fastapi import APIRouter, HTTPException, Query
+from starlette.concurrency import run_in_threadpool
+
+from app.models.schemas import AnalyticsResponse
+from app.services import analytics_service
+
+router = APIRouter(
+    prefix="/api/analytics",  # Agregados prontos para os gráficos do dashboard
+    tags=["Analytics"]
+)
+
+
+@router.get("/valor-estoque", response_model=AnalyticsResponse)
+async def valor_estoque_por_produto():
+    try:
+        data = await run_in_threadpool(analytics_service.get_stock_value_by_product)
+        return AnalyticsResponse(message="Valor do estoque por produto recuperado com sucesso.", data=data)
+    except Exception as e:
+        print(f"Erro inesperado em valor_estoque_por_produto: {e}")
+        raise HTTPException(status_code=500, detail="Ocorreu um erro interno ao calcular o valor do estoque.")
+
+
+@router.get("/fluxo", response_model=AnalyticsResponse)
+async def fluxo_movimentacoes(
+    periodo: Literal["diario", "mensal"] = Query("diario", description="Agrupamento por dia ou por mês"),
+    data_inicio: Optional[datetime] = Query(None, description="Data de início do filtro (YYYY-MM-DD)"),
+    data_fim: Optional[datetime] = Query(None, description="Data de fim do filtro (YYYY-MM-DD)"),
+):
+    try:
+        data = await run_in_threadpool(analytics_service.get_movement_flow, periodo, data_inicio, data_fim)
+        return AnalyticsResponse(message="Fluxo de entradas e saídas recuperado com sucesso.", data=data)
+    except Exception as e:
+        print(f"Erro inesperado em fluxo_movimentacoes: {e}")
+        raise HTTPException(status_code=500, detail="Ocorreu um erro interno ao calcular o fluxo.")
+
+
+@router.get("/mais-movimentados", response_model=AnalyticsResponse)
+async def produtos_mais_movimentados(
+    limite: int = Query(10, ge=1, le=1000),
+    tipo: Optional[Literal["ENTRADA", "SAIDA"]] = Query(None, description="Considerar apenas entradas ou saídas"),
+    data_inicio: Optional[datetime] = Query(None, description="Data de início do filtro (YYYY-MM-DD)"),
+    data_fim: Optional[datetime] = Query(None, description="Data de fim do filtro (YYYY-MM-DD)"),
+):
+    try:
+        data = await run_in_threadpool(analytics_service.get_top_movers, limite, tipo, data_inicio, data_fim)
+        return AnalyticsResponse(message="Produtos mais movimentados recuperados com sucesso.", data=data)
+    except Exception as e:
+        print(f"Erro inesperado em produtos_mais_movimentados: {e}")
+        raise HTTPException(status_code=500, detail="Ocorreu um erro interno ao calcular os mais movimentados.")
+
+
+@router.get("/cobertura", response_model=AnalyticsResponse)
+async def dias_de_cobertura(
+    dias: int = Query(30, ge=1, le=3650, description="Janela (em dias) para a média de saídas"),
+    data_referencia: Optional[date] = Query(None, description="Último dia da janela (padrão: hoje)"),
+):
+    try:
+        data = await run_in_threadpool(analytics_service.get_days_of_cover, dias, data_referencia)
+        return AnalyticsResponse(message="Dias de cobertura recuperados com sucesso.", data=data)
+    except Exception as e:
+        print(f"Erro inesperado em dias_de_cobertura: {e}")
+        raise HTTPException(status_code=500, detail="Ocorreu um erro interno ao calcular a cobertura.")
@@ -1,27 +1,64 @@
-from fastapi import APIRouter, HTTPException, Query
-from typing import List, Optional
-from datetime import datetime
+import hashlib
+import tempfile
+from functools import partial
+from pathlib import Path
 
-from app.models.schemas import StockMovement, ProductStock, TransactionRecord, StockResponse
-from app.services import inventory_service
+from fastapi import APIRouter, HTTPException, Query, Request
+from fastapi.responses import FileResponse, Response, StreamingResponse
+from starlette.background import BackgroundTask
+from starlette.concurrency import run_in_threadpool
+from typing import List, Literal, Optional
+from datetime import date, datetime
+
+from app.core.serialization import ARROW_AVAILABLE
+from app.models.schemas import (StockMovement, ProductStock, TransactionRecord, StockResponse,
+                                BatchStockMovement, BatchMovementResponse, TransactionPageResponse,
+                                TransactionPartitionsResponse, ImportResponse)
+from app.services import bulk_service, inventory_service
 
 router = APIRouter(
     prefix="/api/inventory",  # Prefixo para todas as rotas neste router
     tags=["Inventory"]       # Agrupa estas rotas na documentação do Swagger/OpenAPI
 )
 
+# As funções do service fazem I/O bloqueante (arquivos, travas): rodam no threadpool
+# via run_in_threadpool para não travar o event loop.
+
+
+def _etag(request: Request, version: str) -> str:
+    # Versão dos dados + a consulta (caminho e parâmetros): cada representação tem sua ETag
+    query = "&".join(f"{k}={v}" for k, v in sorted(request.query_params.multi_items()))
+    digest = hashlib.sha1(f"{request.url.path}?{query}".encode()).hexdigest()[:12]
+    return f'"{version}-{digest}"'
+
+
+def _not_modified(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    tags = [tag.strip().removeprefix("W/") for tag in header.split(",")]
+    return "*" in tags or etag in tags
+
+
+async def _conditional_response(request: Request, compute) -> Response:
+    """
+    Resposta com ETag: 304 sem recalcular nada se o cliente já tem esta versão;
+    senão devolve do cache de consultas ou calcula (`compute` -> (corpo, media_type)).
+    """
+    version = await run_in_threadpool(inventory_service.get_data_version)
+    etag = _etag(request, version)
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if _not_modified(request, etag):
+        return Response(status_code=304, headers=headers)
+    body, media_type, consistent = await run_in_threadpool(inventory_service.cached_query, version, etag, compute)
+    if not consistent:
+        headers = {"Cache-Control": "no-cache"} # Dados mudaram durante o cálculo: sem ETag
+    return Response(content=body, media_type=media_type, headers=headers)
+
 @router.post("/entrada", response_model=StockResponse)
 async def registrar_entrada_produto(movement: StockMovement):
     try:
-        if movement.ValorUnitario is None or movement.ValorUnitario <= 0:
-             # Para entradas, o valor unitário da compra é essencial
-             # Se o produto já existe, poderíamos pegar o último valor, mas para uma nova entrada,
-             # o valor da compra é importante.
-             # No service, já tratamos isso para o caso de ser uma atualização.
-             # Mas uma validação inicial aqui pode ser útil.
-             pass # Deixe o service validar por enquanto
-        
-        updated_product = inventory_service.add_product_entry(movement)
+        updated_product = await run_in_threadpool(inventory_service.add_product_entry, movement)
         return StockResponse(message="Entrada registrada com sucesso!", data=updated_product)
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
@@ -34,7 +71,7 @@ async def registrar_entrada_produto(movement: StockMovement):
 @router.post("/saida", response_model=StockResponse)
 async def registrar_saida_produto(movement: StockMovement):
     try:
-        updated_product = inventory_service.remove_product_stock(movement)
+        updated_product = await run_in_threadpool(inventory_service.remove_product_stock, movement)
         return StockResponse(message="Saída registrada com sucesso!", data=updated_product)
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
@@ -42,27 +79,124 @@ async def registrar_saida_produto(movement: StockMovement):
         print(f"Erro inesperado em registrar_saida_produto: {e}")
         raise HTTPException(status_code=500, detail="Ocorreu um erro interno no servidor.")
 
+@router.post("/movimentacoes/lote", response_model=BatchMovementResponse)
+async def registrar_movimentacoes_em_lote(movements: List[BatchStockMovement]):
+    try:
+        results = await run_in_threadpool(inventory_service.apply_movement_batch, movements)
+        return BatchMovementResponse(message=f"{len(results)} movimentação(ões) registrada(s) com sucesso!", data=results)
+    except inventory_service.BatchRejectedError as e:
+        # Nada foi aplicado: devolve o resultado por item para o cliente saber quais corrigir
+        raise HTTPException(status_code=400, detail={
+            "message": str(e),
+            "data": [r.model_dump(exclude_none=True) for r in e.results],
+        })
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        print(f"Erro inesperado em registrar_movimentacoes_em_lote: {e}")
+        raise HTTPException(status_code=500, detail="Ocorreu um erro interno no servidor.")
+
 @router.get("/estoque", response_model=StockResponse)
-async def listar_estoque_atual():
+async def listar_estoque_atual(
+    request: Request,
+    formato: Literal["json", "colunar", "arrow"] = Query("json", description="json (registros), colunar (json por colunas) ou arrow (Arrow IPC)"),
+    as_of: Optional[date] = Query(None, description="Estoque ao fim desta data (YYYY-MM-DD) em vez do atual"),
+):
+    if formato == "arrow" and not ARROW_AVAILABLE:
+        raise HTTPException(status_code=400, detail="O formato 'arrow' não está disponível: instale o pacote pyarrow no servidor.")
+    message = f"Estoque em {as_of.isoformat()} recuperado com sucesso." if as_of else "Estoque atual recuperado com sucesso."
     try:
-        stock_items = inventory_service.get_all_stock_items()
-        return StockResponse(message="Estoque atual recuperado com sucesso.", data=stock_items)
+        # Corpo já serializado a partir das colunas: não passa pela validação do response_model
+        return await _conditional_response(request, partial(inventory_service.serialize_stock, formato,
+                                                            message, as_of))
     except Exception as e:
         print(f"Erro inesperado em listar_estoque_atual: {e}")
         raise HTTPException(status_code=500, detail="Ocorreu um erro interno ao buscar o estoque.")
 
 
-@router.get("/transacoes", response_model=StockResponse)
+@router.get("/transacoes", response_model=TransactionPageResponse)
 async def listar_historico_transacoes(
+    request: Request,
     data_inicio: Optional[datetime] = Query(None, description="Data de início do filtro (YYYY-MM-DD)"),
     data_fim: Optional[datetime] = Query(None, description="Data de fim do filtro (YYYY-MM-DD)"),
+    produto: Optional[str] = Query(None, description="Nome ou ID_Produto"),
+    tipo: Optional[Literal["ENTRADA", "SAIDA"]] = Query(None, description="Tipo de movimentação"),
+    limite: Optional[int] = Query(None, ge=1, le=10000, description="Máximo de transações por página"),
+    cursor: Optional[int] = Query(None, description="next_cursor da página anterior (ID_Transacao)"),
+    formato: Literal["json", "ndjson", "csv"] = Query("json", description="json paginado ou ndjson/csv em streaming"),
 ):
+    filters = dict(start_date=data_inicio, end_date=data_fim, product=produto, movement_type=tipo,
+                   limit=limite, cursor=cursor)
     try:
-        transactions = inventory_service.get_transaction_history(
-            start_date=data_inicio,
-            end_date=data_fim,
-        )
-        return StockResponse(message="Histórico de transações recuperado com sucesso.", data=transactions)
+        if formato != "json":
+            # Gerador síncrono: o Starlette o consome no threadpool e envia bloco a bloco
+            # (sem ETag nem cache: o conteúdo só existe enquanto é transmitido)
+            media_type = "text/csv" if formato == "csv" else "application/x-ndjson"
+            return StreamingResponse(inventory_service.stream_transaction_history(formato, **filters),
+                                     media_type=media_type)
+        return await _conditional_response(request, partial(inventory_service.serialize_transaction_page,
+                                                            "Histórico de transações recuperado com sucesso.",
+                                                            **filters))
     except Exception as e:
         print(f"Erro inesperado em listar_historico_transacoes: {e}")
-        raise HTTPException(status_code=500, detail="Ocorreu um erro interno ao buscar transações.")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail="Ocorreu um erro interno ao buscar transações.")
+
+
+@router.get("/transacoes/particoes", response_model=TransactionPartitionsResponse)
+async def listar_particoes_transacoes():
+    try:
+        partitions = await run_in_threadpool(inventory_service.get_transaction_partitions)
+        return TransactionPartitionsResponse(message="Partições do histórico recuperadas com sucesso.", data=partitions)
+    except Exception as e:
+        print(f"Erro inesperado em listar_particoes_transacoes: {e}")
+        raise HTTPException(status_code=500, detail="Ocorreu um erro interno ao buscar as partições.")
+
+
+@router.post("/importacao", response_model=ImportResponse)
+async def importar_arquivo(
+    request: Request,
+    tipo: Literal["movimentacoes", "produtos"] = Query("movimentacoes", description="movimentacoes (ENTRADA/SAIDA) ou produtos (catálogo: cada linha vira uma ENTRADA; reimportar soma as quantidades de novo)"),
+    formato: Literal["csv", "xlsx"] = Query("csv", description="Formato do arquivo enviado no corpo da requisição"),
+    aba: Optional[str] = Query(None, description="Aba do xlsx (padrão: HistoricoTransacoes/EstoqueAtual ou a primeira)"),
+):
+    # O arquivo vem cru no corpo (sem multipart) e é gravado em disco à medida que chega:
+    # a importação lê dele em blocos, sem manter o arquivo inteiro em memória
+    tmp_path = None
+    try:
+        # Criação e gravação do temporário em threads: escrita em disco bloquearia o event loop
+        tmp = await run_in_threadpool(tempfile.NamedTemporaryFile, suffix=f".{formato}", delete=False)
+        tmp_path = Path(tmp.name)
+        try:
+            async for chunk in request.stream():
+                await run_in_threadpool(tmp.write, chunk)
+        finally:
+            await run_in_threadpool(tmp.close)
+        summary = await run_in_threadpool(bulk_service.import_file, tmp_path, tipo, formato, aba)
+        return ImportResponse(message=f"Importação concluída: {summary.Aplicadas} de {summary.LinhasLidas} linha(s) aplicada(s).",
+                              data=summary)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        print(f"Erro inesperado em importar_arquivo: {e}")
+        raise HTTPException(status_code=500, detail="Ocorreu um erro interno ao importar o arquivo.")
+    finally:
+        if tmp_path is not None:
+            tmp_path.unlink(missing_ok=True)
+
+
+@router.get("/exportacao")
+async def exportar_arquivo(
+    conteudo: Literal["transacoes", "estoque"] = Query("transacoes", description="Histórico de transações ou estoque atual"),
+    formato: Literal["csv", "xlsx"] = Query("csv", description="csv (em streaming) ou xlsx"),
+):
+    headers = {"Content-Disposition": f'attachment; filename="{conteudo}.{formato}"'}
+    try:
+        if formato == "csv":
+            return StreamingResponse(bulk_service.stream_export_csv(conteudo), media_type="text/csv", headers=headers)
+        # O xlsx é gravado em disco linha a linha e enviado depois; o temporário é removido ao final do envio
+        path = await run_in_threadpool(bulk_service.export_xlsx_tempfile, conteudo)
+        return FileResponse(path, media_type=bulk_service.XLSX_MEDIA_TYPE, headers=headers,
+                            background=BackgroundTask(path.unlink, missing_ok=True))
+    except Exception as e:
+        print(f"Erro inesperado em exportar_arquivo: {e}")
+        raise HTTPException(status_code=500, detail="Ocorreu um erro interno ao exportar os dados.")
@@ -0,0 +1,101 @@
+from datetime import date, datetime, timedelta
+from typing import List, Optional
+
+import numpy as np
+import pandas as pd
+
+from app.core.inventory_state import inventory_state
+from app.models import schemas
+
+
+def _daily_table(start_date: Optional[datetime] = None, end_date: Optional[datetime] = None) -> pd.DataFrame:
+    inventory_state.refresh()
+    with inventory_state.lock:
+        inventory_state.transactions # Incorpora transações pendentes aos agregados
+        daily = inventory_state.daily_aggregates.table()
+    if start_date:
+        daily = daily[daily['Data'] >= pd.Timestamp(start_date)]
+    if end_date:
+        daily = daily[daily['Data'] <= pd.Timestamp(end_date)]
+    return daily
+
+
+def _product_names() -> pd.Series:
+    with inventory_state.lock:
+        stock = inventory_state.stock
+        return pd.Series(stock['NomeProduto'].values, index=stock['ID_Produto'].values)
+
+
+def get_stock_value_by_product() -> List[schemas.StockValueItem]:
+    """Valor em estoque por produto, do maior para o menor."""
+    inventory_state.refresh()
+    with inventory_state.lock:
+        stock = inventory_state.stock[['ID_Produto', 'NomeProduto', 'Quantidade', 'ValorUnitario']].copy()
+    stock['ValorUnitario'] = stock['ValorUnitario'].fillna(0.0)
+    stock['ValorTotal'] = stock['Quantidade'] * stock['ValorUnitario']
+    total = stock['ValorTotal'].sum()
+    stock['Participacao'] = stock['ValorTotal'] / total if total else 0.0
+    stock = stock.sort_values('ValorTotal', ascending=False)
+    return [schemas.StockValueItem(**row) for row in stock.to_dict('records')]
+
+
+def get_movement_flow(period: str = "diario",
+                      start_date: Optional[datetime] = None,
+                      end_date: Optional[datetime] = None) -> List[schemas.MovementFlowPoint]:
+    """Entradas e saídas (quantidade e valor) por dia ou por mês."""
+    daily = _daily_table(start_date, end_date)
+    if daily.empty:
+        return []
+    fmt = '%Y-%m' if period == "mensal" else '%Y-%m-%d'
+    flow = (daily.assign(Periodo=daily['Data'].dt.strftime(fmt))
+            .pivot_table(index='Periodo', columns='TipoMovimentacao', values=['Quantidade', 'Valor'],
+                         aggfunc='sum', fill_value=0)
+            .sort_index())
+    result = pd.DataFrame({
+        'Periodo': flow.index,
+        'QuantidadeEntrada': flow.get(('Quantidade', 'ENTRADA'), 0),
+        'ValorEntrada': flow.get(('Valor', 'ENTRADA'), 0.0),
+        'QuantidadeSaida': flow.get(('Quantidade', 'SAIDA'), 0),
+        'ValorSaida': flow.get(('Valor', 'SAIDA'), 0.0),
+    })
+    result['SaldoQuantidade'] = result['QuantidadeEntrada'] - result['QuantidadeSaida']
+    return [schemas.MovementFlowPoint(**row) for row in result.to_dict('records')]
+
+
+def get_top_movers(limit: int = 10,
+                   movement_type: Optional[str] = None,
+                   start_date: Optional[datetime] = None,
+                   end_date: Optional[datetime] = None) -> List[schemas.TopMover]:
+    """Produtos com maior quantidade movimentada no período (opcionalmente só entradas ou saídas)."""
+    daily = _daily_table(start_date, end_date)
+    if movement_type:
+        daily = daily[daily['TipoMovimentacao'] == movement_type]
+    if daily.empty:
+        return []
+    top = (daily.groupby('ID_Produto', as_index=False)[['Quantidade', 'Valor', 'Transacoes']].sum()
+           .nlargest(limit, 'Quantidade'))
+    top['NomeProduto'] = top['ID_Produto'].map(_product_names()).fillna('')
+    return [schemas.TopMover(**row) for row in top.to_dict('records')]
+
+
+def get_days_of_cover(window_days: int = 30, reference_date: Optional[date] = None) -> List[schemas.DaysOfCover]:
+    """
+    Dias de cobertura por produto: quantidade em estoque / média diária de saídas
+    nos últimos `window_days` dias até `reference_date` (hoje por padrão).
+    """
+    reference_date = reference_date or date.today()
+    start = datetime.combine(reference_date - timedelta(days=window_days - 1), datetime.min.time())
+    daily = _daily_table(start, datetime.combine(reference_date, datetime.min.time()))
+    outflow = daily[daily['TipoMovimentacao'] == 'SAIDA'].groupby('ID_Produto')['Quantidade'].sum()
+
+    with inventory_state.lock:
+        stock = inventory_state.stock[['ID_Produto', 'NomeProduto', 'Quantidade']].copy()
+    stock['SaidaMediaDiaria'] = stock['ID_Produto'].map(outflow).fillna(0).to_numpy() / window_days
+    with np.errstate(divide='ignore', invalid='ignore'):
+        cover = stock['Quantidade'].to_numpy() / stock['SaidaMediaDiaria'].to_numpy()
+    stock['DiasDeCobertura'] = np.where(stock['SaidaMediaDiaria'] > 0, cover, np.nan)
+    stock = stock.sort_values('DiasDeCobertura', na_position='last')
+    return [
+        schemas.DaysOfCover(**{**row, 'DiasDeCobertura': None if pd.isna(row['DiasDeCobertura']) else row['DiasDeCobertura']})
+        for row in stock.to_dict('records')
+    ]
@@ -0,0 +1,160 @@
+import argparse
+import os
+import tempfile
+from pathlib import Path
+from typing import Iterator, List, Optional, Set, Tuple
+
+import pandas as pd
+
+from app.core.bulk_io import (csv_decimal_separator, detect_format, iter_csv_text, iter_file_chunks, validate_movements,
+                              write_xlsx_stream)
+from app.core.config import (BULK_IMPORT_BATCH_ROWS, STOCK_COLUMNS, STOCK_SHEET_NAME, TRANSACTION_COLUMNS,
+                             TRANSACTIONS_SHEET_NAME)
+from app.core.inventory_state import inventory_state
+from app.core.metrics import instrumented
+from app.models import schemas
+from app.services import inventory_service
+
+# Quantos erros por linha o resumo da importação devolve (os demais só entram na contagem)
+MAX_REPORTED_ERRORS = 100
+
+XLSX_MEDIA_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+# conteudo -> (aba, colunas, colunas de data)
+EXPORT_SOURCES = {
+    "estoque": (STOCK_SHEET_NAME, STOCK_COLUMNS, ["DataUltimaAtualizacao"]),
+    "transacoes": (TRANSACTIONS_SHEET_NAME, TRANSACTION_COLUMNS, ["DataHora"]),
+}
+
+
+def _report(summary: schemas.ImportSummary, errors: List[Tuple[int, str]]):
+    summary.Rejeitadas += len(errors)
+    room = MAX_REPORTED_ERRORS - len(summary.Erros)
+    summary.Erros.extend(schemas.ImportLineError(Linha=line, Erro=error) for line, error in errors[:max(room, 0)])
+
+
+def _commit(movements: pd.DataFrame, summary: schemas.ImportSummary):
+    # Lote tudo ou nada do inventory_service; as linhas recusadas pelas regras de negócio
+    # (produto inexistente, saldo insuficiente...) saem e o restante é reenviado
+    while not movements.empty:
+        try:
+            recorded = inventory_service.submit_movement_frame(movements.drop(columns="Linha"))
+        except inventory_service.BatchRejectedError as e:
+            failed = [r.Indice for r in e.results if not r.Sucesso]
+            if not failed:
+                raise
+            lines = movements["Linha"].to_numpy()
+            _report(summary, [(int(lines[r.Indice]), r.Erro) for r in e.results if not r.Sucesso])
+            movements = movements.drop(index=failed).reset_index(drop=True)
+            continue
+        summary.Aplicadas += len(recorded)
+        summary.Lotes += 1
+        return
+
+
+@instrumented("importacao")
+def import_file(path: Path, kind: str = "movimentacoes", fmt: Optional[str] = None, sheet: Optional[str] = None,
+                batch_rows: int = BULK_IMPORT_BATCH_ROWS) -> schemas.ImportSummary:
+    """
+    Importa um CSV/xlsx de movimentações (kind="movimentacoes") ou um catálogo de produtos
+    (kind="produtos", cada linha vira uma ENTRADA) em blocos de `batch_rows` linhas.
+
+    Cada bloco é lido sem carregar o arquivo inteiro, validado de forma vetorizada e gravado
+    como um lote (uma escrita no diário/SQLite por bloco, não uma por linha). Linhas inválidas
+    são relatadas com o número da linha e não interrompem a importação. No catálogo, produtos
+    repetidos (mesmo nome normalizado) valem pela primeira ocorrência no arquivo. A importação
+    não é idempotente: reimportar o mesmo catálogo (ou as mesmas movimentações) registra as
+    entradas de novo e soma as quantidades outra vez. CSV separado
+    por ';' é lido com vírgula decimal (3,5 e 1.234,56), como exportam as planilhas em pt-BR.
+    """
+    if kind not in ("movimentacoes", "produtos"):
+        raise ValueError("Tipo de importação deve ser 'movimentacoes' ou 'produtos'.")
+    fmt = detect_format(path, fmt)
+    decimal = csv_decimal_separator(path, fmt)
+    summary = schemas.ImportSummary()
+    seen: Set[str] = set()
+    for first_line, chunk in iter_file_chunks(path, fmt, max(1, batch_rows), kind, sheet):
+        summary.LinhasLidas += len(chunk)
+        movements, errors = validate_movements(chunk, first_line, kind, decimal=decimal)
+        _report(summary, errors)
+        if kind == "produtos":
+            duplicated = movements["Chave"].duplicated() | movements["Chave"].isin(seen)
+            seen.update(movements["Chave"])
+            summary.Duplicadas += int(duplicated.sum())
+            movements = movements[~duplicated].reset_index(drop=True)
+        _commit(movements, summary)
+    return summary
+
+
+def _export_chunks(content: str) -> Iterator[pd.DataFrame]:
+    if content == "estoque":
+        df_stock = inventory_service.stock_snapshot()
+        for start in range(0, len(df_stock), inventory_service.HISTORY_CHUNK_ROWS):
+            yield df_stock.iloc[start:start + inventory_service.HISTORY_CHUNK_ROWS]
+    else:
+        yield from inventory_service.iter_history()
+
+
+def stream_export_csv(content: str) -> Iterator[str]:
+    """CSV do estoque ou do histórico gerado bloco a bloco (para StreamingResponse)."""
+    _, columns, date_columns = EXPORT_SOURCES[content]
+    return iter_csv_text(columns, _export_chunks(content), date_columns)
+
+
+@instrumented("exportacao")
+def export_file(path: Path, content: str = "transacoes", fmt: Optional[str] = None) -> int:
+    """Grava o estoque ou o histórico em CSV/xlsx, bloco a bloco. Retorna o número de linhas."""
+    if content not in EXPORT_SOURCES:
+        raise ValueError("Conteúdo da exportação deve ser 'estoque' ou 'transacoes'.")
+    fmt = detect_format(path, fmt)
+    sheet_name, columns, date_columns = EXPORT_SOURCES[content]
+    rows = 0
+
+    def counted() -> Iterator[pd.DataFrame]:
+        nonlocal rows
+        for chunk in _export_chunks(content):
+            rows += len(chunk)
+            yield chunk
+
+    if fmt == "xlsx":
+        return write_xlsx_stream(path, sheet_name, columns, _export_chunks(content), date_columns)
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        for text in iter_csv_text(columns, counted(), date_columns):
+            f.write(text)
+    return rows
+
+
+def export_xlsx_tempfile(content: str) -> Path:
+    """Exporta para um .xlsx temporário (o zip só pode ser enviado depois de fechado); quem chama o remove."""
+    fd, name = tempfile.mkstemp(prefix=f"{content}_", suffix=".xlsx")
+    os.close(fd)
+    path = Path(name)
+    try:
+        export_file(path, content, "xlsx")
+    except Exception:
+        path.unlink(missing_ok=True)
+        raise
+    return path
+
+
+if __name__ == "__main__":
+    # Uso: python -m app.services.bulk_service importar|exportar arquivo.csv|arquivo.xlsx
+    #      [--tipo movimentacoes|produtos] [--conteudo transacoes|estoque] [--aba nome] [--lote N]
+    parser = argparse.ArgumentParser(description="Importação e exportação em massa (CSV/xlsx) do estoque.")
+    parser.add_argument("comando", choices=["importar", "exportar"])
+    parser.add_argument("arquivo", type=Path)
+    parser.add_argument("--tipo", choices=["movimentacoes", "produtos"], default="movimentacoes")
+    parser.add_argument("--conteudo", choices=list(EXPORT_SOURCES), default="transacoes")
+    parser.add_argument("--aba", default=None, help="Aba do xlsx a importar (padrão: a do histórico/estoque ou a primeira)")
+    parser.add_argument("--lote", type=int, default=BULK_IMPORT_BATCH_ROWS, help="Linhas por lote")
+    args = parser.parse_args()
+
+    inventory_state.load()
+    if args.comando == "importar":
+        result = import_file(args.arquivo, args.tipo, sheet=args.aba, batch_rows=args.lote)
+        # Incorpora o diário ao armazenamento uma única vez, no fim (no SQLite não há diário)
+        inventory_state.compact()
+        print(f"Importação concluída de '{args.arquivo}': {result.model_dump_json(indent=2)}")
+    else:
+        rows = export_file(args.arquivo, args.conteudo)
+        print(f"Exportação concluída para '{args.arquivo}': {rows} linha(s)")
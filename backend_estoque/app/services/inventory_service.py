@@ -1,185 +1,479 @@
-from datetime import datetime
-from typing import List, Optional
+from datetime import date, datetime
+from functools import partial
+from typing import Callable, Dict, Hashable, Iterator, List, Optional, Tuple
 from app.models import schemas
+import numpy as np
 import pandas as pd
-from app.core.config import (EXCEL_FILE_PATH, STOCK_SHEET_NAME, TRANSACTIONS_SHEET_NAME, STOCK_COLUMNS)
-from app.core.excel_handler import (append_to_sheet, get_next_transaction_id, read_sheet, write_df_to_excel)
+from app.core.bulk_io import iter_csv_text
+from app.core.config import TRANSACTION_COLUMNS
+from app.core.group_commit import group_writer
+from app.core.inventory_state import inventory_state
+from app.core.metrics import instrumented, stage_timer
+from app.core.query_cache import query_cache
+from app.core.serialization import (ARROW_MEDIA_TYPE, stock_to_arrow, stock_to_columnar_json,
+                                    stock_to_json, transactions_to_json, validate_stock_columns)
 from app.models.schemas import (ProductStock, StockMovement, TransactionRecord)
 
 
+# As movimentações passam pelo group_writer: as funções _apply_* rodam dentro da trava de
+# escrita (no líder do grupo), validam (ValueError antes de alterar qualquer coisa),
+# alteram o estado em memória e retornam as entradas do diário. A chamada pública só
+# retorna depois que o grupo da movimentação foi gravado; os modelos de resposta são
+# montados depois disso, fora da trava.
+
+def _movement(idx: int, transaction: schemas.TransactionRecord) -> Dict:
+    return {"transacao": transaction.model_dump(), "estoque": inventory_state.stock_row(idx)}
+
+
+@instrumented("entrada")
 def add_product_entry(movement: schemas.StockMovement) -> schemas.ProductStock:
-    df_stock = read_sheet(STOCK_SHEET_NAME)
-
-    # Pré-processamento do DataFrame de estoque para consistência
-    if not df_stock.empty:
-        for col in ['NomeProduto']: # Coluna usada para identificar o produto
-            if col in df_stock.columns:
-                df_stock[col] = df_stock[col].astype(str).str.strip() # Garante string e remove espaços extras
-        if 'ID_Produto' in df_stock.columns:
-            df_stock['ID_Produto'] = pd.to_numeric(df_stock['ID_Produto'], errors='coerce').fillna(0).astype(int)
-        else: # Se a coluna ID_Produto não existir (primeira execução em arquivo antigo ou erro)
-            df_stock['ID_Produto'] = pd.Series(dtype='int') # Cria coluna vazia do tipo int
+    row = group_writer.submit(partial(_apply_entry, movement))
+    with stage_timer("serializacao"):
+        return schemas.ProductStock(**row)
 
+
+def _apply_entry(movement: schemas.StockMovement) -> Tuple[List[Dict], Dict]:
     nome_produto_req = movement.NomeProduto.strip()
+    # Validado antes de alterar o estoque: um ValorUnitario inválido gravado tornaria a linha ilegível
+    if movement.ValorUnitario is not None and movement.ValorUnitario <= 0:
+        raise ValueError("ValorUnitario deve ser um número maior que zero.")
 
-    existing_product_series = df_stock[
-        (df_stock['NomeProduto'].str.lower() == nome_produto_req.lower())
-    ]
+    df_stock = inventory_state.stock
+    idx = inventory_state.find_product(nome_produto_req)
 
     product_id: int
     valor_unitario_transacao: float
 
-    if not existing_product_series.empty:
+    if idx is not None:
         # Produto existente: Atualiza quantidade e, opcionalmente, valor unitário
-        product_id = int(existing_product_series['ID_Produto'].iloc[0])
-        idx = existing_product_series.index[0]
+        product_id = int(df_stock.at[idx, 'ID_Produto'])
+
+        df_stock.at[idx, 'Quantidade'] += movement.Quantidade
 
-        df_stock.loc[idx, 'Quantidade'] += movement.Quantidade
-        
         # Atualiza ValorUnitario se um novo valor for fornecido
         if movement.ValorUnitario is not None:
-            df_stock.loc[idx, 'ValorUnitario'] = movement.ValorUnitario
+            df_stock.at[idx, 'ValorUnitario'] = movement.ValorUnitario
             valor_unitario_transacao = movement.ValorUnitario
         else:
             # Se não fornecido, usa o valor unitário existente para a transação
-            valor_unitario_transacao = df_stock.loc[idx, 'ValorUnitario']
-        df_stock.loc[idx, 'ValorTotal'] = df_stock.loc[idx, 'Quantidade'] * df_stock.loc[idx, 'ValorUnitario']
-        df_stock.loc[idx, 'DataUltimaAtualizacao'] = movement.DataMovimentacao
+            valor_unitario_transacao = float(df_stock.at[idx, 'ValorUnitario'])
+        df_stock.at[idx, 'ValorTotal'] = df_stock.at[idx, 'Quantidade'] * df_stock.at[idx, 'ValorUnitario']
+        df_stock.at[idx, 'DataUltimaAtualizacao'] = pd.Timestamp(movement.DataMovimentacao)
     else:
         # Produto novo: Atribui novo ID_Produto sequencial
         if movement.ValorUnitario is None:
             raise ValueError("ValorUnitario é obrigatório para o primeiro registro de um novo produto.")
-        
+
         valor_unitario_transacao = movement.ValorUnitario
+        product_id = inventory_state.next_product_id()
 
-        if df_stock.empty or df_stock['ID_Produto'].isna().all() or df_stock['ID_Produto'].max() == 0:
-            product_id = 1
-        else:
-            max_id = df_stock['ID_Produto'].max() # Assume que ID_Produto é numérico e já tratado
-            product_id = int(max_id + 1)
-        
-        new_stock_item = {
+        idx = inventory_state.add_stock_row({
             "ID_Produto": product_id,
             "NomeProduto": nome_produto_req,
             "ValorUnitario": movement.ValorUnitario,
             "Quantidade": movement.Quantidade,
             "DataUltimaAtualizacao": movement.DataMovimentacao,
             "ValorTotal": movement.Quantidade * movement.ValorUnitario
-        }
-        # Garante que o novo DataFrame tenha as colunas corretas antes de concatenar
-        new_stock_df = pd.DataFrame([new_stock_item])
-        if not df_stock.empty:
-            # Alinha colunas com df_stock existente, preenchendo com NaN se necessário (pouco provável aqui)
-            new_stock_df = new_stock_df.reindex(columns=df_stock.columns)
-        else:
-            # Se df_stock estava vazio, usa STOCK_COLUMNS para definir a ordem e colunas
-            new_stock_df = new_stock_df.reindex(columns=STOCK_COLUMNS)
-
-
-        df_stock = pd.concat([df_stock, new_stock_df], ignore_index=True)
-
-    # Garante que a coluna ID_Produto seja do tipo int antes de salvar
-    df_stock['ID_Produto'] = df_stock['ID_Produto'].astype(int)
-    write_df_to_excel(df_stock, STOCK_SHEET_NAME)
+        })
+        df_stock = inventory_state.stock
 
     # Registra transação
     transaction_data = schemas.TransactionRecord(
-        ID_Transacao=get_next_transaction_id(), # Função para pegar o próximo ID da planilha de transações
+        ID_Transacao=inventory_state.allocate_transaction_id(),
         DataHora=movement.DataMovimentacao,
         ID_Produto=product_id, # product_id já é int
         NomeProduto=nome_produto_req,
         TipoMovimentacao="ENTRADA",
         Quantidade=movement.Quantidade,
-        ValorUnitarioMovimentacao=valor_unitario_transacao,
         ValorTotalMovimentacao=movement.Quantidade * valor_unitario_transacao
     )
-    append_to_sheet(transaction_data.model_dump(), TRANSACTIONS_SHEET_NAME)
+    recorded = _movement(idx, transaction_data)
+    return [recorded], recorded["estoque"]
 
-    # Busca o item de estoque (atualizado ou novo) para retornar na resposta
-    # É importante buscar após a concatenação, pois o índice pode ter mudado
-    updated_product_info = df_stock[df_stock['ID_Produto'] == product_id].iloc[0]
-    return schemas.ProductStock(**updated_product_info.to_dict())
 
+@instrumented("saida")
 def remove_product_stock(movement: schemas.StockMovement) -> schemas.ProductStock:
-    df_stock = read_sheet(STOCK_SHEET_NAME)
-    
-    # Pré-processamento
-    if not df_stock.empty:
-        for col in ['NomeProduto']:
-            if col in df_stock.columns:
-                df_stock[col] = df_stock[col].astype(str).str.strip()
-        if 'ID_Produto' in df_stock.columns:
-            df_stock['ID_Produto'] = pd.to_numeric(df_stock['ID_Produto'], errors='coerce').fillna(0).astype(int)
-        else:
-            raise ValueError("Planilha de estoque não contém ID_Produto. Verifique a integridade do arquivo.")
+    row = group_writer.submit(partial(_apply_exit, movement))
+    with stage_timer("serializacao"):
+        return schemas.ProductStock(**row)
 
+
+def _apply_exit(movement: schemas.StockMovement) -> Tuple[List[Dict], Dict]:
     nome_produto_req = movement.NomeProduto.strip()
 
-    existing_product_series = df_stock[
-        (df_stock['NomeProduto'].str.lower() == nome_produto_req.lower()) 
-    ]
+    df_stock = inventory_state.stock
+    idx = inventory_state.find_product(nome_produto_req)
 
-    if existing_product_series.empty:
+    if idx is None:
         raise ValueError(f"Produto '{nome_produto_req}' não encontrado no estoque.")
 
-    idx = existing_product_series.index[0]
-    product_id = int(existing_product_series['ID_Produto'].iloc[0])
-    current_quantity = df_stock.loc[idx, 'Quantidade']
-    valor_unitario_atual_estoque = df_stock.loc[idx, 'ValorUnitario']
+    product_id = int(df_stock.at[idx, 'ID_Produto'])
+    current_quantity = int(df_stock.at[idx, 'Quantidade'])
+    valor_unitario_atual_estoque = float(df_stock.at[idx, 'ValorUnitario'])
 
     if current_quantity < movement.Quantidade:
         raise ValueError(f"Quantidade insuficiente em estoque para '{nome_produto_req}'. Disponível: {current_quantity}")
 
-    df_stock.loc[idx, 'Quantidade'] -= movement.Quantidade
-    df_stock.loc[idx, 'DataUltimaAtualizacao'] = movement.DataMovimentacao
-    df_stock.loc[idx, 'ValorTotal'] = df_stock.loc[idx, 'Quantidade'] * df_stock.loc[idx, 'ValorUnitario']
-    
-    df_stock['ID_Produto'] = df_stock['ID_Produto'].astype(int) # Garante tipo antes de salvar
-    write_df_to_excel(df_stock, STOCK_SHEET_NAME)
+    df_stock.at[idx, 'Quantidade'] -= movement.Quantidade
+    df_stock.at[idx, 'DataUltimaAtualizacao'] = pd.Timestamp(movement.DataMovimentacao)
+    df_stock.at[idx, 'ValorTotal'] = df_stock.at[idx, 'Quantidade'] * df_stock.at[idx, 'ValorUnitario']
 
     # Registra transação
     transaction_data = schemas.TransactionRecord(
-        ID_Transacao=get_next_transaction_id(),
+        ID_Transacao=inventory_state.allocate_transaction_id(),
         DataHora=movement.DataMovimentacao,
         ID_Produto=product_id,
         NomeProduto=nome_produto_req,
         TipoMovimentacao="SAIDA",
         Quantidade=movement.Quantidade,
-        ValorUnitarioMovimentacao=valor_unitario_atual_estoque, # Usa o valor do estoque no momento da saída
-        ValorTotalMovimentacao=movement.Quantidade * valor_unitario_atual_estoque
+        ValorTotalMovimentacao=movement.Quantidade * valor_unitario_atual_estoque # Usa o valor do estoque no momento da saída
     )
-    append_to_sheet(transaction_data.model_dump(), TRANSACTIONS_SHEET_NAME)
-    
-    updated_product_info = df_stock[df_stock['ID_Produto'] == product_id].iloc[0]
-    return schemas.ProductStock(**updated_product_info.to_dict())
+    recorded = _movement(idx, transaction_data)
+    return [recorded], recorded["estoque"]
+
+class BatchRejectedError(ValueError):
+    """Lote rejeitado: nenhuma movimentação foi aplicada; `results` indica o motivo de cada item inválido."""
+
+    def __init__(self, results: List[schemas.BatchMovementResult]):
+        failed = sum(not r.Sucesso for r in results)
+        super().__init__(f"Lote rejeitado: {failed} movimentação(ões) inválida(s). Nenhuma movimentação foi aplicada.")
+        self.results = results
+
+
+@instrumented("lote")
+def apply_movement_batch(movements: List[schemas.BatchStockMovement]) -> List[schemas.BatchMovementResult]:
+    """
+    Aplica N entradas/saídas como uma unidade (tudo ou nada).
+
+    A validação é feita de forma vetorizada sobre o lote inteiro, na ordem enviada:
+    saldos correntes por produto via cumsum agrupado, valor unitário vigente via ffill.
+    As transações recebem um bloco contíguo de IDs e são gravadas com uma única escrita.
+    """
+    if not movements:
+        raise ValueError("O lote não contém movimentações.")
+
+    batch = pd.DataFrame({
+        'NomeProduto': [m.NomeProduto.strip() for m in movements],
+        'TipoMovimentacao': [m.TipoMovimentacao for m in movements],
+        'Quantidade': np.array([m.Quantidade for m in movements], dtype='int64'),
+        'ValorUnitario': np.array([np.nan if m.ValorUnitario is None else m.ValorUnitario for m in movements], dtype=float),
+        'DataHora': [m.DataMovimentacao for m in movements],
+    })
+    batch['Chave'] = batch['NomeProduto'].str.lower()
+    recorded = submit_movement_frame(batch)
+    return [
+        schemas.BatchMovementResult(Indice=i, Sucesso=True, Transacao=schemas.TransactionRecord(**m["transacao"]),
+                                    Produto=schemas.ProductStock(**m["estoque"]))
+        for i, m in enumerate(recorded)
+    ]
+
+
+def submit_movement_frame(batch: pd.DataFrame) -> List[Dict]:
+    """
+    Aplica um lote já montado em DataFrame (colunas NomeProduto, TipoMovimentacao, Quantidade,
+    ValorUnitario, DataHora e Chave = nome normalizado), tudo ou nada, e retorna as entradas
+    gravadas ({"transacao", "estoque"} por movimentação). Levanta BatchRejectedError.
+    """
+    return group_writer.submit(partial(_apply_batch, batch))
+
+
+def _apply_batch(batch: pd.DataFrame) -> Tuple[List[Dict], List[Dict]]:
+    is_entry = batch['TipoMovimentacao'] == 'ENTRADA'
+
+    df_stock = inventory_state.stock
+    batch['idx'] = batch['Chave'].map(inventory_state.name_index)
+    exists = batch['idx'].notna()
+    existing_rows = batch.loc[exists, 'idx'].astype('int64').values
+    by_product = batch['Chave']
+
+    # Saldo de cada produto logo após cada movimentação
+    signed = batch['Quantidade'].where(is_entry, -batch['Quantidade'])
+    initial_qty = batch['idx'].map(df_stock['Quantidade']).fillna(0).astype('int64')
+    batch['Saldo'] = initial_qty + signed.groupby(by_product).cumsum()
+    # Valor unitário vigente: o último informado em uma ENTRADA do lote, senão o do estoque
+    batch['ValorVigente'] = (batch['ValorUnitario'].where(is_entry).groupby(by_product).ffill()
+                             .fillna(batch['idx'].map(df_stock['ValorUnitario'])))
+    # Produto conhecido neste ponto do lote: já existia ou recebeu uma ENTRADA até aqui
+    entries_so_far = is_entry.astype('int64').groupby(by_product).cumsum()
+    is_new_product_entry = ~exists & is_entry & (entries_so_far == 1)
+
+    not_found = ~exists & (entries_so_far == 0)
+    insufficient = ~not_found & (batch['Saldo'] < 0)
+    missing_price = is_new_product_entry & batch['ValorUnitario'].isna()
+    invalid_price = batch['ValorUnitario'].le(0)
+    invalid = not_found | insufficient | missing_price | invalid_price
+
+    if invalid.any():
+        # Mensagens só para os itens inválidos (lotes grandes vêm da importação em massa)
+        errors = {}
+        names, saldos, quantities = batch['NomeProduto'].tolist(), batch['Saldo'].tolist(), batch['Quantidade'].tolist()
+        for i in np.flatnonzero(invalid.to_numpy()):
+            if not_found.iat[i]:
+                errors[i] = f"Produto '{names[i]}' não encontrado no estoque."
+            elif insufficient.iat[i]:
+                errors[i] = (f"Quantidade insuficiente em estoque para '{names[i]}'. "
+                             f"Disponível: {max(saldos[i] + quantities[i], 0)}")
+            elif invalid_price.iat[i]:
+                errors[i] = "ValorUnitario deve ser um número maior que zero."
+            else:
+                errors[i] = "ValorUnitario é obrigatório para o primeiro registro de um novo produto."
+        results = [schemas.BatchMovementResult(Indice=i, Sucesso=i not in errors, Erro=errors.get(i))
+                   for i in range(len(batch))]
+        raise BatchRejectedError(results)
+
+    # Produtos novos, na ordem em que aparecem no lote
+    new_products = batch[is_new_product_entry]
+    first_product_id = inventory_state.next_product_id()
+    new_ids = dict(zip(new_products['Chave'], range(first_product_id, first_product_id + len(new_products))))
+    new_names = dict(zip(new_products['Chave'], new_products['NomeProduto']))
+
+    product_ids = batch['Chave'].map(new_ids)
+    product_ids[exists] = df_stock['ID_Produto'].values[existing_rows]
+    stored_names = batch['Chave'].map(new_names).astype(object) # Sem produtos novos o map sai float (NaN)
+    stored_names[exists] = df_stock['NomeProduto'].values[existing_rows]
+
+    batch['ID_Produto'] = product_ids.astype('int64')
+    batch['ID_Transacao'] = inventory_state.allocate_transaction_ids(len(batch)) + np.arange(len(batch))
+    batch['ValorTotalMovimentacao'] = batch['Quantidade'] * batch['ValorVigente']
 
+    # Estado do produto após cada movimentação (vai para o diário junto com a transação)
+    after = pd.DataFrame({
+        'ID_Produto': batch['ID_Produto'],
+        'NomeProduto': stored_names,
+        'ValorUnitario': batch['ValorVigente'],
+        'Quantidade': batch['Saldo'],
+        'DataUltimaAtualizacao': batch['DataHora'],
+        'ValorTotal': batch['Saldo'] * batch['ValorVigente'],
+    })
+
+    # Estado final de cada produto = última linha do lote para ele
+    final = after.groupby(batch['Chave'], sort=False).tail(1)
+    final_existing = final[exists.loc[final.index]]
+    final_new = final[~exists.loc[final.index]]
+    if not final_existing.empty:
+        idxs = batch.loc[final_existing.index, 'idx'].astype('int64').values
+        for col in ['ValorUnitario', 'Quantidade', 'ValorTotal']:
+            df_stock.loc[idxs, col] = final_existing[col].values
+        df_stock.loc[idxs, 'DataUltimaAtualizacao'] = pd.to_datetime(final_existing['DataUltimaAtualizacao']).values
+    if not final_new.empty:
+        inventory_state.add_stock_rows(final_new.to_dict('records'))
+
+    transactions = batch[['ID_Transacao', 'DataHora', 'ID_Produto', 'NomeProduto', 'TipoMovimentacao',
+                          'Quantidade', 'ValorTotalMovimentacao']].to_dict('records')
+    stock_rows = after.to_dict('records')
+    recorded = [{"transacao": t, "estoque": p} for t, p in zip(transactions, stock_rows)]
+    return recorded, recorded
+
+
+def stock_snapshot(as_of: Optional[date] = None) -> pd.DataFrame:
+    # Cópia do estoque tirada sob a trava (barata perto da serialização, que roda fora dela)
+    inventory_state.refresh()
+    with inventory_state.lock:
+        if as_of is not None:
+            with stage_timer("estoque_em_data"):
+                df_stock = inventory_state.stock_as_of(as_of)
+        else:
+            df_stock = inventory_state.stock.copy()
+    return validate_stock_columns(df_stock)
+
+
+@instrumented("listar_estoque")
 def get_all_stock_items() -> List[ProductStock]:
-    # Retorna todos os itens atualmente em estoque
-    df_stock = read_sheet(STOCK_SHEET_NAME)
+    # Retorna todos os itens atualmente em estoque (colunas já validadas: sem revalidar linha a linha)
+    df_stock = stock_snapshot()
     if df_stock.empty:
         return []
-    return [ProductStock(**row.to_dict()) for _, row in df_stock.iterrows()]
+    df_stock = df_stock.assign(DataUltimaAtualizacao=df_stock['DataUltimaAtualizacao'].dt.date)
+    return [ProductStock.model_construct(**row) for row in df_stock.to_dict('records')]
+
+
+@instrumented("serializar_estoque")
+def serialize_stock(fmt: str, message: str, as_of: Optional[date] = None) -> Tuple[bytes, str]:
+    """
+    Serializa o estoque inteiro direto das colunas, sem montar um ProductStock por linha.
+    Retorna (corpo, media_type) para json, colunar (json por colunas) ou arrow (Arrow IPC).
+    Com `as_of`, serializa o estoque ao fim daquele dia (reconstruído a partir dos checkpoints).
+    """
+    df_stock = stock_snapshot(as_of)
+    with stage_timer("serializacao"):
+        if fmt == "arrow":
+            return stock_to_arrow(df_stock), ARROW_MEDIA_TYPE
+        if fmt == "colunar":
+            return stock_to_columnar_json(df_stock, message), "application/json"
+        return stock_to_json(df_stock, message), "application/json"
+
+def get_data_version() -> str:
+    """Versão dos dados já sincronizada com o disco (muda a cada movimentação ou recarga)."""
+    inventory_state.refresh()
+    with inventory_state.lock: # Escritas em andamento seguram a trava: a versão é sempre de dados gravados
+        return inventory_state.data_version()
+
+
+def cached_query(version: str, key: Hashable, compute: Callable[[], Tuple[bytes, str]]) -> Tuple[bytes, str, bool]:
+    """
+    Retorna (corpo, media_type, consistente) de `compute()`, reaproveitando o resultado
+    guardado para a mesma versão dos dados e a mesma consulta.
+
+    `consistente` é False quando houve uma movimentação durante o cálculo: o resultado
+    não é guardado e não pode ser associado a `version` (ETag).
+    """
+    cached = query_cache.get(version, key)
+    if cached is not None:
+        return (*cached, True)
+    body, media_type = compute()
+    with inventory_state.lock:
+        consistent = inventory_state.data_version() == version
+    if consistent:
+        query_cache.put(version, key, (body, media_type), len(body))
+    return body, media_type, consistent
+
+
+# Tamanho dos blocos em que o histórico é percorrido (memória constante ao filtrar/transmitir)
+HISTORY_CHUNK_ROWS = 5000
+
+
+def _resolve_product_filter(product: str) -> Optional[int]:
+    # Aceita o ID_Produto ou o nome (sem diferenciar maiúsculas); as transações são
+    # filtradas por ID porque guardam o nome como foi digitado em cada movimentação.
+    product = product.strip()
+    if product.isdigit():
+        return int(product)
+    idx = inventory_state.find_product(product)
+    return None if idx is None else int(inventory_state.stock.at[idx, 'ID_Produto'])
 
+
+def iter_history(start_date: Optional[datetime] = None,
+                  end_date: Optional[datetime] = None,
+                  product: Optional[str] = None,
+                  movement_type: Optional[str] = None,
+                  cursor: Optional[int] = None) -> Iterator[pd.DataFrame]:
+    """Percorre o histórico em blocos, em ordem de ID_Transacao, já filtrado."""
+    inventory_state.refresh()
+    with inventory_state.lock:
+        df_transactions = inventory_state.transactions
+        # Com filtro de data, só as partições mensais que tocam o período são visitadas
+        positions = None
+        if start_date or end_date:
+            positions = inventory_state.partitions.positions_for_range(start_date, end_date)
+
+    product_id = None
+    if product:
+        product_id = _resolve_product_filter(product)
+        if product_id is None:
+            return # Produto inexistente: nenhuma transação
+
+    # Paginação por cursor (keyset): o histórico é ordenado por ID_Transacao, então a
+    # posição inicial sai de uma busca binária em vez de um OFFSET
+    start = 0
+    if cursor is not None:
+        start = int(np.searchsorted(df_transactions['ID_Transacao'].to_numpy(), cursor, side='right'))
+
+    if positions is not None:
+        positions = positions[positions >= start]
+        blocks = (positions[i:i + HISTORY_CHUNK_ROWS] for i in range(0, len(positions), HISTORY_CHUNK_ROWS))
+    else:
+        blocks = (slice(pos, pos + HISTORY_CHUNK_ROWS) for pos in range(start, len(df_transactions), HISTORY_CHUNK_ROWS))
+
+    for block in blocks:
+        chunk = df_transactions.iloc[block]
+        mask = np.ones(len(chunk), dtype=bool)
+        if start_date:
+            mask &= (chunk['DataHora'] >= start_date).to_numpy()
+        if end_date:
+            mask &= (chunk['DataHora'] <= end_date).to_numpy()
+        if product_id is not None:
+            mask &= (chunk['ID_Produto'] == product_id).to_numpy()
+        if movement_type:
+            mask &= (chunk['TipoMovimentacao'] == movement_type).to_numpy()
+        if mask.any():
+            yield chunk[mask]
+
+
+@instrumented("particoes")
+def get_transaction_partitions() -> List[schemas.TransactionPartition]:
+    """Manifesto das partições mensais do histórico."""
+    inventory_state.refresh()
+    with inventory_state.lock:
+        inventory_state.transactions # Incorpora transações pendentes às partições
+        manifest = inventory_state.partitions.manifest()
+    return [schemas.TransactionPartition(**p) for p in manifest]
+
+
+@instrumented("historico")
 def get_transaction_history(start_date: Optional[datetime] = None,
                             end_date: Optional[datetime] = None,
-                            product_type: Optional[str] = None) -> List[TransactionRecord]:
-    # Retorna o histórico de transações, com filtros opcionais
-    df_transactions = read_sheet(TRANSACTIONS_SHEET_NAME)
-    if df_transactions.empty:
-        return []
+                            product: Optional[str] = None,
+                            movement_type: Optional[str] = None,
+                            limit: Optional[int] = None,
+                            cursor: Optional[int] = None) -> Tuple[List[TransactionRecord], Optional[int]]:
+    """
+    Retorna uma página do histórico de transações e o cursor da próxima página
+    (None quando não há mais resultados ou quando não há limite).
+    """
+    page, next_cursor = _history_page(start_date, end_date, product, movement_type, limit, cursor)
+    return [TransactionRecord(**row) for row in page.to_dict('records')], next_cursor
+
+
+def _history_page(start_date: Optional[datetime] = None,
+                  end_date: Optional[datetime] = None,
+                  product: Optional[str] = None,
+                  movement_type: Optional[str] = None,
+                  limit: Optional[int] = None,
+                  cursor: Optional[int] = None) -> Tuple[pd.DataFrame, Optional[int]]:
+    # Página como DataFrame (colunas do histórico) + cursor da próxima página
+    chunks, rows = [], 0
+    for chunk in iter_history(start_date, end_date, product, movement_type, cursor):
+        if limit is not None:
+            # Uma linha a mais que o limite indica que existe próxima página
+            chunk = chunk.iloc[:limit + 1 - rows]
+        chunks.append(chunk)
+        rows += len(chunk)
+        if limit is not None and rows > limit:
+            break
+
+    if not chunks:
+        return pd.DataFrame(columns=TRANSACTION_COLUMNS), None
+    page = pd.concat(chunks, ignore_index=True) if len(chunks) > 1 else chunks[0]
+    next_cursor = None
+    if limit is not None and len(page) > limit:
+        page = page.iloc[:limit]
+        next_cursor = int(page['ID_Transacao'].iat[-1])
+    return page, next_cursor
+
+
+@instrumented("serializar_historico")
+def serialize_transaction_page(message: str, **filters) -> Tuple[bytes, str]:
+    """Página do histórico serializada direto das colunas, no formato de TransactionPageResponse."""
+    page, next_cursor = _history_page(**filters)
+    with stage_timer("serializacao"):
+        return transactions_to_json(page, message, next_cursor), "application/json"
 
-    # Converte DataHora para datetime se não estiver
-    if 'DataHora' in df_transactions.columns:
-         df_transactions['DataHora'] = pd.to_datetime(df_transactions['DataHora'])
 
+def stream_transaction_history(fmt: str,
+                               start_date: Optional[datetime] = None,
+                               end_date: Optional[datetime] = None,
+                               product: Optional[str] = None,
+                               movement_type: Optional[str] = None,
+                               limit: Optional[int] = None,
+                               cursor: Optional[int] = None) -> Iterator[str]:
+    """Gera o histórico como NDJSON ou CSV, bloco a bloco, sem montar a resposta inteira em memória."""
+    chunks = _limit_chunks(iter_history(start_date, end_date, product, movement_type, cursor), limit)
+    if fmt == "csv":
+        # Mesmo escape de fórmulas da exportação em massa: o CSV costuma ser aberto numa planilha
+        yield from iter_csv_text(TRANSACTION_COLUMNS, chunks, date_columns=("DataHora",))
+        return
+    for chunk in chunks:
+        chunk = chunk.assign(DataHora=chunk['DataHora'].dt.strftime('%Y-%m-%d'))
+        text = chunk.to_json(orient='records', lines=True, force_ascii=False)
+        yield text if text.endswith("\n") else text + "\n"
 
-    if start_date:
-        df_transactions = df_transactions[df_transactions['DataHora'] >= start_date]
-    if end_date:
-        # Adiciona 1 dia ao end_date para incluir transações do dia inteiro
-        # end_date_inclusive = end_date + timedelta(days=1)
-        # df_transactions = df_transactions[df_transactions['DataHora'] < end_date_inclusive]
-        # Ou, se DataHora já for datetime, pode comparar diretamente
-        df_transactions = df_transactions[df_transactions['DataHora'] <= end_date]
 
-    return [TransactionRecord(**row.to_dict()) for _, row in df_transactions.iterrows()]
\ No newline at end of file
+def _limit_chunks(chunks: Iterator[pd.DataFrame], limit: Optional[int]) -> Iterator[pd.DataFrame]:
+    remaining = limit
+    for chunk in chunks:
+        if remaining is not None:
+            chunk = chunk.iloc[:remaining]
+            remaining -= len(chunk)
+        yield chunk
+        if remaining == 0:
+            break
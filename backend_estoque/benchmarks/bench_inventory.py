@@ -0,0 +1,309 @@
+"""
+Benchmark do serviço de estoque e dos caminhos de I/O do armazenamento.
+
+Gera planilhas sintéticas (de 1 mil a 1 milhão de transações, de 100 a 100 mil
+produtos) e mede add_product_entry, remove_product_stock, get_all_stock_items e
+get_transaction_history diretamente e pela API FastAPI (TestClient, requer httpx).
+
+No Excel, entradas e saídas só fazem o append no diário; a regravação do .xlsx fica
+para a compactação. Para que esse custo apareça, cada cenário força uma compactação
+ao fim das operações e a reporta à parte, com o custo amortizado por movimentação
+(tempo da compactação / movimentações incorporadas).
+
+Cada cenário roda em um subprocesso próprio, com os dados copiados para um
+diretório temporário (ESTOQUE_DATA_DIR), para que RSS e contadores de I/O
+reflitam apenas aquele cenário.
+
+Uso (a partir de backend_estoque/):
+    python -m benchmarks.bench_inventory --tamanhos 1000x100 100000x1000 --iteracoes 200
+    python -m benchmarks.bench_inventory --salvar benchmarks/baseline.json
+    python -m benchmarks.bench_inventory --comparar benchmarks/baseline.json
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+OPERATIONS = ["entrada", "saida", "estoque", "transacoes"]
+
+
+# --- Geração de dados sintéticos -------------------------------------------------
+
+def generate_workbook(data_dir: Path, transactions: int, products: int, seed: int = 42):
+    """Cria estoque.xlsx com `products` produtos e `transactions` transações coerentes com o saldo."""
+    import numpy as np
+    import pandas as pd
+
+    from app.core.config import STOCK_SHEET_NAME, TRANSACTIONS_SHEET_NAME
+
+    rng = np.random.default_rng(seed)
+    product_ids = np.arange(1, products + 1)
+    names = np.array([f"Produto {i:06d}" for i in product_ids])
+    prices = np.round(rng.uniform(0.5, 500.0, products), 2)
+
+    # Cada produto começa com uma entrada grande; o restante é uma mistura de entradas e saídas
+    tx_products = np.concatenate([product_ids, rng.integers(1, products + 1, max(transactions - products, 0))])[:transactions]
+    is_exit = np.zeros(len(tx_products), dtype=bool)
+    is_exit[products:] = rng.random(len(tx_products) - products) < 0.5 if len(tx_products) > products else False
+    quantities = np.where(is_exit, rng.integers(1, 10, len(tx_products)), rng.integers(10, 100, len(tx_products)))
+    quantities[:products] = 1_000_000 # Saldo inicial alto: as saídas do benchmark nunca falham
+
+    start = date.today() - timedelta(days=730)
+    days = np.sort(rng.integers(0, 730, len(tx_products)))
+    dates = pd.to_datetime(start) + pd.to_timedelta(days, unit="D")
+
+    df_tx = pd.DataFrame({
+        "ID_Transacao": np.arange(1, len(tx_products) + 1),
+        "DataHora": dates,
+        "ID_Produto": tx_products,
+        "NomeProduto": names[tx_products - 1],
+        "TipoMovimentacao": np.where(is_exit, "SAIDA", "ENTRADA"),
+        "Quantidade": quantities,
+        "ValorTotalMovimentacao": quantities * prices[tx_products - 1],
+    })
+
+    signed = np.where(is_exit, -quantities, quantities)
+    balance = pd.Series(signed).groupby(tx_products).sum().reindex(product_ids, fill_value=0).to_numpy()
+    last_date = pd.Series(dates).groupby(tx_products).max().reindex(product_ids).to_numpy()
+    df_stock = pd.DataFrame({
+        "ID_Produto": product_ids,
+        "NomeProduto": names,
+        "ValorUnitario": prices,
+        "Quantidade": balance,
+        "DataUltimaAtualizacao": last_date,
+        "ValorTotal": balance * prices,
+    })
+
+    data_dir.mkdir(parents=True, exist_ok=True)
+    from app.core.excel_handler import atomic_excel_writer
+    with atomic_excel_writer(data_dir / "estoque.xlsx") as writer:
+        df_stock.to_excel(writer, sheet_name=STOCK_SHEET_NAME, index=False)
+        df_tx.to_excel(writer, sheet_name=TRANSACTIONS_SHEET_NAME, index=False)
+
+
+# --- Medição ---------------------------------------------------------------------
+
+def _io_counters() -> Optional[Dict[str, int]]:
+    # rchar/wchar: bytes lidos/gravados via syscalls (inclui cache de página). Só Linux.
+    try:
+        with open("/proc/self/io") as f:
+            fields = dict(line.split(": ") for line in f.read().splitlines())
+        return {"read": int(fields["rchar"]), "write": int(fields["wchar"])}
+    except (OSError, KeyError, ValueError):
+        return None
+
+
+def _peak_rss_mb() -> Optional[float]:
+    try:
+        import resource
+    except ImportError: # Windows
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def _percentile(sorted_values: List[float], pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    k = min(len(sorted_values) - 1, max(0, int(round(pct / 100 * (len(sorted_values) - 1)))))
+    return sorted_values[k]
+
+
+def measure(fn: Callable[[int], Any], iterations: int) -> Dict[str, Any]:
+    latencies = []
+    io_before = _io_counters()
+    started = time.perf_counter()
+    for i in range(iterations):
+        t0 = time.perf_counter_ns()
+        fn(i)
+        latencies.append((time.perf_counter_ns() - t0) / 1e6)
+    elapsed = time.perf_counter() - started
+    io_after = _io_counters()
+    latencies.sort()
+    result = {
+        "p50_ms": round(_percentile(latencies, 50), 3),
+        "p99_ms": round(_percentile(latencies, 99), 3),
+        "ops_por_s": round(iterations / elapsed, 1) if elapsed else None,
+        "bytes_lidos_por_op": None,
+        "bytes_gravados_por_op": None,
+    }
+    if io_before and io_after:
+        result["bytes_lidos_por_op"] = (io_after["read"] - io_before["read"]) // iterations
+        result["bytes_gravados_por_op"] = (io_after["write"] - io_before["write"]) // iterations
+    return result
+
+
+def run_worker(mode: str, products: int, iterations: int) -> Dict[str, Any]:
+    """Executado no subprocesso, com ESTOQUE_DATA_DIR já apontando para a cópia dos dados."""
+    from app.models.schemas import StockMovement
+
+    rng = random.Random(7)
+    names = [f"Produto {rng.randint(1, products):06d}" for _ in range(iterations)]
+    start_date = datetime.combine(date.today() - timedelta(days=60), datetime.min.time())
+    results: Dict[str, Any] = {}
+
+    t0 = time.perf_counter()
+    if mode == "direto":
+        from app.core.inventory_state import inventory_state
+        from app.services import inventory_service as svc
+        inventory_state.load()
+        results["carga_ms"] = round((time.perf_counter() - t0) * 1000, 1)
+
+        ops = {
+            "entrada": lambda i: svc.add_product_entry(StockMovement(NomeProduto=names[i], Quantidade=5)),
+            "saida": lambda i: svc.remove_product_stock(StockMovement(NomeProduto=names[i], Quantidade=1)),
+            "estoque": lambda i: svc.get_all_stock_items(),
+            "transacoes": lambda i: svc.get_transaction_history(start_date=start_date, limit=100),
+        }
+    else:
+        from fastapi.testclient import TestClient
+        from app.main import app
+        client = TestClient(app)
+        client.__enter__() # Executa o lifespan (carga do estoque); encerrado junto com o processo
+        results["carga_ms"] = round((time.perf_counter() - t0) * 1000, 1)
+
+        def check(response):
+            response.raise_for_status()
+
+        ops = {
+            "entrada": lambda i: check(client.post("/api/inventory/entrada", json={"NomeProduto": names[i], "Quantidade": 5})),
+            "saida": lambda i: check(client.post("/api/inventory/saida", json={"NomeProduto": names[i], "Quantidade": 1})),
+            "estoque": lambda i: check(client.get("/api/inventory/estoque")),
+            "transacoes": lambda i: check(client.get("/api/inventory/transacoes",
+                                                     params={"data_inicio": start_date.date().isoformat(), "limite": 100})),
+        }
+
+    for name in OPERATIONS:
+        results[name] = measure(ops[name], iterations)
+    results["compactacao"] = measure_compaction()
+    results["pico_rss_mb"] = _peak_rss_mb()
+    return results
+
+
+def measure_compaction() -> Optional[Dict[str, Any]]:
+    """Incorpora ao armazenamento o diário deixado pelas operações (None em motores sem diário)."""
+    from app.core.inventory_state import inventory_state
+
+    if inventory_state.storage.supports_incremental_writes:
+        return None
+    movements = inventory_state.journal.entry_count
+    io_before = _io_counters()
+    started = time.perf_counter()
+    inventory_state.persist()
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    io_after = _io_counters()
+    return {
+        "movimentacoes": movements,
+        "ms": round(elapsed_ms, 1),
+        "ms_por_movimentacao": round(elapsed_ms / movements, 3) if movements else None,
+        "bytes_gravados": io_after["write"] - io_before["write"] if io_before and io_after else None,
+    }
+
+
+# --- Orquestração ----------------------------------------------------------------
+
+def parse_size(text: str):
+    transactions, products = text.lower().split("x")
+    return int(transactions), int(products)
+
+
+def run_all(sizes: List[str], modes: List[str], iterations: int, storage: str) -> Dict[str, Any]:
+    report: Dict[str, Any] = {"armazenamento": storage, "iteracoes": iterations, "cenarios": {}}
+    with tempfile.TemporaryDirectory(prefix="bench_estoque_") as tmp:
+        for size in sizes:
+            transactions, products = parse_size(size)
+            template = Path(tmp) / f"modelo_{size}"
+            print(f"Gerando planilha sintética {size} ({transactions} transações, {products} produtos)...", flush=True)
+            generate_workbook(template, transactions, products)
+
+            for mode in modes:
+                data_dir = Path(tmp) / f"{size}_{mode}"
+                shutil.copytree(template, data_dir)
+                env = dict(os.environ, ESTOQUE_DATA_DIR=str(data_dir), ESTOQUE_STORAGE=storage)
+                if storage == "sqlite":
+                    subprocess.run([sys.executable, "-m", "app.core.sqlite_handler", "migrar"],
+                                   cwd=BACKEND_DIR, env=env, check=True, capture_output=True)
+                proc = subprocess.run(
+                    [sys.executable, "-m", "benchmarks.bench_inventory", "--worker", mode,
+                     "--produtos", str(products), "--iteracoes", str(iterations)],
+                    cwd=BACKEND_DIR, env=env, capture_output=True, text=True,
+                )
+                if proc.returncode != 0:
+                    print(f"  {mode}: falhou\n{proc.stderr}", file=sys.stderr)
+                    continue
+                result = json.loads(proc.stdout.strip().splitlines()[-1])
+                report["cenarios"][f"{size}/{mode}"] = result
+                print_scenario(f"{size}/{mode}", result)
+    return report
+
+
+def print_scenario(key: str, result: Dict[str, Any]):
+    print(f"\n[{key}] carga: {result['carga_ms']} ms, pico RSS: {result['pico_rss_mb']} MB")
+    print(f"  {'operação':<12}{'p50 ms':>10}{'p99 ms':>10}{'ops/s':>10}{'lidos/op':>14}{'gravados/op':>14}")
+    for op in OPERATIONS:
+        r = result[op]
+        print(f"  {op:<12}{r['p50_ms']:>10}{r['p99_ms']:>10}{r['ops_por_s']:>10}"
+              f"{str(r['bytes_lidos_por_op']):>14}{str(r['bytes_gravados_por_op']):>14}")
+    c = result.get("compactacao")
+    if c:
+        print(f"  compactação: {c['ms']} ms para {c['movimentacoes']} movimentação(ões) do diário "
+              f"({c['ms_por_movimentacao']} ms/movimentação amortizado), {c['bytes_gravados']} bytes gravados")
+
+
+def compare(baseline: Dict[str, Any], current: Dict[str, Any]):
+    print("\nComparação com a linha de base (variação de p50 / p99; negativo = mais rápido):")
+    for key, result in current["cenarios"].items():
+        base = baseline.get("cenarios", {}).get(key)
+        if base is None:
+            print(f"  [{key}] sem linha de base")
+            continue
+        parts = []
+        for op in OPERATIONS:
+            b, c = base[op], result[op]
+            d50 = (c["p50_ms"] - b["p50_ms"]) / b["p50_ms"] * 100 if b["p50_ms"] else 0.0
+            d99 = (c["p99_ms"] - b["p99_ms"]) / b["p99_ms"] * 100 if b["p99_ms"] else 0.0
+            parts.append(f"{op} {d50:+.0f}%/{d99:+.0f}%")
+        b, c = base.get("compactacao"), result.get("compactacao")
+        if b and c and b["ms_por_movimentacao"] and c["ms_por_movimentacao"]:
+            d = (c["ms_por_movimentacao"] - b["ms_por_movimentacao"]) / b["ms_por_movimentacao"] * 100
+            parts.append(f"compactacao {d:+.0f}%/movimentação")
+        print(f"  [{key}] " + ", ".join(parts))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark do serviço de estoque.")
+    parser.add_argument("--tamanhos", nargs="+", default=["1000x100", "100000x1000"],
+                        help="Cenários no formato TRANSACOESxPRODUTOS (ex.: 1000000x100000)")
+    parser.add_argument("--modos", nargs="+", choices=["direto", "http"], default=["direto", "http"])
+    parser.add_argument("--iteracoes", type=int, default=100)
+    parser.add_argument("--armazenamento", choices=["excel", "sqlite"], default="excel")
+    parser.add_argument("--salvar", type=Path, help="Grava os resultados em JSON (linha de base)")
+    parser.add_argument("--comparar", type=Path, help="Compara com uma linha de base salva")
+    parser.add_argument("--worker", choices=["direto", "http"], help=argparse.SUPPRESS)
+    parser.add_argument("--produtos", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        print(json.dumps(run_worker(args.worker, args.produtos, args.iteracoes)))
+        return
+
+    report = run_all(args.tamanhos, args.modos, args.iteracoes, args.armazenamento)
+    if args.salvar:
+        args.salvar.write_text(json.dumps(report, indent=2, ensure_ascii=False), encoding="utf-8")
+        print(f"\nResultados salvos em {args.salvar}")
+    if args.comparar:
+        compare(json.loads(args.comparar.read_text(encoding="utf-8")), report)
+
+
+if __name__ == "__main__":
+    main()
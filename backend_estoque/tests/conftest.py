@@ -0,0 +1,49 @@
+import os
+import shutil
+import sys
+import tempfile
+from pathlib import Path
+
+import pytest
+
+# Os caminhos dos dados são lidos de app.core.config na importação: o diretório dos
+# testes precisa estar no ambiente antes de qualquer import de app
+DATA_DIR = Path(tempfile.mkdtemp(prefix="estoque_testes_"))
+os.environ["ESTOQUE_DATA_DIR"] = str(DATA_DIR)
+os.environ["ESTOQUE_STORAGE"] = "excel"
+os.environ["ESTOQUE_GRUPO_JANELA_MS"] = "0"
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+if str(BACKEND_DIR) not in sys.path:
+    sys.path.insert(0, str(BACKEND_DIR))
+
+from app.core.inventory_state import inventory_state  # noqa: E402
+from app.core.query_cache import query_cache  # noqa: E402
+
+
+def clear_data_dir():
+    for path in DATA_DIR.iterdir():
+        if path.is_dir():
+            shutil.rmtree(path)
+        else:
+            path.unlink()
+
+
+@pytest.fixture
+def data_dir() -> Path:
+    """Diretório de dados dos testes, vazio no início e no fim de cada teste."""
+    clear_data_dir()
+    yield DATA_DIR
+    clear_data_dir()
+
+
+@pytest.fixture
+def state(data_dir):
+    """Estado do processo recarregado a partir de um diretório de dados vazio."""
+    query_cache.clear()
+    inventory_state.load()
+    return inventory_state
+
+
+def pytest_sessionfinish(session, exitstatus):
+    shutil.rmtree(DATA_DIR, ignore_errors=True)
@@ -0,0 +1,46 @@
+from datetime import date
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.core.inventory_state import InventoryState
+from app.main import app
+from app.models import schemas
+from app.services import inventory_service
+
+ENDPOINTS = ["/api/analytics/valor-estoque", "/api/analytics/fluxo", "/api/analytics/mais-movimentados",
+             "/api/analytics/cobertura"]
+
+
+@pytest.fixture
+def client(state):
+    return TestClient(app) # Sem o lifespan: o estado já foi carregado pela fixture
+
+
+@pytest.mark.parametrize("endpoint", ENDPOINTS)
+def test_analises_com_historico_vazio(client, endpoint):
+    response = client.get(endpoint)
+    assert response.status_code == 200, response.text
+    assert response.json()["data"] == []
+
+
+def test_analises_com_historico_so_no_diario(client, state):
+    # Snapshot vazio e as movimentações só no diário: agregados montados a partir de uma tabela vazia
+    for nome, quantidade in [("Caneta", 10), ("Lápis", 4), ("Caneta", 1)]:
+        inventory_service.add_product_entry(schemas.StockMovement(NomeProduto=nome, Quantidade=quantidade,
+                                                                  ValorUnitario=2.0, DataMovimentacao=date.today()))
+    inventory_service.remove_product_stock(schemas.StockMovement(NomeProduto="Caneta", Quantidade=3))
+    state.load() # Reinício: o histórico vem todo do diário
+
+    for endpoint in ENDPOINTS:
+        assert client.get(endpoint).status_code == 200, endpoint
+    top = client.get("/api/analytics/mais-movimentados").json()["data"]
+    assert [(item["NomeProduto"], item["Quantidade"]) for item in top] == [("Caneta", 14), ("Lápis", 4)]
+    fluxo = client.get("/api/analytics/fluxo").json()["data"]
+    assert [(p["QuantidadeEntrada"], p["QuantidadeSaida"]) for p in fluxo] == [(15, 3)]
+
+
+def test_tabela_diaria_vazia_tem_tipos_numericos():
+    table = InventoryState().daily_aggregates.table()
+    assert table.empty
+    assert str(table['Quantidade'].dtype) == "int64" and str(table['Valor'].dtype) == "float64"
@@ -0,0 +1,85 @@
+import csv
+import io
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.models import schemas
+from app.services import inventory_service
+
+
+@pytest.fixture
+def client(state):
+    return TestClient(app)
+
+
+def importar(client, body: str, tipo="movimentacoes"):
+    return client.post("/api/inventory/importacao", params={"tipo": tipo, "formato": "csv"},
+                       content=body.encode("utf-8"))
+
+
+def produto(state, nome):
+    return state.stock.loc[state.find_product(nome)]
+
+
+def test_exportacao_csv_escapa_formulas(client):
+    for nome in ["=HYPERLINK(\"http://x\")", "+5", "-desconto", "@SUM(A1)", "Caneta"]:
+        inventory_service.add_product_entry(schemas.StockMovement(NomeProduto=nome, Quantidade=1, ValorUnitario=2.0))
+
+    for url, params in [("/api/inventory/exportacao", {"conteudo": "estoque", "formato": "csv"}),
+                        ("/api/inventory/exportacao", {"conteudo": "transacoes", "formato": "csv"}),
+                        ("/api/inventory/transacoes", {"formato": "csv"})]:
+        response = client.get(url, params=params)
+        assert response.status_code == 200
+        names = [row["NomeProduto"] for row in csv.DictReader(io.StringIO(response.text))]
+        assert names == ["'=HYPERLINK(\"http://x\")", "'+5", "'-desconto", "'@SUM(A1)", "Caneta"]
+
+
+def test_importacao_desfaz_o_escape_da_exportacao(client, state):
+    inventory_service.add_product_entry(schemas.StockMovement(NomeProduto="=1+1", Quantidade=3, ValorUnitario=2.0))
+    exported = client.get("/api/inventory/exportacao", params={"conteudo": "transacoes", "formato": "csv"}).text
+
+    response = importar(client, exported)
+    assert response.status_code == 200, response.text
+    assert response.json()["data"]["Aplicadas"] == 1
+    assert int(produto(state, "=1+1")['Quantidade']) == 6
+    assert state.find_product("'=1+1") is None
+
+
+def test_importacao_csv_ptbr_com_virgula_decimal(client, state):
+    body = ("NomeProduto;TipoMovimentacao;Quantidade;ValorUnitario\n"
+            "Caneta;ENTRADA;1.000;3,5\n"
+            "Lápis;ENTRADA;2;1.234,56\n"
+            "Borracha;ENTRADA;4;2.5\n")
+    response = importar(client, body)
+
+    assert response.status_code == 200, response.text
+    assert response.json()["data"]["Rejeitadas"] == 0
+    assert (int(produto(state, "Caneta")['Quantidade']), produto(state, "Caneta")['ValorUnitario']) == (1000, 3.5)
+    assert produto(state, "Lápis")['ValorUnitario'] == 1234.56
+    assert produto(state, "Borracha")['ValorUnitario'] == 2.5
+
+
+def test_importacao_csv_com_ponto_decimal(client, state):
+    response = importar(client, "NomeProduto,TipoMovimentacao,Quantidade,ValorUnitario\nCaneta,ENTRADA,2,3.5\n")
+    assert response.status_code == 200, response.text
+    assert produto(state, "Caneta")['ValorUnitario'] == 3.5
+
+
+def test_importacao_de_arquivo_vazio(client):
+    response = importar(client, "")
+    assert response.status_code == 400
+    assert response.json()["detail"].startswith("O arquivo está vazio")
+
+
+def test_reimportar_catalogo_soma_as_quantidades_de_novo(client, state):
+    body = "NomeProduto,Quantidade,ValorUnitario\n" + "Caneta,5,2.0\nLápis,3,1.0\ncaneta,9,2.0\n" * 200 # Corpo em vários blocos
+    for _ in range(2):
+        response = importar(client, body, tipo="produtos")
+        assert response.status_code == 200, response.text
+        assert (response.json()["data"]["Aplicadas"], response.json()["data"]["Duplicadas"]) == (2, 598)
+
+    # Cada importação registra as entradas outra vez (documentado em bulk_service.import_file)
+    assert (int(produto(state, "Caneta")['Quantidade']), int(produto(state, "Lápis")['Quantidade'])) == (10, 6)
+    assert len(state.transactions) == 4
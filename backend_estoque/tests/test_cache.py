@@ -0,0 +1,97 @@
+import pandas as pd
+import pytest
+from fastapi.testclient import TestClient
+
+from app.core.config import STOCK_SHEET_NAME
+from app.core.query_cache import QueryCache, query_cache
+from app.main import app
+from app.models import schemas
+from app.services import inventory_service
+
+ESTOQUE = "/api/inventory/estoque"
+
+
+@pytest.fixture
+def client(state):
+    return TestClient(app)
+
+
+def entrada(nome, quantidade, valor=None):
+    return inventory_service.add_product_entry(
+        schemas.StockMovement(NomeProduto=nome, Quantidade=quantidade, ValorUnitario=valor))
+
+
+def test_repeticao_com_if_none_match_responde_304(client):
+    entrada("Caneta", 10, 2.5)
+    first = client.get(ESTOQUE)
+    etag = first.headers["ETag"]
+    assert first.status_code == 200 and first.json()["data"][0]["Quantidade"] == 10
+
+    repeated = client.get(ESTOQUE, headers={"If-None-Match": etag})
+    assert repeated.status_code == 304 and repeated.content == b""
+    assert repeated.headers["ETag"] == etag
+    assert client.get(ESTOQUE, headers={"If-None-Match": f'W/"outra", W/{etag}'}).status_code == 304
+    assert client.get(ESTOQUE, headers={"If-None-Match": '"outra"'}).status_code == 200
+
+
+def test_etag_depende_da_consulta_e_repeticao_vem_do_cache(client):
+    entrada("Caneta", 10, 2.5)
+    json_etag = client.get(ESTOQUE).headers["ETag"]
+    assert client.get(ESTOQUE, params={"formato": "colunar"}).headers["ETag"] != json_etag
+
+    hits = query_cache.hits
+    assert client.get(ESTOQUE).headers["ETag"] == json_etag
+    assert query_cache.hits == hits + 1
+
+
+def test_etag_muda_depois_de_uma_movimentacao(client):
+    entrada("Caneta", 10, 2.5)
+    etag = client.get(ESTOQUE).headers["ETag"]
+
+    entrada("Caneta", 1)
+
+    response = client.get(ESTOQUE, headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+    assert response.json()["data"][0]["Quantidade"] == 11
+
+
+def test_etag_muda_depois_de_edicao_externa(client, state, data_dir):
+    entrada("Caneta", 10, 2.5)
+    state.persist()
+    etag = client.get(ESTOQUE).headers["ETag"]
+
+    # Planilha editada fora do sistema: mesmo próximo ID de transação, conteúdo diferente
+    sheets = pd.read_excel(data_dir / "estoque.xlsx", sheet_name=None)
+    sheets[STOCK_SHEET_NAME].loc[0, 'Quantidade'] = 50
+    with pd.ExcelWriter(data_dir / "estoque.xlsx") as writer:
+        for name, df in sheets.items():
+            df.to_excel(writer, sheet_name=name, index=False)
+
+    response = client.get(ESTOQUE, headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+    assert response.json()["data"][0]["Quantidade"] == 50
+
+
+def test_lru_descarta_a_consulta_menos_usada():
+    cache = QueryCache(max_entries=2, max_bytes=100)
+    cache.put("v1", "a", "A", 10)
+    cache.put("v1", "b", "B", 10)
+    assert cache.get("v1", "a") == "A" # "b" passa a ser a menos usada
+    cache.put("v1", "c", "C", 10)
+
+    assert cache.get("v1", "b") is None
+    assert (cache.get("v1", "a"), cache.get("v1", "c")) == ("A", "C")
+
+
+def test_lru_respeita_o_limite_de_bytes_e_troca_de_versao():
+    cache = QueryCache(max_entries=10, max_bytes=100)
+    cache.put("v1", "a", "A", 60)
+    cache.put("v1", "b", "B", 60) # Estoura o limite: "a" sai
+    cache.put("v1", "grande", "G", 101) # Maior que o limite inteiro: nem entra
+    assert (cache.get("v1", "a"), cache.get("v1", "b"), cache.get("v1", "grande")) == (None, "B", None)
+
+    cache.put("v2", "a", "A2", 10) # Versão nova descarta as entradas da anterior
+    assert cache.get("v1", "b") is None
+    assert cache.get("v2", "a") == "A2"
@@ -0,0 +1,83 @@
+import random
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from app.core.checkpoints import StockCheckpoints
+from app.models import schemas
+from app.services import inventory_service
+
+PRODUCTS = [f"Produto {i}" for i in range(20)]
+FIRST_DAY = date(2024, 1, 1)
+
+
+def movimentos_aleatorios(rng: random.Random, count: int):
+    items = []
+    for _ in range(count):
+        kind = rng.choice(["ENTRADA", "SAIDA"])
+        items.append(schemas.BatchStockMovement(
+            NomeProduto=rng.choice(PRODUCTS), TipoMovimentacao=kind, Quantidade=rng.randint(1, 5),
+            ValorUnitario=round(rng.uniform(1, 50), 2) if kind == "ENTRADA" and rng.random() < 0.5 else None,
+            DataMovimentacao=FIRST_DAY + timedelta(days=rng.randint(1, 90))))
+    return items
+
+
+def estoque_por_forca_bruta(transactions: pd.DataFrame, day: date) -> pd.DataFrame:
+    # Reaplica o histórico inteiro até o fim de `day`, transação a transação, em ordem de data
+    rows = (transactions[transactions['DataHora'] <= pd.Timestamp(day)]
+            .sort_values(['DataHora', 'ID_Transacao'], kind='stable'))
+    signed = np.where(rows['TipoMovimentacao'].astype(str) == "ENTRADA", rows['Quantidade'], -rows['Quantidade'])
+    return pd.DataFrame({
+        "Quantidade": pd.Series(signed, index=rows.index).groupby(rows['ID_Produto'].to_numpy()).sum(),
+        "ValorUnitario": (rows['ValorTotalMovimentacao'] / rows['Quantidade']).groupby(rows['ID_Produto'].to_numpy()).last(),
+    })
+
+
+def conferir(state, days):
+    transactions = state.transactions
+    for day in days:
+        result = state.stock_as_of(day).set_index('ID_Produto')
+        expected = estoque_por_forca_bruta(transactions, day)
+        assert sorted(result.index) == sorted(expected.index), day
+        result = result.loc[expected.index]
+        assert result['Quantidade'].tolist() == expected['Quantidade'].tolist(), day
+        assert np.allclose(result['ValorUnitario'], expected['ValorUnitario']), day
+
+
+@pytest.mark.parametrize("full_every,interval_days", [(1, 1), (4, 1), (4, 3)])
+def test_estoque_em_data_passada_confere_com_a_reaplicacao_completa(state, monkeypatch, full_every, interval_days):
+    monkeypatch.setattr(state, "checkpoints", StockCheckpoints(interval_days=interval_days, full_every=full_every))
+    rng = random.Random(full_every * 10 + interval_days)
+    inventory_service.apply_movement_batch([
+        schemas.BatchStockMovement(NomeProduto=name, TipoMovimentacao="ENTRADA", Quantidade=1000,
+                                   ValorUnitario=10.0, DataMovimentacao=FIRST_DAY) for name in PRODUCTS])
+    inventory_service.apply_movement_batch(movimentos_aleatorios(rng, 400))
+
+    days = [FIRST_DAY - timedelta(days=1)] + [FIRST_DAY + timedelta(days=rng.randint(0, 95)) for _ in range(12)]
+    conferir(state, days)
+    assert state.checkpoints.checkpoint_count > 0
+
+    # Movimentações retroativas descartam os checkpoints a partir do seu dia
+    inventory_service.apply_movement_batch(movimentos_aleatorios(rng, 100))
+    conferir(state, days)
+
+
+def test_checkpoints_esparsos_guardam_so_os_produtos_alterados(state, monkeypatch):
+    checkpoints = StockCheckpoints(interval_days=1, full_every=10)
+    monkeypatch.setattr(state, "checkpoints", checkpoints)
+    inventory_service.apply_movement_batch([
+        schemas.BatchStockMovement(NomeProduto=name, TipoMovimentacao="ENTRADA", Quantidade=10,
+                                   ValorUnitario=1.0, DataMovimentacao=FIRST_DAY) for name in PRODUCTS])
+    # Um produto movimentado por dia durante 20 dias
+    inventory_service.apply_movement_batch([
+        schemas.BatchStockMovement(NomeProduto=PRODUCTS[i], TipoMovimentacao="SAIDA", Quantidade=1,
+                                   DataMovimentacao=FIRST_DAY + timedelta(days=i + 1)) for i in range(20)])
+
+    state.stock_as_of(FIRST_DAY + timedelta(days=30))
+
+    sizes = [len(snapshot) for snapshot in checkpoints._snapshots]
+    assert len(sizes) == 21
+    assert sizes[0] == sizes[10] == sizes[20] == len(PRODUCTS) # Completos
+    assert all(size == 1 for i, size in enumerate(sizes) if i % 10) # Esparsos
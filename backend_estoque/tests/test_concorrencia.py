@@ -0,0 +1,190 @@
+import os
+import subprocess
+import sys
+import threading
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+from app.core.config import STOCK_SHEET_NAME, TRANSACTIONS_SHEET_NAME
+from app.core.inventory_state import InventoryState
+from app.core.sqlite_handler import SQLiteStorage
+from app.models import schemas
+from app.services import inventory_service
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+# Outro worker: processo separado, com o próprio estado em memória, sobre os mesmos arquivos
+WORKER = """
+import sys
+from app.core.inventory_state import inventory_state
+from app.models import schemas
+from app.services import inventory_service
+
+inventory_state.load()
+for _ in range(int(sys.argv[1])):
+    inventory_service.add_product_entry(schemas.StockMovement(NomeProduto="Compartilhado", Quantidade=1, ValorUnitario=1.0))
+"""
+
+
+def iniciar_workers(data_dir, count, movements, storage="excel"):
+    env = dict(os.environ, ESTOQUE_DATA_DIR=str(data_dir), ESTOQUE_STORAGE=storage)
+    return [subprocess.Popen([sys.executable, "-c", WORKER, str(movements)], cwd=BACKEND_DIR, env=env,
+                             stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+            for _ in range(count)]
+
+
+def aguardar(workers):
+    for worker in workers:
+        _, stderr = worker.communicate(timeout=120)
+        assert worker.returncode == 0, stderr.decode()
+
+
+def verificar(state: InventoryState, expected: int):
+    idx = state.find_product("Compartilhado")
+    assert int(state.stock.at[idx, 'Quantidade']) == expected
+    ids = state.transactions['ID_Transacao'].tolist()
+    assert ids == list(range(1, expected + 1)) # Nenhum ID repetido nem perdido
+
+
+def entradas_em_threads(threads, movements):
+    errors = []
+
+    def run():
+        try:
+            for _ in range(movements):
+                inventory_service.add_product_entry(
+                    schemas.StockMovement(NomeProduto="Compartilhado", Quantidade=1, ValorUnitario=1.0))
+        except Exception as e:
+            errors.append(e)
+
+    pool = [threading.Thread(target=run) for _ in range(threads)]
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    assert errors == []
+
+
+def test_escritas_concorrentes_de_varias_threads(state):
+    entradas_em_threads(threads=8, movements=25)
+
+    verificar(state, 200)
+    restarted = InventoryState()
+    restarted.load()
+    verificar(restarted, 200)
+
+
+def test_escritas_concorrentes_de_varios_processos(state, data_dir):
+    workers = iniciar_workers(data_dir, count=3, movements=20)
+    entradas_em_threads(threads=2, movements=20) # Este processo grava ao mesmo tempo
+    aguardar(workers)
+
+    state.refresh() # Incorpora o que os outros processos gravaram no diário
+    verificar(state, 100)
+
+    state.persist()
+    restarted = InventoryState()
+    restarted.load()
+    verificar(restarted, 100)
+
+
+@pytest.mark.parametrize("compactar", [False, True])
+def test_sincroniza_com_compactacao_de_outro_processo(state, data_dir, compactar):
+    entradas_em_threads(threads=1, movements=5)
+    aguardar(iniciar_workers(data_dir, count=1, movements=5))
+    if compactar:
+        other = InventoryState()
+        other.load()
+        other.persist() # Outro processo substitui o snapshot e descarta o diário
+
+    state.refresh()
+    verificar(state, 10)
+    entradas_em_threads(threads=1, movements=1)
+    verificar(state, 11)
+
+
+def test_compactacao_de_outro_processo_nao_recarrega_o_snapshot(state, data_dir, monkeypatch):
+    entradas_em_threads(threads=1, movements=5)
+    aguardar(iniciar_workers(data_dir, count=1, movements=5))
+    state.refresh()
+    loads = []
+    monkeypatch.setattr(state, "load", lambda: loads.append(1))
+
+    other = InventoryState()
+    other.load()
+    other.journal.rotate() # Sincronização no meio da compactação: diário rotacionado, snapshot antigo
+    state.refresh()
+    other.persist() # Junta o diário novo (vazio) ao rotacionado, grava o snapshot e descarta
+    aguardar(iniciar_workers(data_dir, count=1, movements=3)) # Gravações depois da compactação
+
+    state.refresh()
+    assert loads == []
+    verificar(state, 13)
+    entradas_em_threads(threads=1, movements=1)
+    verificar(state, 14)
+    assert loads == []
+
+
+def test_edicao_externa_do_snapshot_recarrega(state, data_dir, monkeypatch):
+    entradas_em_threads(threads=1, movements=3)
+    other = InventoryState()
+    other.load()
+    other.persist()
+    state.refresh()
+
+    # Alguém edita a planilha fora do sistema (sem marcador de compactação para o token novo)
+    sheets = pd.read_excel(data_dir / "estoque.xlsx", sheet_name=None)
+    sheets[STOCK_SHEET_NAME].loc[0, 'Quantidade'] = 50
+    with pd.ExcelWriter(data_dir / "estoque.xlsx") as writer:
+        for name, df in sheets.items():
+            df.to_excel(writer, sheet_name=name, index=False)
+
+    state.refresh()
+    assert int(state.stock.at[state.find_product("Compartilhado"), 'Quantidade']) == 50
+
+
+def estado_sqlite(data_dir) -> InventoryState:
+    return InventoryState(journal_path=data_dir / "estoque.journal.ndjson", storage=SQLiteStorage(data_dir / "estoque.db"),
+                          lock_path=data_dir / "estoque.lock", compaction_lock_path=data_dir / "estoque.compactacao.lock")
+
+
+def test_escritas_concorrentes_de_varios_processos_sqlite(data_dir, monkeypatch):
+    state = estado_sqlite(data_dir)
+    state.load()
+    aguardar(iniciar_workers(data_dir, count=3, movements=20, storage="sqlite"))
+
+    loads = []
+    monkeypatch.setattr(state, "load", lambda: loads.append(1))
+    state.refresh() # Só as transações novas e os produtos afetados, sem recarregar as tabelas
+    assert loads == []
+    verificar(state, 60)
+    assert state.data_version().endswith(".61")
+
+    monkeypatch.undo()
+    restarted = estado_sqlite(data_dir)
+    restarted.load()
+    verificar(restarted, 60)
+
+
+def test_substituicao_das_tabelas_sqlite_recarrega_tudo(data_dir, monkeypatch):
+    aguardar(iniciar_workers(data_dir, count=1, movements=5, storage="sqlite"))
+    state = estado_sqlite(data_dir)
+    state.load()
+
+    # Outro processo substitui as tabelas (p.ex. migração do Excel) com mais transações
+    other = estado_sqlite(data_dir)
+    other.load()
+    other.stock.loc[:, 'Quantidade'] = 50
+    sheets = {STOCK_SHEET_NAME: other.stock,
+              TRANSACTIONS_SHEET_NAME: pd.concat([other.transactions, other.transactions.tail(1).assign(ID_Transacao=6)])}
+    other.storage.write_sheets(sheets)
+
+    load = state.load
+    loads = []
+    monkeypatch.setattr(state, "load", lambda: (loads.append(1), load()))
+    state.refresh()
+    assert loads == [1]
+    assert int(state.stock.at[state.find_product("Compartilhado"), 'Quantidade']) == 50
+    assert state.transactions['ID_Transacao'].tolist() == [1, 2, 3, 4, 5, 6]
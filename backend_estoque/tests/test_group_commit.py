@@ -0,0 +1,118 @@
+import threading
+from functools import partial
+
+import pytest
+
+from app.core.group_commit import GroupCommitWriter, _PendingMovement
+from app.core.inventory_state import InventoryState
+from app.models import schemas
+from app.services import inventory_service
+
+
+def entrada(nome, quantidade, valor=1.0):
+    return partial(inventory_service._apply_entry,
+                   schemas.StockMovement(NomeProduto=nome, Quantidade=quantidade, ValorUnitario=valor))
+
+
+def saida(nome, quantidade):
+    return partial(inventory_service._apply_exit, schemas.StockMovement(NomeProduto=nome, Quantidade=quantidade))
+
+
+def gravar_grupo(state, *applies):
+    group = [_PendingMovement(apply) for apply in applies]
+    GroupCommitWriter(state)._commit_group(group)
+    assert all(pending.done for pending in group)
+    return group
+
+
+def quantidades(state: InventoryState):
+    return dict(zip(state.stock['NomeProduto'], state.stock['Quantidade']))
+
+
+def recarregado():
+    restarted = InventoryState()
+    restarted.load()
+    return restarted
+
+
+def test_regra_de_negocio_falha_so_o_proprio_pedido(state):
+    group = gravar_grupo(state, entrada("A", 5), saida("Inexistente", 1), entrada("A", 2))
+
+    assert isinstance(group[1].error, ValueError)
+    assert group[0].error is None and group[2].error is None
+    assert quantidades(state) == {"A": 7}
+    assert quantidades(recarregado()) == {"A": 7}
+    assert state.transactions['ID_Transacao'].tolist() == [1, 2]
+
+
+def test_falha_inesperada_descarta_a_alteracao_parcial(state):
+    def quebra_no_meio():
+        idx = state.find_product("A")
+        state.stock.at[idx, 'Quantidade'] += 100 # Alterou a memória e não chegou a retornar
+        raise RuntimeError("falha inesperada")
+
+    gravar_grupo(state, entrada("A", 5))
+    group = gravar_grupo(state, entrada("A", 1), quebra_no_meio, entrada("B", 3))
+
+    assert isinstance(group[1].error, RuntimeError)
+    assert group[0].error is None and group[2].error is None
+    # O estado é recarregado do disco: os outros pedidos do grupo ficam, os +100 não
+    assert quantidades(state) == {"A": 6, "B": 3}
+    assert quantidades(recarregado()) == {"A": 6, "B": 3}
+
+
+def test_falha_na_gravacao_falha_o_grupo_inteiro(state, monkeypatch):
+    gravar_grupo(state, entrada("A", 5))
+
+    def disco_cheio(entries):
+        raise OSError("No space left on device")
+
+    monkeypatch.setattr(state.journal, "append", disco_cheio)
+    group = gravar_grupo(state, entrada("A", 1), entrada("B", 3))
+    monkeypatch.undo()
+
+    assert all(isinstance(pending.error, OSError) and pending.result is None for pending in group)
+    assert quantidades(state) == {"A": 5} # Nada do grupo ficou na memória
+    assert state.transactions['ID_Transacao'].tolist() == [1]
+    gravar_grupo(state, entrada("A", 1))
+    assert state.transactions['ID_Transacao'].tolist() == [1, 2] # IDs do grupo perdido não foram consumidos
+
+
+def test_pedidos_concorrentes_sao_gravados_em_grupo(state, monkeypatch):
+    writer = GroupCommitWriter(state, window_ms=50)
+    flushes = []
+    record = state.record_movements
+    monkeypatch.setattr(state, "record_movements", lambda movements: (flushes.append(len(movements)), record(movements)))
+
+    results, errors = [], []
+
+    def submit(apply):
+        try:
+            results.append(writer.submit(apply))
+        except ValueError as e:
+            errors.append(e)
+
+    applies = [entrada("A", 1) for _ in range(12)] + [saida("Inexistente", 1)]
+    threads = [threading.Thread(target=submit, args=(apply,)) for apply in applies]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert len(results) == 12 and len(errors) == 1
+    assert sum(flushes) == 12 and len(flushes) < 12 # Menos fsyncs que movimentações
+    assert quantidades(recarregado()) == {"A": 12}
+
+
+def test_lider_repassa_erro_de_trava_para_o_grupo(state, monkeypatch):
+    def trava_indisponivel():
+        raise OSError("trava indisponível")
+
+    monkeypatch.setattr(state, "write_lock", trava_indisponivel)
+    writer = GroupCommitWriter(state)
+    with pytest.raises(OSError):
+        writer.submit(entrada("A", 1))
+    monkeypatch.undo()
+    # O líder liberou a fila: o próximo pedido é atendido normalmente
+    assert writer.submit(entrada("A", 1)) is not None
+    assert quantidades(state) == {"A": 1}
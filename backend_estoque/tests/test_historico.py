@@ -0,0 +1,145 @@
+import csv
+import io
+import json
+from datetime import date
+
+import pandas as pd
+import pytest
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.models import schemas
+from app.services import inventory_service
+
+TRANSACOES = "/api/inventory/transacoes"
+
+
+@pytest.fixture
+def client(state, monkeypatch):
+    monkeypatch.setattr(inventory_service, "HISTORY_CHUNK_ROWS", 7) # Vários blocos mesmo com histórico pequeno
+    return TestClient(app)
+
+
+@pytest.fixture
+def historico(state):
+    """60 movimentações de 3 produtos entre janeiro e abril de 2024, entradas e saídas."""
+    movements = []
+    for i in range(60):
+        nome = ["Caneta", "Lápis", "Borracha"][i % 3]
+        tipo = "SAIDA" if i % 4 == 3 else "ENTRADA"
+        movements.append(schemas.BatchStockMovement(
+            NomeProduto=nome, TipoMovimentacao=tipo, Quantidade=1 if tipo == "SAIDA" else 5, ValorUnitario=2.0,
+            DataMovimentacao=date(2024, 1 + i // 15, 1 + (i * 2) % 28)))
+    inventory_service.apply_movement_batch(movements)
+    return state.transactions.copy()
+
+
+def esperado(df, data_inicio=None, data_fim=None, produto=None, tipo=None):
+    mask = pd.Series(True, index=df.index)
+    if data_inicio:
+        mask &= df['DataHora'] >= pd.Timestamp(data_inicio)
+    if data_fim:
+        mask &= df['DataHora'] <= pd.Timestamp(data_fim)
+    if produto:
+        mask &= df['NomeProduto'] == produto
+    if tipo:
+        mask &= df['TipoMovimentacao'] == tipo
+    return df.loc[mask, 'ID_Transacao'].tolist()
+
+
+def paginar(client, **params):
+    ids, cursor, pages = [], None, 0
+    while True:
+        query = dict(params, **({"cursor": cursor} if cursor is not None else {}))
+        body = client.get(TRANSACOES, params=query).json()
+        ids += [t["ID_Transacao"] for t in body["data"]]
+        pages += 1
+        cursor = body["next_cursor"]
+        if cursor is None:
+            return ids, pages
+
+
+FILTROS = [
+    {},
+    {"data_inicio": "2024-02-01"},
+    {"data_fim": "2024-02-15"},
+    {"data_inicio": "2024-02-10", "data_fim": "2024-03-20"},
+    {"produto": "Lápis"},
+    {"tipo": "SAIDA"},
+    {"produto": "Caneta", "tipo": "ENTRADA"},
+    {"data_inicio": "2024-01-15", "data_fim": "2024-04-30", "produto": "Borracha", "tipo": "SAIDA"},
+    {"data_inicio": "2025-01-01"},
+]
+
+
+@pytest.mark.parametrize("filtros", FILTROS)
+def test_filtros_combinados(client, historico, filtros):
+    body = client.get(TRANSACOES, params=filtros).json()
+    assert [t["ID_Transacao"] for t in body["data"]] == esperado(historico, **filtros)
+    assert body["next_cursor"] is None # Sem limite: tudo numa página
+
+
+def test_filtro_por_id_do_produto_e_produto_inexistente(client, state, historico):
+    product_id = int(state.stock.at[state.find_product("Lápis"), 'ID_Produto'])
+    by_id = client.get(TRANSACOES, params={"produto": product_id}).json()["data"]
+    assert [t["ID_Transacao"] for t in by_id] == esperado(historico, produto="Lápis")
+    assert client.get(TRANSACOES, params={"produto": "Inexistente"}).json()["data"] == []
+
+
+@pytest.mark.parametrize("filtros", FILTROS)
+@pytest.mark.parametrize("limite", [1, 6, 7, 25])
+def test_paginacao_por_cursor_sem_repeticoes_nem_lacunas(client, historico, filtros, limite):
+    expected = esperado(historico, **filtros)
+    ids, pages = paginar(client, limite=limite, **filtros)
+    assert ids == expected
+    assert pages == max(1, -(-len(expected) // limite))
+
+
+def test_limite_com_cursor(client, historico):
+    all_ids = historico['ID_Transacao'].tolist()
+    body = client.get(TRANSACOES, params={"limite": 5, "cursor": 10}).json()
+    assert [t["ID_Transacao"] for t in body["data"]] == all_ids[10:15]
+    assert body["next_cursor"] == 15
+
+    last = client.get(TRANSACOES, params={"limite": 5, "cursor": 55}).json()
+    assert [t["ID_Transacao"] for t in last["data"]] == all_ids[55:]
+    assert last["next_cursor"] is None # Página exata: não há próxima
+    assert client.get(TRANSACOES, params={"cursor": 60}).json()["data"] == []
+    assert client.get(TRANSACOES, params={"limite": 0}).status_code == 422
+
+
+def test_paginacao_continua_com_gravacoes_entre_as_paginas(client, historico):
+    first = client.get(TRANSACOES, params={"limite": 15, "produto": "Caneta"}).json()
+    inventory_service.add_product_entry(schemas.StockMovement(NomeProduto="Caneta", Quantidade=1))
+    inventory_service.add_product_entry(schemas.StockMovement(NomeProduto="Lápis", Quantidade=1))
+
+    ids = [t["ID_Transacao"] for t in first["data"]]
+    ids += paginar(client, limite=15, produto="Caneta", cursor=first["next_cursor"])[0]
+    assert ids == esperado(historico, produto="Caneta") + [61] # A gravação nova aparece no fim, uma vez
+
+
+@pytest.mark.parametrize("filtros", [{}, {"data_inicio": "2024-02-10", "tipo": "ENTRADA"}, {"produto": "Borracha"}])
+def test_streaming_ndjson_e_csv_iguais_ao_json(client, historico, filtros):
+    expected = client.get(TRANSACOES, params=filtros).json()["data"]
+
+    response = client.get(TRANSACOES, params=dict(filtros, formato="ndjson"))
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    assert [json.loads(line) for line in response.text.splitlines()] == expected
+
+    response = client.get(TRANSACOES, params=dict(filtros, formato="csv"))
+    assert response.headers["content-type"].startswith("text/csv")
+    rows = list(csv.DictReader(io.StringIO(response.text)))
+    assert [{k: str(v) for k, v in t.items()} for t in expected] == rows
+
+
+def test_streaming_com_limite_e_cursor(client, historico):
+    all_ids = historico['ID_Transacao'].tolist()
+    for formato in ["ndjson", "csv"]:
+        text = client.get(TRANSACOES, params={"formato": formato, "limite": 9, "cursor": 3}).text
+        lines = text.splitlines()[1:] if formato == "csv" else text.splitlines()
+        assert len(lines) == 9
+        first = json.loads(lines[0])["ID_Transacao"] if formato == "ndjson" else int(lines[0].split(",")[0])
+        assert first == all_ids[3]
+
+    empty = client.get(TRANSACOES, params={"formato": "csv", "data_inicio": "2025-01-01"}).text
+    assert empty.splitlines() == [",".join(historico.columns)] # Só o cabeçalho
@@ -0,0 +1,117 @@
+import pandas as pd
+
+from app.core.config import STOCK_SHEET_NAME, TRANSACTIONS_SHEET_NAME
+from app.core.inventory_state import InventoryState
+from app.models import schemas
+from app.services import inventory_service
+
+
+def entrada(nome, quantidade, valor=None):
+    return inventory_service.add_product_entry(
+        schemas.StockMovement(NomeProduto=nome, Quantidade=quantidade, ValorUnitario=valor))
+
+
+def saida(nome, quantidade):
+    return inventory_service.remove_product_stock(schemas.StockMovement(NomeProduto=nome, Quantidade=quantidade))
+
+
+def estado_reiniciado() -> InventoryState:
+    """Outra instância sobre os mesmos arquivos: o que um processo novo veria após uma queda."""
+    restarted = InventoryState()
+    restarted.load()
+    return restarted
+
+
+def quantidades(state: InventoryState):
+    return dict(zip(state.stock['NomeProduto'], state.stock['Quantidade']))
+
+
+def ler_planilhas(data_dir):
+    return pd.read_excel(data_dir / "estoque.xlsx", sheet_name=None)
+
+
+def test_movimentacoes_sobrevivem_a_queda_antes_da_compactacao(state, data_dir):
+    entrada("Caneta", 10, 2.5)
+    entrada("Lápis", 4, 1.0)
+    saida("caneta", 3)
+
+    assert state.journal.path.read_text(encoding="utf-8").count("\n") == 3
+    assert ler_planilhas(data_dir)[TRANSACTIONS_SHEET_NAME].empty # Nada foi para o Excel ainda
+
+    restarted = estado_reiniciado()
+    assert quantidades(restarted) == {"Caneta": 7, "Lápis": 4}
+    assert restarted.transactions['ID_Transacao'].tolist() == [1, 2, 3]
+    assert restarted.data_version().endswith(".4")
+
+
+def test_linha_incompleta_no_fim_do_diario_e_descartada(state):
+    entrada("Caneta", 10, 2.5)
+    with open(state.journal.path, "ab") as f:
+        f.write(b'{"transacao": {"ID_Transacao": 2, "DataHo') # Append interrompido pela queda
+
+    assert quantidades(estado_reiniciado()) == {"Caneta": 10}
+
+    # O próximo append remove a linha incompleta antes de gravar
+    entrada("Caneta", 5)
+    lines = state.journal.path.read_text(encoding="utf-8").splitlines()
+    assert len(lines) == 2 and all(line.endswith("}") for line in lines)
+    restarted = estado_reiniciado()
+    assert quantidades(restarted) == {"Caneta": 15}
+    assert restarted.transactions['ID_Transacao'].tolist() == [1, 2]
+
+
+def test_compactacao_grava_o_snapshot_e_descarta_o_diario(state, data_dir):
+    entrada("Caneta", 10, 2.5)
+    saida("Caneta", 4)
+
+    state.persist()
+
+    assert not state.journal.path.exists() and not state.journal.compacting_path.exists()
+    sheets = ler_planilhas(data_dir)
+    assert sheets[STOCK_SHEET_NAME]['Quantidade'].tolist() == [6]
+    assert sheets[TRANSACTIONS_SHEET_NAME]['ID_Transacao'].tolist() == [1, 2]
+    # A compactação do próprio processo não provoca recarga e as gravações seguintes continuam no diário
+    entrada("Caneta", 1)
+    assert state.journal.entry_count == 1
+    assert quantidades(estado_reiniciado()) == {"Caneta": 7}
+
+
+def test_compactacao_interrompida_antes_do_snapshot(state):
+    entrada("Caneta", 10, 2.5)
+    assert state.journal.rotate() is not None # Queda logo após rotacionar o diário
+    entrada("Caneta", 2)
+
+    restarted = estado_reiniciado()
+    assert quantidades(restarted) == {"Caneta": 12}
+    assert restarted.transactions['ID_Transacao'].tolist() == [1, 2]
+
+    # A próxima compactação junta o diário pendente ao atual
+    restarted.persist()
+    assert not restarted.journal.compacting_path.exists()
+    assert quantidades(estado_reiniciado()) == {"Caneta": 12}
+
+
+def test_compactacao_interrompida_depois_do_snapshot_nao_duplica(state):
+    entrada("Caneta", 10, 2.5)
+    saida("Caneta", 1)
+    # Queda depois de gravar o snapshot e antes de descartar o diário rotacionado
+    state.journal.rotate()
+    state.storage.write_sheets({STOCK_SHEET_NAME: state.stock.copy(),
+                                TRANSACTIONS_SHEET_NAME: state.transactions.copy()})
+
+    restarted = estado_reiniciado()
+    assert quantidades(restarted) == {"Caneta": 9}
+    assert restarted.transactions['ID_Transacao'].tolist() == [1, 2]
+
+
+def test_compactacao_sem_diario_pendente_nao_copia_nem_grava(state, monkeypatch):
+    entrada("Caneta", 10, 2.5)
+    state.persist()
+
+    def falha(*args, **kwargs):
+        raise AssertionError("snapshot gravado sem entradas pendentes")
+
+    monkeypatch.setattr(state.storage, "write_sheets", falha)
+    monkeypatch.setattr(state.stock, "copy", falha)
+    state.persist()
+    assert quantidades(state) == {"Caneta": 10}
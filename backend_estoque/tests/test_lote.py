@@ -0,0 +1,67 @@
+from datetime import date
+
+import pytest
+
+from app.models import schemas
+from app.services import inventory_service
+
+
+def lote(*items):
+    return [schemas.BatchStockMovement(NomeProduto=nome, TipoMovimentacao=tipo, Quantidade=quantidade,
+                                       ValorUnitario=valor, DataMovimentacao=date(2024, 5, 1))
+            for nome, tipo, quantidade, valor in items]
+
+
+def quantidades(state):
+    return dict(zip(state.stock['NomeProduto'], state.stock['Quantidade']))
+
+
+def test_lote_com_produtos_novos_e_existentes(state):
+    results = inventory_service.apply_movement_batch(lote(("Caneta", "ENTRADA", 10, 2.0),
+                                                          ("caneta", "SAIDA", 3, None),
+                                                          ("Lápis", "ENTRADA", 5, 1.5)))
+
+    assert [r.Produto.Quantidade for r in results] == [10, 7, 5]
+    assert [r.Transacao.ID_Transacao for r in results] == [1, 2, 3]
+    assert quantidades(state) == {"Caneta": 7, "Lápis": 5}
+
+
+def test_lote_so_com_produtos_existentes(state):
+    inventory_service.apply_movement_batch(lote(("Caneta", "ENTRADA", 10, 2.0)))
+
+    results = inventory_service.apply_movement_batch(lote(("Caneta", "SAIDA", 4, None),
+                                                          ("CANETA", "ENTRADA", 1, None)))
+
+    assert all(r.Sucesso for r in results)
+    assert [r.Produto.NomeProduto for r in results] == ["Caneta", "Caneta"]
+    assert quantidades(state) == {"Caneta": 7}
+
+
+@pytest.mark.parametrize("valor", [0.0, -2.0])
+def test_lote_com_valor_unitario_invalido_nao_grava_nada(state, valor):
+    inventory_service.apply_movement_batch(lote(("Caneta", "ENTRADA", 10, 2.0)))
+    journal_before = state.journal.path.read_bytes()
+
+    with pytest.raises(inventory_service.BatchRejectedError) as rejected:
+        inventory_service.apply_movement_batch(lote(("Caneta", "SAIDA", 1, None),
+                                                    ("Caneta", "ENTRADA", 1, valor),
+                                                    ("Borracha", "ENTRADA", 1, valor)))
+
+    errors = {r.Indice: r.Erro for r in rejected.value.results if not r.Sucesso}
+    assert errors == {1: "ValorUnitario deve ser um número maior que zero.",
+                      2: "ValorUnitario deve ser um número maior que zero."}
+    assert state.journal.path.read_bytes() == journal_before
+    assert quantidades(state) == {"Caneta": 10}
+    assert state.transactions['ID_Transacao'].tolist() == [1]
+
+
+def test_lote_rejeitado_relata_cada_item_invalido(state):
+    with pytest.raises(inventory_service.BatchRejectedError) as rejected:
+        inventory_service.apply_movement_batch(lote(("Caneta", "ENTRADA", 10, 2.0),
+                                                    ("Caneta", "SAIDA", 11, None),
+                                                    ("Inexistente", "SAIDA", 1, None),
+                                                    ("Novo", "ENTRADA", 1, None)))
+
+    failed = [r.Indice for r in rejected.value.results if not r.Sucesso]
+    assert failed == [1, 2, 3]
+    assert state.stock.empty
@@ -0,0 +1,90 @@
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+from app.core.inventory_state import InventoryState
+from app.models import schemas
+from app.services import inventory_service
+
+TIPOS = {"ID_Transacao": np.dtype(np.int64), "ID_Produto": np.dtype(np.int32), "Quantidade": np.dtype(np.int32),
+         "ValorTotalMovimentacao": np.dtype(np.float64)}
+
+
+def lote(nomes, quantidade=1, tipo="ENTRADA"):
+    return inventory_service.apply_movement_batch([
+        schemas.BatchStockMovement(NomeProduto=nome, TipoMovimentacao=tipo, Quantidade=quantidade, ValorUnitario=1.5,
+                                   DataMovimentacao=date(2024, 5, 1))
+        for nome in nomes])
+
+
+def verificar_tipos(df: pd.DataFrame):
+    for col, dtype in TIPOS.items():
+        assert df[col].dtype == dtype, col
+    assert df['DataHora'].dtype == np.dtype('datetime64[ns]')
+    for col in ['NomeProduto', 'TipoMovimentacao']:
+        assert isinstance(df[col].dtype, pd.CategoricalDtype), col
+        assert df[col].cat.categories.is_unique
+        assert set(df[col].cat.categories) == set(df[col]) # Sem categorias órfãs nem duplicadas
+
+
+def test_historico_continua_compacto_depois_de_varios_acrescimos(state):
+    names = [f"Produto {i}" for i in range(50)]
+    for round_ in range(20):
+        lote(names[:10 + 2 * round_]) # Cada lote traz nomes novos, que ampliam as categorias
+        inventory_service.add_product_entry(schemas.StockMovement(NomeProduto=names[0], Quantidade=2))
+        df = state.transactions
+        verificar_tipos(df)
+    inventory_service.remove_product_stock(schemas.StockMovement(NomeProduto=names[1], Quantidade=1))
+
+    df = state.transactions
+    verificar_tipos(df)
+    assert len(df) == sum(10 + 2 * r for r in range(20)) + 21
+    assert df['NomeProduto'].cat.categories.size == 48
+    assert list(df['TipoMovimentacao'].cat.categories) == ["ENTRADA", "SAIDA"]
+    # Os mesmos dados em objetos Python (como antes) ocupam bem mais
+    as_objects = df.astype({'NomeProduto': object, 'TipoMovimentacao': object, 'ID_Produto': np.int64,
+                            'Quantidade': np.int64})
+    assert df.memory_usage(deep=True).sum() * 3 < as_objects.memory_usage(deep=True).sum()
+
+
+def test_tipos_iguais_depois_de_compactar_e_recarregar(state):
+    lote(["Caneta", "Lápis"])
+    lote(["Caneta"], tipo="SAIDA")
+    before = state.transactions.copy()
+
+    state.persist()
+    restarted = InventoryState()
+    restarted.load()
+
+    verificar_tipos(restarted.transactions)
+    pd.testing.assert_frame_equal(restarted.transactions, before, check_categorical=False)
+    assert restarted.stock.dtypes.to_dict() == state.stock.dtypes.to_dict()
+
+
+def test_quantidade_fora_do_int32_vira_int64_sem_perda(state):
+    lote(["Caneta"])
+    lote(["Caneta"], quantidade=3_000_000_000)
+
+    df = state.transactions
+    assert df['Quantidade'].dtype == np.int64
+    assert df['Quantidade'].tolist() == [1, 3_000_000_000]
+    assert int(state.stock.at[state.find_product("Caneta"), 'Quantidade']) == 3_000_000_001
+
+
+def test_tipos_do_historico_lido_do_sqlite(data_dir):
+    from app.core.sqlite_handler import SQLiteStorage
+    state = InventoryState(journal_path=data_dir / "estoque.journal.ndjson", storage=SQLiteStorage(data_dir / "estoque.db"),
+                           lock_path=data_dir / "estoque.lock", compaction_lock_path=data_dir / "estoque.compactacao.lock")
+    state.load()
+    state.record_movements([{"transacao": {"ID_Transacao": 1, "DataHora": date(2024, 5, 1), "ID_Produto": 1,
+                                           "NomeProduto": "Caneta", "TipoMovimentacao": "ENTRADA", "Quantidade": 2,
+                                           "ValorTotalMovimentacao": 3.0},
+                             "estoque": {"ID_Produto": 1, "NomeProduto": "Caneta", "ValorUnitario": 1.5, "Quantidade": 2,
+                                         "DataUltimaAtualizacao": date(2024, 5, 1), "ValorTotal": 3.0}}])
+    restarted = InventoryState(journal_path=state.journal.path, storage=SQLiteStorage(data_dir / "estoque.db"),
+                               lock_path=data_dir / "estoque.lock", compaction_lock_path=data_dir / "estoque.compactacao.lock")
+    restarted.load()
+
+    verificar_tipos(restarted.transactions)
+    pd.testing.assert_frame_equal(restarted.transactions, state.transactions, check_categorical=False)
@@ -0,0 +1,88 @@
+import re
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.core import metrics
+from app.main import app
+
+SAMPLE = re.compile(r'^([a-z_]+)(\{.*\})? (\S+)$')
+
+
+@pytest.fixture
+def client(state):
+    return TestClient(app)
+
+
+def amostras(client) -> dict:
+    """{(nome, rótulos): valor} lidas do /metrics, validando cada linha do formato texto."""
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    samples = {}
+    for line in response.text.splitlines():
+        if line.startswith("#"):
+            assert re.match(r"^# (HELP|TYPE) [a-z_]+ ", line), line
+            continue
+        match = SAMPLE.match(line)
+        assert match, line
+        samples[(match[1], match[2] or "")] = float(match[3])
+    return samples
+
+
+def requisicoes(samples, metodo, rota, status):
+    return samples.get(("estoque_http_requisicoes_total", f'{{metodo="{metodo}",rota="{rota}",status="{status}"}}'), 0)
+
+
+def test_contadores_por_rota_usam_o_modelo_da_rota(client):
+    before = amostras(client)
+    for _ in range(3):
+        client.get("/api/inventory/estoque", params={"formato": "colunar"}) # Parâmetros não entram no rótulo
+    client.post("/api/inventory/saida", json={"NomeProduto": "Inexistente", "Quantidade": 1})
+    client.get("/nao/existe")
+    after = amostras(client)
+
+    def delta(*labels):
+        return requisicoes(after, *labels) - requisicoes(before, *labels)
+
+    assert delta("GET", "/api/inventory/estoque", 200) == 3
+    assert delta("POST", "/api/inventory/saida", 400) == 1
+    assert delta("GET", "nao_mapeada", 404) == 1
+    assert not any('rota="/nao/existe"' in labels for _, labels in after) # URLs livres não viram séries novas
+    count = ("estoque_http_duracao_segundos_count", '{metodo="GET",rota="/api/inventory/estoque"}')
+    assert after[count] - before.get(count, 0) == 3
+
+
+def test_operacoes_etapas_erros_e_cache(client):
+    before = amostras(client)
+    client.post("/api/inventory/entrada", json={"NomeProduto": "Caneta", "Quantidade": 2, "ValorUnitario": 1.5})
+    client.post("/api/inventory/saida", json={"NomeProduto": "Caneta", "Quantidade": 5}) # Estoque insuficiente
+    client.get("/api/inventory/estoque")
+    client.get("/api/inventory/estoque")
+    after = amostras(client)
+
+    def delta(name, labels):
+        return after.get((name, labels), 0) - before.get((name, labels), 0)
+
+    assert delta("estoque_servico_duracao_segundos_count", '{operacao="entrada"}') == 1
+    assert delta("estoque_servico_duracao_segundos_count", '{operacao="saida"}') == 1
+    assert delta("estoque_servico_erros_total", '{operacao="saida",erro="ValueError"}') == 1
+    assert delta("estoque_etapa_duracao_segundos_count", '{etapa="diario_append"}') == 1
+    assert delta("estoque_servico_duracao_segundos_count", '{operacao="serializar_estoque"}') == 1 # A segunda veio do cache
+    assert delta("estoque_cache_consultas_total", '{resultado="hit"}') == 1
+    assert delta("estoque_cache_consultas_total", '{resultado="miss"}') == 1
+
+
+def test_histograma_acumulado_e_rotulos_escapados():
+    histogram = metrics.Histogram("teste_duracao_segundos", "Teste.", ["etapa"], buckets=(0.1, 1.0))
+    metrics.REGISTRY.remove(histogram) # Fora do /metrics do processo
+    for value in [0.05, 0.1, 0.5, 2.0]:
+        histogram.observe(value, etapa='a"b\\c')
+
+    assert histogram.samples() == [
+        'teste_duracao_segundos_bucket{etapa="a\\"b\\\\c",le="0.1"} 2',
+        'teste_duracao_segundos_bucket{etapa="a\\"b\\\\c",le="1.0"} 3',
+        'teste_duracao_segundos_bucket{etapa="a\\"b\\\\c",le="+Inf"} 4',
+        'teste_duracao_segundos_sum{etapa="a\\"b\\\\c"} 2.65',
+        'teste_duracao_segundos_count{etapa="a\\"b\\\\c"} 4',
+    ]
@@ -0,0 +1,40 @@
+import pytest
+from fastapi.testclient import TestClient
+
+from app.main import app
+
+
+@pytest.fixture
+def client(state):
+    return TestClient(app)
+
+
+def entrada(client, **movement):
+    return client.post("/api/inventory/entrada", json=movement)
+
+
+@pytest.mark.parametrize("nome", ["Caneta", "Lápis novo"])
+@pytest.mark.parametrize("valor", [0, -1.5])
+def test_entrada_com_valor_unitario_invalido_nao_altera_o_estoque(client, state, nome, valor):
+    assert entrada(client, NomeProduto="Caneta", Quantidade=10, ValorUnitario=2.0).status_code == 200
+    journal_before = state.journal.path.read_bytes()
+    stock_before = state.stock.copy()
+
+    response = entrada(client, NomeProduto=nome, Quantidade=1, ValorUnitario=valor)
+
+    assert response.status_code == 400
+    assert response.json()["detail"] == "ValorUnitario deve ser um número maior que zero."
+    assert state.journal.path.read_bytes() == journal_before
+    assert state.stock.equals(stock_before)
+    assert state.data_version().endswith(".2")
+    assert client.get("/api/inventory/estoque").status_code == 200
+
+
+def test_entrada_e_saida(client):
+    assert entrada(client, NomeProduto="Caneta", Quantidade=10, ValorUnitario=2.0).json()["data"]["Quantidade"] == 10
+    assert entrada(client, NomeProduto=" caneta ", Quantidade=5).json()["data"]["ValorTotal"] == 30.0
+    response = client.post("/api/inventory/saida", json={"NomeProduto": "CANETA", "Quantidade": 4})
+    assert response.status_code == 200 and response.json()["data"]["Quantidade"] == 11
+    response = client.post("/api/inventory/saida", json={"NomeProduto": "Caneta", "Quantidade": 12})
+    assert response.status_code == 400
+    assert entrada(client, NomeProduto="Novo", Quantidade=1).status_code == 400 # Produto novo sem ValorUnitario
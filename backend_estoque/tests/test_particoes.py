@@ -0,0 +1,107 @@
+from datetime import date, datetime
+
+import numpy as np
+import pandas as pd
+import pytest
+from fastapi.testclient import TestClient
+
+from app.core.inventory_state import InventoryState
+from app.core.partitions import MonthlyPartitionIndex
+from app.main import app
+from app.models import schemas
+from app.services import inventory_service
+
+
+@pytest.fixture
+def client(state):
+    return TestClient(app)
+
+
+def movimentar(dias):
+    inventory_service.apply_movement_batch([
+        schemas.BatchStockMovement(NomeProduto="Caneta", TipoMovimentacao="ENTRADA", Quantidade=1, ValorUnitario=2.0,
+                                   DataMovimentacao=dia)
+        for dia in dias])
+
+
+def manifesto_esperado(df: pd.DataFrame):
+    today = date.today()
+    grouped = df.groupby(df['DataHora'].dt.strftime('%Y-%m'))
+    return [
+        {"Particao": key, "DataHoraMin": g['DataHora'].min().date(), "DataHoraMax": g['DataHora'].max().date(),
+         "ID_TransacaoMin": int(g['ID_Transacao'].min()), "ID_TransacaoMax": int(g['ID_Transacao'].max()),
+         "Transacoes": len(g), "Fechada": key < today.strftime('%Y-%m')}
+        for key, g in grouped
+    ]
+
+
+# Fora de ordem de data: fevereiro volta depois de março, e o mês atual fica aberto
+DIAS = [date(2024, 1, 5), date(2024, 1, 31), date(2024, 3, 1), date(2024, 2, 10), date(2024, 3, 15),
+        date(2024, 2, 29), date.today()]
+
+
+def test_manifesto_confere_com_o_historico(client, state):
+    movimentar(DIAS)
+
+    manifest = client.get("/api/inventory/transacoes/particoes").json()["data"]
+
+    expected = manifesto_esperado(state.transactions)
+    assert [p["Particao"] for p in manifest] == ["2024-01", "2024-02", "2024-03", date.today().strftime('%Y-%m')]
+    assert [schemas.TransactionPartition(**p).model_dump() for p in manifest] == expected
+    assert manifest[-1]["Fechada"] is False and all(p["Fechada"] for p in manifest[:-1])
+
+
+def test_manifesto_igual_depois_de_compactar_e_recarregar(state):
+    movimentar(DIAS[:4])
+    movimentar(DIAS[4:]) # Indexado de forma incremental, a partir do diário
+    incremental = inventory_service.get_transaction_partitions()
+
+    state.persist()
+    restarted = InventoryState()
+    restarted.load() # Reconstruído do snapshot
+    assert restarted.partitions.manifest() == [p.model_dump() for p in incremental]
+    assert restarted.partitions.manifest() == manifesto_esperado(restarted.transactions)
+
+
+@pytest.mark.parametrize("inicio, fim", [
+    (datetime(2024, 2, 1), datetime(2024, 2, 29)),
+    (datetime(2024, 1, 31), None),
+    (None, datetime(2024, 1, 31)),
+    (datetime(2024, 2, 15), datetime(2024, 3, 10)),
+    (datetime(2023, 1, 1), datetime(2023, 12, 31)),
+])
+def test_periodo_visita_so_as_particoes_do_intervalo(state, inicio, fim):
+    movimentar(DIAS)
+    df = state.transactions
+
+    positions = state.partitions.positions_for_range(inicio, fim)
+
+    # Posições em ordem (ordem de ID_Transacao), só de meses que tocam o período e cobrindo todo o resultado
+    assert np.all(np.diff(positions) > 0)
+    months = set(df['DataHora'].iloc[positions].dt.strftime('%Y-%m'))
+    for p in state.partitions.manifest():
+        touches = (inicio is None or pd.Timestamp(p["DataHoraMax"]) >= inicio) and \
+                  (fim is None or pd.Timestamp(p["DataHoraMin"]) <= fim)
+        assert (p["Particao"] in months) == touches
+    in_range = df['DataHora'].between(inicio or pd.Timestamp.min, fim or pd.Timestamp.max)
+    assert set(np.flatnonzero(in_range.to_numpy())) <= set(positions)
+
+    page, _ = inventory_service._history_page(start_date=inicio, end_date=fim)
+    assert page['ID_Transacao'].tolist() == df.loc[in_range, 'ID_Transacao'].tolist()
+
+
+def test_indice_incremental_igual_a_reconstrucao():
+    df = pd.DataFrame({"ID_Transacao": range(1, 9),
+                       "DataHora": pd.to_datetime(["2024-01-02", "2024-02-01", "2024-01-20", "2024-03-03",
+                                                   "2024-02-28", "2024-01-01", "2024-03-31", "2024-02-02"])})
+    incremental = MonthlyPartitionIndex()
+    for start in range(0, len(df), 3):
+        incremental.add(start, df.iloc[start:start + 3])
+        incremental.partitions["2024-01"].positions # Força o cache de posições entre os acréscimos
+    rebuilt = MonthlyPartitionIndex()
+    rebuilt.rebuild(df)
+
+    assert incremental.manifest() == rebuilt.manifest()
+    for key, partition in rebuilt.partitions.items():
+        assert partition.positions.tolist() == incremental.partitions[key].positions.tolist()
+    assert MonthlyPartitionIndex().positions_for_range(None, None).size == 0
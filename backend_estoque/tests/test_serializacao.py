@@ -0,0 +1,93 @@
+from datetime import date
+
+import pandas as pd
+import pytest
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.models import schemas
+from app.routers import inventory_router
+from app.services import inventory_service
+
+ESTOQUE = "/api/inventory/estoque"
+
+
+@pytest.fixture
+def client(state):
+    return TestClient(app)
+
+
+@pytest.fixture
+def estoque(state):
+    # Nomes com aspas, barras e acentos; preços sem representação exata em binário
+    for nome, quantidade, valor in [('Caneta "azul"', 10, 2.5), ("Lápis\\HB", 3, 0.1), ("Régua ção", 7, 1234.567891),
+                                    ("Borracha", 1, 1 / 3)]:
+        inventory_service.add_product_entry(schemas.StockMovement(NomeProduto=nome, Quantidade=quantidade,
+                                                                  ValorUnitario=valor))
+    inventory_service.remove_product_stock(schemas.StockMovement(NomeProduto="Borracha", Quantidade=1))
+    return state
+
+
+def pydantic(state):
+    """O que o endpoint devolvia antes: um ProductStock por linha, serializado pelo Pydantic."""
+    items = inventory_service.get_all_stock_items()
+    return schemas.StockResponse(message="Estoque atual recuperado com sucesso.", data=items).model_dump(mode="json")
+
+
+def test_json_igual_ao_do_pydantic(client, estoque):
+    assert client.get(ESTOQUE).json() == pydantic(estoque)
+
+
+def test_colunar_igual_ao_json(client, estoque):
+    records = client.get(ESTOQUE).json()["data"]
+    body = client.get(ESTOQUE, params={"formato": "colunar"}).json()
+
+    assert body["rows"] == len(records) == 4
+    assert body["columns"] == list(records[0])
+    assert [dict(zip(body["columns"], row)) for row in zip(*(body["data"][c] for c in body["columns"]))] == records
+
+
+def test_arrow_igual_ao_json(client, estoque):
+    pa = pytest.importorskip("pyarrow")
+    records = client.get(ESTOQUE).json()["data"]
+    response = client.get(ESTOQUE, params={"formato": "arrow"})
+    assert response.headers["content-type"] == "application/vnd.apache.arrow.stream"
+
+    table = pa.ipc.open_stream(response.content).read_all()
+    assert table.schema.field("DataUltimaAtualizacao").type == pa.date32()
+    rows = [dict(row, DataUltimaAtualizacao=row["DataUltimaAtualizacao"].isoformat()) for row in table.to_pylist()]
+    assert rows == records
+
+
+def test_estoque_vazio_em_todos_os_formatos(client):
+    assert client.get(ESTOQUE).json()["data"] == []
+    assert client.get(ESTOQUE, params={"formato": "colunar"}).json()["rows"] == 0
+
+
+def test_arrow_indisponivel(client, monkeypatch):
+    monkeypatch.setattr(inventory_router, "ARROW_AVAILABLE", False)
+    response = client.get(ESTOQUE, params={"formato": "arrow"})
+    assert response.status_code == 400
+    assert "pyarrow" in response.json()["detail"]
+
+
+def test_estoque_invalido_nao_e_serializado(client, estoque):
+    estoque.stock.loc[0, 'ValorUnitario'] = 0 # Violaria Field(gt=0) em ProductStock
+    with pytest.raises(ValueError, match="ValorUnitario"):
+        inventory_service.serialize_stock("json", "x")
+    assert client.get(ESTOQUE).status_code == 500
+
+
+def test_floats_sem_perda_de_precisao_e_nome_com_a_chave(client, state):
+    nome = 'x","ValorTotal":"1' # Mesmo trecho que o caminho exato procura na saída do to_json
+    inventory_service.add_product_entry(schemas.StockMovement(NomeProduto=nome, Quantidade=3, ValorUnitario=0.1))
+
+    record = client.get(ESTOQUE).json()["data"][0]
+    assert (record["NomeProduto"], record["ValorTotal"]) == (nome, 0.30000000000000004)
+    columnar = client.get(ESTOQUE, params={"formato": "colunar"}).json()["data"]
+    assert columnar["ValorTotal"] == [0.30000000000000004]
+
+    history = client.get("/api/inventory/transacoes").json()["data"]
+    records, _ = inventory_service.get_transaction_history()
+    assert history == [r.model_dump(mode="json") for r in records]
+    assert history[0]["ValorTotalMovimentacao"] == 0.30000000000000004